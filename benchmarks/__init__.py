@@ -0,0 +1,6 @@
+'''
+Benchmarks for the map and game systems.
+
+Run them from the repository root (the game data is loaded relative to it):
+    python -m benchmarks.<name>
+'''
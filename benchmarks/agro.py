@@ -0,0 +1,157 @@
+'''
+Per-turn cost of the agro heatmap: full floor Dijkstra against the bounded,
+incremental AgroField. The bounded field is checked against the full one for
+every weight that a creature can react to.
+
+Also: the cost of repairing the field when a door near the player opens or
+closes against reflooding it, and how much of the field a single step of
+the player changes (which is why steps are refloods rather than repairs).
+'''
+import random
+import time
+
+import numpy as np
+
+from guildmaster.dungeon.agro import AgroField
+from guildmaster.dungeon.grid import NO_AGRO, CLOSED_DOOR, OPEN_DOOR
+from guildmaster.dungeon.mapgen import Map
+from guildmaster.dungeon.pathfinding import PathFinder
+
+from .common import report
+
+
+class Walker:
+    '''Stand in for the player: just a position'''
+    def __init__(self, x, y):
+        self.x, self.y = x, y
+
+
+def random_walk(floor, steps, seed=0):
+    '''A list of player positions from a random walk over open tiles'''
+    rng = random.Random(seed)
+    x, y = floor.rooms[0].center
+    positions = []
+    for _ in range(steps):
+        # Stand still a third of the time (resting, searching...)
+        if rng.random() > 0.33:
+            dx, dy = rng.randint(-1, 1), rng.randint(-1, 1)
+            if not floor.lmap.block_move[y + dy, x + dx]:
+                x, y = x + dx, y + dy
+        positions.append((x, y))
+    return positions
+
+
+def time_turns(floor, positions, incremental):
+    finder = PathFinder(floor)
+    finder.incremental_agro = incremental
+    player = Walker(*positions[0])
+    start = time.perf_counter()
+    for player.x, player.y in positions:
+        finder.agro_heatmap(player)
+    return (time.perf_counter() - start) / len(positions)
+
+
+def nearest_doors(floor, position, count):
+    '''The count doors closest to position'''
+    doors = np.argwhere(np.isin(floor.lmap.kind, (CLOSED_DOOR, OPEN_DOOR)))
+    x, y = position
+    order = np.argsort(np.abs(doors - (y, x)).max(axis=1), kind='stable')
+    return [(X, Y) for Y, X in doors[order[:count]].tolist()]
+
+
+def time_doors(floor, position, limit, toggles=100):
+    '''
+    Mean time to bring a field up to date after a nearby door opens or
+    closes: repaired in place, and reflooded from scratch.
+    '''
+    lmap = floor.lmap
+    doors = nearest_doors(floor, position, 4)
+    sources = [(position, 0)]
+    times = []
+    for repair in (True, False):
+        field = AgroField(lmap)
+        field.update(sources, limit)
+        spent = 0
+        for turn in range(toggles):
+            x, y = doors[turn % len(doors)]
+            lmap.set_kind(x, y, OPEN_DOOR if lmap.kind[y, x] == CLOSED_DOOR
+                          else CLOSED_DOOR)
+            start = time.perf_counter()
+            if not repair:
+                field.reset()
+            field.update(sources, limit)
+            spent += time.perf_counter() - start
+        field.reset()
+        times.append(spent / toggles)
+    return times
+
+
+def changed_share(floor, positions, limit):
+    '''Mean share of the field whose weight changes on each player step'''
+    field = AgroField(floor.lmap)
+    shares = []
+    for a, b in zip(positions, positions[1:]):
+        field.update([(a, 0)], limit)
+        before = dict(field.weights)
+        field.update([(b, 0)], limit)
+        cells = before.keys() | field.weights.keys()
+        if a != b:
+            shares.append(sum(before.get(ix) != field.weights.get(ix)
+                              for ix in cells) / len(cells))
+    field.reset()
+    return sum(shares) / len(shares)
+
+
+def check_equivalent(floor, position):
+    '''Bounded weights must match the full heatmap up to the limit'''
+    finder = PathFinder(floor)
+    player = Walker(*position)
+    limit = max(e.agro_range for e in floor.enemies)
+
+    finder.incremental_agro = False
+    finder.agro_heatmap(player)
+    full = floor.lmap.agro_weight.copy()
+
+    floor.lmap.agro_weight[:] = NO_AGRO
+    floor.agro_field.reset()
+    finder.incremental_agro = True
+    finder.agro_heatmap(player)
+    bounded = floor.lmap.agro_weight
+
+    mask = full <= limit
+    assert (bounded[mask] == full[mask]).all()
+    assert (bounded[~mask] == NO_AGRO).all()
+
+
+def main():
+    random.seed(1)
+    rows, door_rows = [], []
+    for width, height in [(90, 52), (200, 120), (400, 250)]:
+        floor = Map(width, height, 0)
+        positions = random_walk(floor, 200)
+        check_equivalent(floor, positions[-1])
+        steps = positions[:10]
+        full = time_turns(floor, steps, incremental=False)
+        bounded = time_turns(floor, positions, incremental=True)
+        size = '{}x{}'.format(width, height)
+        rows.append((size, '{:.3f}'.format(full * 1000),
+                     '{:.3f}'.format(bounded * 1000),
+                     '{:.0f}'.format(full / bounded)))
+
+        limit = max(e.agro_range for e in floor.enemies)
+        repair, reflood = time_doors(floor, positions[-1], limit)
+        door_rows.append((size, limit, '{:.3f}'.format(reflood * 1000),
+                          '{:.3f}'.format(repair * 1000),
+                          '{:.0f}'.format(reflood / repair),
+                          '{:.0%}'.format(changed_share(floor, positions,
+                                                        limit))))
+
+    report('Agro heatmap: mean time per turn', rows,
+           ['size', 'full ms', 'incremental ms', 'speedup'])
+    report('Agro field after a nearby door opens or closes', door_rows,
+           ['size', 'limit', 'reflood ms', 'repair ms', 'speedup',
+            'changed per step'])
+
+
+if __name__ == '__main__':
+    main()
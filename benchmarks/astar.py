@@ -0,0 +1,173 @@
+'''
+A* on flat arrays with generation counters and an octile heuristic against
+the dict based search it replaced, in the path_test.py scenario, across many
+room pairs on a large floor and for a target that can't be reached. Path
+costs are checked against a plain Dijkstra search.
+'''
+import heapq
+import random
+
+from guildmaster.dungeon.grid import WALL
+from guildmaster.dungeon.mapgen import Dungeon
+from guildmaster.dungeon.pathfinding import PathFinder, DIAGONAL_PENALTY
+
+from .common import best_of, report
+
+
+def build_path(came_from, start, target):
+    '''PathFinder.build_path: rebuild the path from the search'''
+    current = target
+    path = [current]
+
+    while current != start:
+        current = came_from[current]
+        path.append(current)
+
+    path.reverse()
+    return path
+
+
+def legacy_a_star(floor, start, target):
+    '''PathFinder.a_star as it was before the flat array rewrite'''
+    grid = floor.lmap
+    width = grid.width
+    neighbours = grid.neighbour_lists
+    path_cost = grid.path_cost.ravel().tolist()
+    orthogonal = (-1, 1, -width, width)
+
+    sx, sy = start
+    tx, ty = target
+    X, Y = (sx - tx), (sy - ty)
+    start_ix, target_ix = sy * width + sx, ty * width + tx
+
+    def heuristic(ix):
+        tile = (ix % width, ix // width)
+        x, y = (tile[0] - tx), (tile[1] - ty)
+        heuristic = abs(tx - tile[0]) + abs(ty - tile[1])
+        cross = abs(x*Y - X*y)
+        return heuristic + (cross * 0.001)
+
+    open_set = [(0, start_ix)]
+    came_from = {start_ix: None}
+    cost_so_far = {start_ix: 0}
+
+    while open_set:
+        current = heapq.heappop(open_set)[1]
+        if current == target_ix:
+            break
+        for n in neighbours[current]:
+            step = path_cost[n]
+            if step:
+                cost = cost_so_far[current] + step
+                if n - current not in orthogonal:
+                    cost += 1
+                if n not in cost_so_far or cost < cost_so_far[n]:
+                    cost_so_far[n] = cost
+                    heapq.heappush(open_set, (cost + heuristic(n), n))
+                    came_from[n] = current
+
+    path = build_path(came_from, start_ix, target_ix)
+    return [(ix % width, ix // width) for ix in path]
+
+
+def path_cost(floor, path):
+    '''Cost of walking a path, checking that every step is legal'''
+    costs = floor.lmap.path_cost
+    total = 0
+    for (x1, y1), (x2, y2) in zip(path, path[1:]):
+        assert max(abs(x2 - x1), abs(y2 - y1)) == 1 and costs[y2, x2]
+        total += int(costs[y2, x2])
+        if x1 != x2 and y1 != y2:
+            total += DIAGONAL_PENALTY
+    return total
+
+
+def dijkstra_cost(floor, start, target):
+    costs = floor.lmap.path_cost
+    best = {start: 0}
+    queue = [(0, start)]
+    while queue:
+        cost, (x, y) = heapq.heappop(queue)
+        if (x, y) == target:
+            return cost
+        if cost > best[(x, y)]:
+            continue
+        for _, _, X, Y in floor.lmap.iter_neighbours(x, y):
+            if costs[Y, X]:
+                new = cost + int(costs[Y, X])
+                if X != x and Y != y:
+                    new += DIAGONAL_PENALTY
+                if new < best.get((X, Y), new + 1):
+                    best[(X, Y)] = new
+                    heapq.heappush(queue, (new, (X, Y)))
+    return None
+
+
+def seal(floor, room):
+    '''Wall a room in so that nothing outside can path into it'''
+    grid = floor.lmap
+    ring = [(x, y) for x in range(room.x1 - 1, room.x2 + 2)
+            for y in range(room.y1 - 1, room.y2 + 2)
+            if not (room.x1 <= x <= room.x2 and room.y1 <= y <= room.y2)]
+    for x, y in ring:
+        grid.path_cost[y, x] = 0
+        grid.set_kind(x, y, WALL)
+
+
+def compare(floor, finder, pairs, repeat):
+    old_cost = new_cost = 0
+    for start, target in pairs:
+        old_cost += path_cost(floor, legacy_a_star(floor, start, target))
+        path = finder.search(start, target)
+        assert path[0] == start and path[-1] == target
+        cost = path_cost(floor, path)
+        assert cost == dijkstra_cost(floor, start, target)
+        new_cost += cost
+
+    t_old = best_of(lambda: [legacy_a_star(floor, *p) for p in pairs], repeat)
+    t_new = best_of(lambda: [finder.search(*p) for p in pairs], repeat)
+    return ('{:.2f}'.format(t_old * 1000), '{:.2f}'.format(t_new * 1000),
+            '{:.1f}'.format(t_old / t_new),
+            '{:.3f}'.format(new_cost / old_cost))
+
+
+
+def main():
+    rows = []
+
+    random.seed(1)
+    floor = Dungeon(40, 80, new_alg=True)[0]
+    finder = PathFinder(floor)
+    pairs = [(floor.rooms[0].center, floor.rooms[-1].center)]
+    rows.append(('path_test.py 80x40',) + compare(floor, finder, pairs, 50))
+
+    random.seed(2)
+    floor = Dungeon(120, 200)[0]
+    finder = PathFinder(floor)
+    rng = random.Random(0)
+    pairs = [tuple(r.center for r in rng.sample(floor.rooms, 2))
+             for _ in range(50)]
+    rows.append(('50 room pairs 200x120',) + compare(floor, finder, pairs, 3))
+
+    start, target = floor.rooms[0].center, floor.rooms[-1].center
+    seal(floor, floor.rooms[-1])
+    assert finder.search(start, target) is None
+
+    def legacy_unreachable():
+        try:
+            legacy_a_star(floor, start, target)
+        except KeyError:  # build_path falls off the end of came_from
+            pass
+
+    t_old = best_of(legacy_unreachable, 3)
+    t_new = best_of(lambda: finder.search(start, target), 3)
+    rows.append(('unreachable 200x120', '{:.2f}'.format(t_old * 1000),
+                 '{:.2f}'.format(t_new * 1000),
+                 '{:.1f}'.format(t_old / t_new), '-'))
+
+    report('A* search (ms per batch)', rows,
+           ['scenario', 'dicts', 'flat arrays', 'speedup', 'cost ratio'])
+
+
+if __name__ == '__main__':
+    main()
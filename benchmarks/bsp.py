@@ -0,0 +1,57 @@
+'''
+The two map generators side by side: time to build a floor, how many rooms
+it ends up with and how much of it can be walked on. Every room on a BSP
+floor must be reachable from the first one.
+'''
+from guildmaster.dungeon.mapgen import build_floor
+
+from .common import best_of, report
+
+
+SEEDS = range(20)
+
+
+def check_connected(floor):
+    '''Flood fill from the first room and make sure every room is reached'''
+    grid = floor.lmap
+    is_open = (grid.path_cost > 0).ravel().tolist()
+    x, y = floor.rooms[0].center
+    seen = {y * grid.width + x}
+    stack = list(seen)
+    while stack:
+        for n in grid.neighbour_lists[stack.pop()]:
+            if is_open[n] and n not in seen:
+                seen.add(n)
+                stack.append(n)
+    for room in floor.rooms:
+        x, y = room.center
+        assert y * grid.width + x in seen, room.id
+
+
+def main():
+    rows = []
+    for width, height in [(80, 40), (200, 120), (400, 240)]:
+        for algorithm in ('rooms', 'bsp'):
+            seeds = iter(range(10 ** 6))
+            t_build = best_of(lambda: build_floor(
+                width, height, 1, next(seeds), algorithm=algorithm), 5)
+            floors = [build_floor(width, height, 1, s,
+                                  algorithm=algorithm) for s in SEEDS]
+            if algorithm == 'bsp':
+                for floor in floors:
+                    check_connected(floor)
+            rooms = sum(len(f.rooms) for f in floors) / len(floors)
+            walkable = sum((~f.lmap.block_move).mean() for f in floors)
+            rows.append(('{}x{}'.format(width, height), algorithm,
+                         '{:.1f}'.format(t_build * 1000),
+                         '{:.1f}'.format(rooms),
+                         '{:.1f}'.format(rooms * 1000 / (width * height)),
+                         '{:.1f}'.format(100 * walkable / len(floors))))
+
+    report('Map generators (mean of {} floors)'.format(len(SEEDS)), rows,
+           ['size', 'algorithm', 'build ms', 'rooms', 'rooms / 1000 cells',
+            'floor %'])
+
+
+if __name__ == '__main__':
+    main()
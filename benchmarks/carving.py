@@ -0,0 +1,118 @@
+'''
+Corridor carving and door placement: the per-tile Map.connect and
+Map.add_doors against carving every corridor segment at once and finding
+door candidates from whole-grid floor counts. Both are run from the same
+floor and random state (tests/test_mapgen.py checks that they lay out
+identical floors).
+'''
+import copy
+import random
+
+from guildmaster.dungeon.mapgen import Map, Room
+from guildmaster.dungeon.placement import RoomPlacer
+
+from .common import best_of, report
+
+
+def legacy_corridor(self, p1, p2, const, horizontal):
+    '''Map.corridor: draw a corridor from p1 to p2 at constant x/y'''
+    start, finish = min(p1, p2), max(p1, p2)
+
+    if horizontal:
+        for x in range(start, finish+1):
+            self.lmap[const][x].floor()
+    else:
+        for y in range(start, finish+1):
+            self.lmap[y][const].floor()
+
+
+def legacy_connect(self):
+    '''Map.connect as it was before bulk carving'''
+    for room, neighbour in self.graph_edges:
+        horizontal = room.horizontal_with(neighbour)
+        x1, y1 = room.random_point(offset=3, rng=self.rng)
+        x2, y2 = neighbour.random_point(offset=3, rng=self.rng)
+        if horizontal:
+            div = self.rng.randint(min(x1, x2), max(x1, x2))
+            p1, p2, const1, const2 = x1, x2, y1, y2
+        else:
+            div = self.rng.randint(min(y1, y2), max(y1, y2))
+            p1, p2, const1, const2 = y1, y2, x1, x2
+        legacy_corridor(self, p1, div, const1, horizontal)
+        legacy_corridor(self, p2, div, const2, horizontal)
+        legacy_corridor(self, const1, const2, div, not horizontal)
+
+
+def legacy_add_doors(self):
+    '''Map.add_doors as it was before the floor count arrays'''
+    def valid_cell(x, y):
+        x_neighbours = [self.lmap[y][x-1].name, self.lmap[y][x+1].name]
+        y_neighbours = [self.lmap[y-1][x].name, self.lmap[y+1][x].name]
+        x2 = len([x for x in x_neighbours if x == 'floor'])
+        y2 = len([y for y in y_neighbours if y == 'floor'])
+        return (x2 == 2 and y2 == 0) or (x2 == 0 and y2 == 2)
+
+    for room in self.rooms:
+        for i, cell in enumerate(self.lmap[room.y1][room.x1:room.x2]):
+            if cell.name == 'floor' and valid_cell(room.x1+i, room.y1):
+                cell.closed_door(allow_secret_door=True, rng=self.rng)
+        for i, cell in enumerate(self.lmap[room.y2][room.x1:room.x2]):
+            if cell.name == 'floor' and valid_cell(room.x1+i, room.y2):
+                cell.closed_door(allow_secret_door=True, rng=self.rng)
+        for i, row in enumerate(self.lmap[room.y1:room.y2]):
+            cell = row[room.x1]
+            if cell.name == 'floor' and valid_cell(room.x1, room.y1+i):
+                cell.closed_door(allow_secret_door=True, rng=self.rng)
+        for i, row in enumerate(self.lmap[room.y1:room.y2]):
+            cell = row[room.x2]
+            if cell.name == 'floor' and valid_cell(room.x2, room.y1+i):
+                cell.closed_door(allow_secret_door=True, rng=self.rng)
+
+
+def rooms_only(width, height, seed):
+    '''A floor as Map.generate leaves it just before connecting the rooms'''
+    floor = Map(width, height, 0, rng=random.Random(seed), generate=False)
+    floor.max_rooms = width * height // 30
+    rng = floor.rng
+    placer = RoomPlacer(width, height, floor.min_room_size)
+    for _ in range(floor.max_rooms):
+        w = rng.randint(floor.min_room_size, floor.max_room_size)
+        h = rng.randint(floor.min_room_size, floor.max_room_size)
+        room = Room(rng.randint(0, width - w - 1),
+                    rng.randint(0, height - h - 1), w, h)
+        if placer.place(room):
+            floor.add_room(room)
+        elif placer.exhausted:
+            break
+    floor.generate_graph()
+    return floor
+
+
+def main():
+    rows = []
+    for width, height in [(80, 40), (200, 120), (400, 240)]:
+        base = rooms_only(width, height, 4)
+
+        def timed(connect, add_doors):
+            floors = [copy.deepcopy(base) for _ in range(5)]
+            times = iter(floors)
+
+            def run():
+                floor = next(times)
+                connect(floor)
+                add_doors(floor)
+            return best_of(run, 5)
+
+        t_old = timed(legacy_connect, legacy_add_doors)
+        t_new = timed(Map.connect, Map.add_doors)
+        rows.append(('{}x{}'.format(width, height), len(base.rooms),
+                     '{:.2f}'.format(t_old * 1000),
+                     '{:.2f}'.format(t_new * 1000),
+                     '{:.1f}'.format(t_old / t_new)))
+
+    report('connect + add_doors (ms)', rows,
+           ['floor', 'rooms', 'per tile', 'bulk', 'speedup'])
+
+
+if __name__ == '__main__':
+    main()
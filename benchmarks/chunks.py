@@ -0,0 +1,183 @@
+'''
+Chunked open world floors: walking a player across a world far bigger than
+memory would allow as a single TileGrid, rendering a camera view each step.
+Alongside that, checks that chunks are rebuilt identically, survive being
+written out, and that paths, agro and rendering agree with a single grid
+of the same cells.
+'''
+import time
+
+import numpy as np
+import tcod.console
+
+from guildmaster.dungeon.agro import flood
+from guildmaster.dungeon.chunks import ChunkedMap, build_chunk
+from guildmaster.dungeon.grid import TileGrid, FLOOR, OPEN_DOOR
+from guildmaster.render import ArrayRenderer, Camera
+from guildmaster.config import CHUNK_CACHE_SIZE
+
+from .common import report
+
+
+def floor_cell(world, cx, cy):
+    '''Some floor cell in a chunk, in world coordinates'''
+    cells = np.argwhere(world.chunk(cx, cy).kind == FLOOR)
+    y, x = cells[len(cells) // 2].tolist()
+    return x + cx * world.size, y + cy * world.size
+
+
+def check_path(world, path):
+    '''Each step is to a neighbouring cell with a path cost (doors too)'''
+    for (x1, y1), (x2, y2) in zip(path, path[1:]):
+        assert max(abs(x1 - x2), abs(y1 - y2)) == 1
+        assert world.tile(x2, y2).path_cost
+    chunks = {world.chunk_of(x, y) for x, y in path}
+    assert len(chunks) > 1
+
+
+def whole_world(world):
+    '''The world as one TileGrid (only sensible for small worlds)'''
+    return world.area(0, 0, world.width, world.height).lmap
+
+
+def check_rebuild(seed):
+    a = build_chunk(seed, 3, 4, 64, 10, 10)
+    b = build_chunk(seed, 3, 4, 64, 10, 10)
+    for name, array in a.arrays.items():
+        assert np.array_equal(array, b.arrays[name]), name
+
+
+def check_gates(world):
+    '''Neighbouring chunks have floor facing each other across the edge'''
+    size = world.size
+    for cy in range(world.chunks_y):
+        for cx in range(world.chunks_x - 1):
+            east = world.chunk(cx, cy).kind[:, size - 1]
+            west = world.chunk(cx + 1, cy).kind[:, 0]
+            assert ((east == FLOOR) & (west == FLOOR)).any()
+    for cy in range(world.chunks_y - 1):
+        for cx in range(world.chunks_x):
+            south = world.chunk(cx, cy).kind[size - 1]
+            north = world.chunk(cx, cy + 1).kind[0]
+            assert ((south == FLOOR) & (north == FLOOR)).any()
+
+
+def check_eviction(seed):
+    '''Changed chunks are written out and read back, the rest rebuilt'''
+    world = ChunkedMap(20, 20, seed=seed, cache_size=4)
+    world.store.keep = 0
+    world.focus(0, 0)
+    x, y = floor_cell(world, 0, 0)
+    world.set_kind(x, y, OPEN_DOOR)
+    area = world.area(0, 0, 64, 64)
+    area.lmap.explored[:10, :10] = True
+    world.keep_explored(area)
+    before = {name: array.copy()
+              for name, array in world.chunk(0, 0).arrays.items()}
+
+    # Wander off so that chunk (0, 0) is dropped
+    world.focus(world.width - 1, world.height - 1)
+    for cx in range(10, 20):
+        world.chunk(cx, 19)
+    assert (0, 0) not in world.store and (0, 0) in world.store.saved
+    assert world.store.written == 1
+
+    after = world.chunk(0, 0)
+    assert world.store.read == 1
+    for name in ('kind', 'path_cost', 'explored', 'room_id', 'block_move',
+                 'block_sight', 'agro_cost'):
+        assert np.array_equal(before[name], after.arrays[name]), name
+    world.close()
+
+
+def check_against_one_grid(seed):
+    '''Paths, agro and camera renders match working on the whole world'''
+    world = ChunkedMap(5, 4, seed=seed)
+    check_gates(world)
+    grid = whole_world(world)
+
+    start, target = floor_cell(world, 0, 0), floor_cell(world, 4, 3)
+    path = world.path(start, target)
+    check_path(world, path)
+
+    sources = [(start, 0), (floor_cell(world, 2, 1), 5)]
+    assert world.agro(sources, 40) == flood(grid, sources, 40)
+
+    camera = Camera(90, 52)
+    camera.follow(*target, world.width, world.height)
+    visible = {(x, y) for x in range(target[0] - 8, target[0] + 9)
+               for y in range(target[1] - 8, target[1] + 9)}
+    frames = []
+    for lmap, origin in ((grid, (0, 0)), (None, None)):
+        if lmap is None:
+            area = world.area(camera.x, camera.y, camera.x + camera.width,
+                              camera.y + camera.height)
+            lmap, origin = area.lmap, (area.x, area.y)
+        renderer = ArrayRenderer(tcod.console.Console(90, 52, order='C'))
+        frames.append(renderer.compose(lmap, visible, set(), set(), [],
+                                       camera, origin))
+    for a, b in zip(*frames):
+        assert np.array_equal(a, b)
+    world.close()
+
+
+def walk(chunks, steps, cache_size, seed=0):
+    '''
+    Follow a long path through a chunks x chunks world, keeping the chunks
+    around the player and drawing the camera view at every step.
+    '''
+    world = ChunkedMap(chunks, chunks, seed=seed, cache_size=cache_size)
+    camera = Camera(90, 52)
+    renderer = ArrayRenderer(tcod.console.Console(90, 52, order='C'))
+
+    start = time.perf_counter()
+    path = [floor_cell(world, 0, 0)]
+    cx = cy = 0
+    while len(path) < steps:
+        cx, cy = cx + 2, cy + 1
+        leg = world.path(path[-1], floor_cell(world, cx, cy))
+        check_path(world, leg)
+        path.extend(leg[1:])
+    t_paths = time.perf_counter() - start
+
+    start = time.perf_counter()
+    most = 0
+    for x, y in path[:steps]:
+        world.focus(x, y)
+        camera.follow(x, y, world.width, world.height)
+        area = world.area(camera.x, camera.y, camera.x + camera.width,
+                          camera.y + camera.height)
+        visible = {(X, Y) for X in range(x - 7, x + 8)
+                   for Y in range(y - 7, y + 8)}
+        renderer.render(area.lmap, visible, set(), set(), [], camera,
+                        (area.x, area.y))
+        world.keep_explored(area)
+        most = max(most, len(world.store))
+    t_walk = (time.perf_counter() - start) / steps
+
+    cell_bytes = TileGrid(1, 1).nbytes
+    store = world.store
+    row = ('{0}x{0}'.format(chunks), cache_size, steps,
+           '{:.0f}'.format(world.width * world.height * cell_bytes / 2**20),
+           '{:.1f}'.format(most * world.size ** 2 * cell_bytes / 2**20),
+           store.built, store.written, store.read,
+           '{:.0f}'.format(t_paths * 1000), '{:.2f}'.format(t_walk * 1000))
+    world.close()
+    return row
+
+
+def main():
+    check_rebuild(7)
+    check_eviction(7)
+    check_against_one_grid(7)
+
+    rows = [walk(chunks, 2000, cache_size)
+            for chunks, cache_size in ((50, CHUNK_CACHE_SIZE),
+                                       (200, CHUNK_CACHE_SIZE), (200, 16))]
+    report('Walking across chunked worlds', rows,
+           ['chunks', 'cache', 'steps', 'full MB', 'resident MB', 'built',
+            'written', 'read', 'paths ms', 'ms / step'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+'''
+Helpers shared by the benchmark scripts
+'''
+import time
+import tracemalloc
+
+
+def best_of(func, repeat=5):
+    '''Best wall clock time (in seconds) of several calls to func'''
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def peak_memory(func):
+    '''Return (result, peak traced allocation in bytes) of calling func'''
+    tracemalloc.start()
+    try:
+        result = func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, peak
+
+
+def report(title, rows, headers):
+    '''Print a simple fixed width table'''
+    print(title)
+    print('-' * len(title))
+    widths = [max(len(str(h)), *(len(str(r[i])) for r in rows))
+              for i, h in enumerate(headers)]
+    print('  '.join(str(h).rjust(w) for h, w in zip(headers, widths)))
+    for row in rows:
+        print('  '.join(str(c).rjust(w) for c, w in zip(row, widths)))
+    print()
@@ -0,0 +1,80 @@
+'''
+Latency of taking the stairs down: generating the next floor on demand
+against collecting it from the background FloorPrefetcher. Between each
+descent the player "plays" for a while, giving the workers time to finish
+and the game time to pack away the floors that have dropped out of the
+FloorCache. Enough floors are visited for the cache to fill up, and the
+last column packs them on the stairs instead (no backlog) for comparison.
+'''
+import pickle
+import time
+from concurrent.futures import wait
+
+import numpy as np
+
+from guildmaster.dungeon.mapgen import Dungeon, build_floor
+from guildmaster.dungeon.prefetch import floor_seed, pack_floor
+from guildmaster.player_character import new_PC
+
+from .common import report
+
+
+def descents(dungeon, count, playing):
+    '''Return the time taken by each descent'''
+    times = []
+    for _ in range(count):
+        dungeon.idle()
+        time.sleep(playing)
+        start = time.perf_counter()
+        dungeon.descend()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def same_floors(a, b):
+    for m1, m2 in zip(a.maps, b.maps):
+        assert np.array_equal(m1.lmap.kind, m2.lmap.kind)
+        assert [(e.x, e.y) for e in m1.enemies] == \
+            [(e.x, e.y) for e in m2.enemies]
+
+
+def main():
+    rows = []
+    for width, height in [(90, 52), (160, 90), (250, 150)]:
+        start = time.perf_counter()
+        floor = build_floor(width, height, 1, floor_seed(0, 1))
+        build = time.perf_counter() - start
+        playing = max(build * 2, 0.1)
+        packed = len(pack_floor(floor)) // 1024
+        raw = len(pickle.dumps(floor, pickle.HIGHEST_PROTOCOL)) // 1024
+
+        timings = []
+        dungeons = []
+        for prefetch, backlog in ((0, None), (2, None), (2, 0)):
+            dungeon = Dungeon(height, width, new_PC('Player', 'Human'),
+                              seed=0, prefetch=prefetch)
+            if backlog is not None:
+                dungeon.maps.backlog = backlog
+            # NOTE: the workers are fresh interpreters that take a moment
+            #       to start: the player is still on the first floor
+            dungeon.idle()
+            wait(list(dungeon.prefetcher.pending.values()))
+            timings.append(np.mean(descents(dungeon, 12, playing)))
+            dungeon.close()
+            dungeons.append(dungeon)
+        same_floors(*dungeons[:2])
+
+        rows.append(('{}x{}'.format(width, height),
+                     '{:.1f}'.format(timings[0] * 1000),
+                     '{:.1f}'.format(timings[1] * 1000),
+                     '{:.0f}'.format(timings[0] / timings[1]),
+                     '{:.1f}'.format(timings[2] * 1000),
+                     '{} / {}'.format(packed, raw)))
+
+    report('Mean descent latency (ms)', rows,
+           ['size', 'on demand', 'prefetched', 'speedup',
+            'packing on stairs', 'floor KB packed / pickle'])
+
+
+if __name__ == '__main__':
+    main()
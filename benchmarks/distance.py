@@ -0,0 +1,72 @@
+'''
+The numpy distance_field against the heap based agro flood, timed on a real
+floor and on large synthetic grids (tests/test_distance.py checks that both
+give identical fields).
+'''
+import random
+
+import numpy as np
+
+from guildmaster.dungeon.agro import flood
+from guildmaster.dungeon.distance import distance_field
+from guildmaster.dungeon.grid import TileGrid, NO_AGRO, KINDS, KIND_IDS
+from guildmaster.dungeon.mapgen import Map
+
+from .common import best_of, report
+
+
+def synthetic_grid(width, height, seed):
+    '''A grid with a random scattering of every tile kind'''
+    rng = np.random.default_rng(seed)
+    weights = {'wall': 0.35, 'floor': 0.55, 'closed_door': 0.04,
+               'open_door': 0.03, 'secret_door': 0.03}
+    kinds = [KIND_IDS[k] for k in weights]
+    grid = TileGrid(width, height)
+    cells = rng.choice(kinds, size=(height, width), p=list(weights.values()))
+    for kind in kinds:
+        mask = cells == kind
+        grid.kind[mask] = kind
+        grid.agro_cost[mask] = KINDS[kind].agro_cost
+    return grid
+
+
+def random_sources(grid, count, rng):
+    sources = []
+    for i in range(count):
+        point = (rng.randrange(grid.width), rng.randrange(grid.height))
+        # The player (weight 0) plus louder / quieter extra points
+        sources.append((point, 0 if i == 0 else rng.randint(-3, 3)))
+    return sources
+
+
+def heap_field(grid, sources, limit=NO_AGRO):
+    field = np.full((grid.height, grid.width), NO_AGRO, dtype=np.int32)
+    for (x, y), weight in flood(grid, sources, limit).items():
+        field[y, x] = weight
+    return field
+
+
+def main():
+    rng = random.Random(1)
+    random.seed(1)
+    grids = [('90x52 floor', Map(90, 52, 0).lmap),
+             ('90x52 synthetic', synthetic_grid(90, 52, 1)),
+             ('500x500 synthetic', synthetic_grid(500, 500, 2))]
+
+    rows = []
+    for name, grid in grids:
+        sources = random_sources(grid, 1, rng)
+        repeat = 1 if grid.width > 100 else 5
+        t_heap = best_of(lambda: heap_field(grid, sources), repeat)
+        t_field = best_of(lambda: distance_field(grid.agro_cost, sources),
+                          repeat)
+        rows.append((name, '{:.2f}'.format(t_heap * 1000),
+                     '{:.2f}'.format(t_field * 1000),
+                     '{:.1f}'.format(t_heap / t_field)))
+
+    report('Full agro field: heap Dijkstra vs numpy sweeps',
+           rows, ['grid', 'heap ms', 'sweeps ms', 'speedup'])
+
+
+if __name__ == '__main__':
+    main()
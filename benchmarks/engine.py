@@ -0,0 +1,42 @@
+'''
+Turn throughput of the headless engine: a random and a stairs seeking
+player (kept alive) for a couple of thousand turns each, at the default
+screen size and a much larger map, with the time per turn spent in each
+subsystem and the peak memory of the process.
+'''
+import random
+
+from guildmaster.engine import Engine
+from guildmaster.headless import (
+    SUBSYSTEMS, random_policy, simulate, stairs_policy)
+
+from .common import report
+
+
+def play(policy, width, height, turns, seed=0):
+    random.seed(seed)
+    engine = Engine(width, height, seed=seed)
+    try:
+        stats = simulate(engine, turns, policy(random.Random(seed)),
+                         immortal=True)
+    finally:
+        engine.close()
+    assert stats['turns'] == turns and stats['alive']
+
+    per_turn = ['{:.3f}'.format(stats['timings'][name] * 1000 / turns)
+                for name in SUBSYSTEMS]
+    return ['{}x{}'.format(width, height), policy.__name__[:-7],
+            '{:.0f}'.format(turns / stats['seconds']), stats['depth'],
+            *per_turn, '{:.0f}'.format((stats['peak_rss'] or 0) / 2**20)]
+
+
+def main():
+    rows = [play(policy, width, height, 2000)
+            for width, height in ((90, 52), (200, 120))
+            for policy in (random_policy, stairs_policy)]
+    report('Headless turns (ms per turn by subsystem)', rows,
+           ['map', 'policy', 'turns/s', 'depth', *SUBSYSTEMS, 'RSS MB'])
+
+
+if __name__ == '__main__':
+    main()
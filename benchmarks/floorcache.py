@@ -0,0 +1,68 @@
+'''
+Memory held by a long run with every floor kept as a Map against the
+FloorCache, and the cost of bringing a packed floor back. Floors that are
+paged out and back in are checked against the originals.
+'''
+import copy
+
+import numpy as np
+
+from guildmaster.dungeon.floorcache import resident_size
+from guildmaster.dungeon.mapgen import Dungeon
+from guildmaster.player_character import new_PC
+
+from .common import best_of, report
+
+
+def same_floor(a, b):
+    for name in ('kind', 'path_cost', 'explored', 'room_id', 'block_move'):
+        assert np.array_equal(getattr(a.lmap, name), getattr(b.lmap, name))
+    assert [(r.id, r.center) for r in a.rooms] == \
+        [(r.id, r.center) for r in b.rooms]
+    assert [(e.name, e.x, e.y, e.HP) for e in a.enemies] == \
+        [(e.name, e.x, e.y, e.HP) for e in b.enemies]
+    assert [(e.x, e.y) for e in a.enemies] == \
+        [b.occupancy.positions[e] for e in b.enemies]
+
+
+def main():
+    rows = []
+    for width, height, floors in [(90, 52, 30), (200, 120, 30)]:
+        dungeon = Dungeon(height, width, new_PC('Player', 'Human'), seed=0)
+        kept = []
+        for _ in range(floors - 1):
+            kept.append(copy.deepcopy(dungeon.maps[dungeon.current]))
+            dungeon.descend()
+        cache = dungeon.maps
+
+        everything = sum(resident_size(f) for f in kept) + \
+            resident_size(cache[-1])
+        usage = cache.memory()
+        live = sum(size for _, state, size in usage if state == 'live')
+        packed = sum(size for _, state, size in usage if state == 'packed')
+
+        # Revisit an old floor: it comes back as it was left
+        same_floor(kept[0], cache[0])
+        assert cache.paged_in == 1
+
+        # NOTE: only room for one floor besides the current one and the one
+        #       above, so each access below unpacks one floor and packs one
+        cache.size = 3
+
+        def page_in():
+            cache[0]
+            cache[1]
+
+        t_page = best_of(page_in, 5) / 2
+        rows.append(('{}x{} x {}'.format(width, height, floors),
+                     everything // 1024, live // 1024, packed // 1024,
+                     sum(1 for u in usage if u[1] == 'live'),
+                     '{:.1f}'.format(t_page * 1000)))
+
+    report('Resident floor memory for a deep run (KB)', rows,
+           ['floors', 'all live', 'cache live', 'cache packed',
+            'live floors', 'page in ms'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+'''
+Player FOV per turn: two quickFOV style casts (one per vision radius, with
+a Python callback per cell for transparency) against a single cached cast
+at the outer radius. tests/test_fov.py checks that both see the same cells.
+'''
+import math
+import random
+import time
+
+import tcod.map
+
+from guildmaster.config import FOV_ALG, LIGHT_WALLS
+from guildmaster.dungeon.fov import FOV_ALGORITHMS, FieldOfView
+from guildmaster.dungeon.mapgen import Map
+
+from .common import report
+
+
+def quick_fov(floor, x, y, radius):
+    '''What tdl.map.quickFOV does: fill a window cell by cell then cast'''
+    size = radius * 2 + 1
+    fov_map = tcod.map.Map(size, size, order='C')
+    x0, y0 = x - radius, y - radius
+    for Y in range(size):
+        for X in range(size):
+            mx, my = x0 + X, y0 + Y
+            if 0 <= mx < floor.width and 0 <= my < floor.height:
+                tile = floor.lmap[my][mx]
+                fov_map.transparent[Y, X] = not tile.block_sight
+    fov_map.compute_fov(radius, radius, radius, LIGHT_WALLS,
+                        FOV_ALGORITHMS[FOV_ALG])
+    return {(x0 + X, y0 + Y)
+            for Y in range(size) for X in range(size)
+            if fov_map.fov[Y, X] and math.hypot(X - radius, Y - radius)
+            <= radius}
+
+
+def two_casts(floor, x, y, vision):
+    visible = quick_fov(floor, x, y, vision[0])
+    return visible, quick_fov(floor, x, y, vision[1]) - visible
+
+
+def turns(floor, count, seed=0):
+    '''Positions for a player wandering about, resting on some turns'''
+    rng = random.Random(seed)
+    x, y = floor.rooms[0].center
+    result = []
+    for _ in range(count):
+        dx, dy = rng.choice([(0, 1), (1, 0), (0, -1), (-1, 0), (0, 0)])
+        if not floor.lmap.block_move[y + dy, x + dx]:
+            x, y = x + dx, y + dy
+        result.append((x, y))
+    return result
+
+
+def main():
+    random.seed(1)
+    vision = (7, 10)
+    rows = []
+    for width, height in [(90, 52), (160, 90)]:
+        floor = Map(width, height, 0)
+        path = turns(floor, 200)
+        fov = FieldOfView()
+
+        start = time.perf_counter()
+        for x, y in path:
+            two_casts(floor, x, y, vision)
+        t_old = (time.perf_counter() - start) / len(path)
+
+        start = time.perf_counter()
+        for x, y in path:
+            fov.compute(floor.lmap, x, y, vision)
+        t_new = (time.perf_counter() - start) / len(path)
+
+
+        rows.append(('{}x{}'.format(width, height),
+                     '{:.3f}'.format(t_old * 1000),
+                     '{:.3f}'.format(t_new * 1000),
+                     '{:.1f}'.format(t_old / t_new),
+                     '{}/{}'.format(fov.cached, len(path))))
+
+    report('Player FOV: mean time per turn (ms)', rows,
+           ['size', 'two casts', 'cached single', 'speedup', 'cache hits'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+'''
+Hierarchical routing over rooms and corridors (PathFinder.route) against
+flat A* (PathFinder.search) for long paths between random rooms on large
+floors. The first batch of routes includes building the region planner,
+the second reuses it and the third follows a door opening or closing,
+which only drops what the planner knew about the regions either side of
+it. Every route is checked to be a legal path.
+'''
+import random
+
+import numpy as np
+
+from guildmaster.dungeon.grid import CLOSED_DOOR, OPEN_DOOR
+from guildmaster.dungeon.mapgen import build_floor
+from guildmaster.dungeon.pathfinding import PathFinder
+
+from .astar import path_cost
+from .common import best_of, report
+
+
+def route_costs(floor, find, pairs):
+    total = 0
+    for start, target in pairs:
+        path = find(start, target)
+        assert path[0] == start and path[-1] == target
+        total += path_cost(floor, path)
+    return total
+
+
+def main():
+    rows = []
+    for width, height in [(200, 120), (400, 240)]:
+        floor = build_floor(width, height, 1, 7)
+        rng = random.Random(0)
+        pairs = [tuple(r.random_point(rng=rng)
+                       for r in rng.sample(floor.rooms, 2))
+                 for _ in range(100)]
+        first, second = pairs[:50], pairs[50:]
+
+        finder = PathFinder(floor)
+        flat = route_costs(floor, finder.search, pairs)
+        t_flat = best_of(lambda: [finder.search(*p) for p in second], 3)
+
+        def cold():
+            finder.planner = None
+            for p in first:
+                finder.route(*p)
+
+        t_cold = best_of(cold, 3)
+        t_warm = best_of(lambda: [finder.route(*p) for p in second], 3)
+
+        lmap = floor.lmap
+        doors = np.argwhere(np.isin(lmap.kind, (CLOSED_DOOR, OPEN_DOOR)))
+        toggles = iter(random.Random(1).sample(doors.tolist(), 3))
+
+        def after_door():
+            y, x = next(toggles)
+            lmap.set_kind(x, y, OPEN_DOOR if lmap.kind[y, x] == CLOSED_DOOR
+                          else CLOSED_DOOR)
+            for p in second:
+                finder.route(*p)
+
+        t_door = best_of(after_door, 3)
+        routed = route_costs(floor, finder.route, pairs)
+
+        planner = finder.planner
+        rows.append(('{}x{}'.format(width, height), len(floor.rooms),
+                     planner.count, sum(map(len, planner.portals.values())),
+                     '{:.0f}'.format(t_flat * 1000),
+                     '{:.0f}'.format(t_cold * 1000),
+                     '{:.0f}'.format(t_warm * 1000),
+                     '{:.0f}'.format(t_door * 1000),
+                     '{:.1f}'.format(t_flat / t_warm),
+                     '{:.3f}'.format(routed / flat)))
+
+    report('50 long paths (ms)', rows,
+           ['floor', 'rooms', 'regions', 'portals', 'flat A*',
+            'routed (cold)', 'routed (warm)', 'after a door', 'speedup',
+            'cost ratio'])
+
+
+if __name__ == '__main__':
+    main()
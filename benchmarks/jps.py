@@ -0,0 +1,61 @@
+'''
+Jump point search against plain A* on seeded floors and on an open cavern
+with scattered pillars and a few doors (tests/test_pathfinding.py checks
+that jump point paths cost exactly the same as the A* ones).
+'''
+import random
+
+from guildmaster.dungeon.grid import CLOSED_DOOR, FLOOR, WALL
+from guildmaster.dungeon.mapgen import Map, build_floor
+from guildmaster.dungeon.pathfinding import PathFinder
+
+from .common import best_of, report
+
+
+def cavern(width, height, seed):
+    '''One big room with pillars and some doors in the way'''
+    rng = random.Random(seed)
+    floor = Map(width, height, 0, generate=False)
+    grid = floor.lmap
+    grid.fill(1, 1, width - 1, height - 1, FLOOR)
+    for _ in range(width * height // 60):
+        x, y = rng.randrange(2, width - 3), rng.randrange(2, height - 3)
+        grid.path_cost[y:y+2, x:x+2] = 0
+        grid.fill(x, y, x + 2, y + 2, WALL)
+    for _ in range(width * height // 400):
+        x, y = rng.randrange(1, width - 1), rng.randrange(1, height - 1)
+        grid.set_kind(x, y, CLOSED_DOOR)
+    return floor
+
+
+def random_pairs(floor, count, seed):
+    rng = random.Random(seed)
+    xs, ys = (floor.lmap.path_cost.T > 0).nonzero()
+    cells = list(zip(xs.tolist(), ys.tolist()))
+    return [tuple(rng.sample(cells, 2)) for _ in range(count)]
+
+
+def main():
+    rows = []
+    scenarios = []
+    floor = build_floor(80, 40, 1, 1)
+    scenarios.append(('80x40 floor', floor, random_pairs(floor, 50, 0)))
+    floor = build_floor(200, 120, 1, 1)
+    scenarios.append(('200x120 floor', floor, random_pairs(floor, 50, 0)))
+    floor = cavern(200, 120, 0)
+    scenarios.append(('200x120 cavern', floor, random_pairs(floor, 50, 0)))
+
+    for label, floor, pairs in scenarios:
+        finder = PathFinder(floor)
+        t_astar = best_of(lambda: [finder.search(*p) for p in pairs], 3)
+        t_jps = best_of(lambda: [finder.jump_search(*p) for p in pairs], 3)
+        rows.append((label, '{:.0f}'.format(t_astar * 1000),
+                     '{:.0f}'.format(t_jps * 1000),
+                     '{:.1f}'.format(t_astar / t_jps)))
+
+    report('50 paths between random cells (ms)', rows,
+           ['scenario', 'A*', 'jump points', 'speedup'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+'''
+Line of sight from many creatures to the player: has_los in a loop
+against one batched los_mask call (tests/test_los.py checks that the two
+agree and that the lines are unbroken).
+'''
+import random
+
+import numpy as np
+
+from guildmaster.dungeon.mapgen import build_floor
+from guildmaster.dungeon.pathfinding import PathFinder
+
+from .common import best_of, report
+
+
+def main():
+    rng = random.Random(0)
+    floor = build_floor(200, 120, 1, 3)
+    finder = PathFinder(floor)
+    target = floor.starting_x, floor.starting_y
+    xs, ys = (~floor.lmap.block_move).T.nonzero()
+    cells = list(zip(xs.tolist(), ys.tolist()))
+
+    rows = []
+    for count in (len(floor.enemies), 500, 5000):
+        starts = [(e.x, e.y) for e in floor.enemies][:count]
+        starts += rng.sample(cells, count - len(starts))
+        mask = finder.los_mask(starts, target)
+
+        t_loop = best_of(
+            lambda: [finder.has_los(s, target) for s in starts], 5)
+        t_mask = best_of(lambda: finder.los_mask(starts, target), 5)
+        rows.append((count, int(np.sum(mask)),
+                     '{:.2f}'.format(t_loop * 1000),
+                     '{:.2f}'.format(t_mask * 1000),
+                     '{:.1f}'.format(t_loop / t_mask)))
+
+    report('Line of sight to the player on a 200x120 floor (ms)', rows,
+           ['creatures', 'can see', 'has_los loop', 'los_mask', 'speedup'])
+
+
+if __name__ == '__main__':
+    main()
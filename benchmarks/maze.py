@@ -0,0 +1,65 @@
+'''
+Maze generation: the old recursive Maze.walk with its string building
+against the iterative walk over a single cell array. The recursive walk
+runs out of stack beyond small mazes. tests/test_mapgen.py checks that
+mazes from the new walk are perfect.
+'''
+import random
+import sys
+
+from guildmaster.dungeon.mazemap import Maze
+
+from .common import best_of, report
+
+
+def legacy_generate(width, height, rng):
+    '''Maze.generate as it was before the single cell representation'''
+    visited = [[0] * width + [1] for _ in range(height)]
+    visited += [[1] * (width + 1)]
+    ver = [["|  "] * width + ['|'] for _ in range(height)] + [[]]
+    hor = [["+--"] * width + ['+'] for _ in range(height + 1)]
+
+    def walk(x, y):
+        visited[y][x] = 1
+        directions = [(x - 1, y), (x, y + 1), (x + 1, y), (x, y - 1)]
+        rng.shuffle(directions)
+        for (X, Y) in directions:
+            if not visited[Y][X]:
+                if X == x:
+                    hor[max(y, Y)][x] = "+  "
+                if Y == y:
+                    ver[y][max(x, X)] = "   "
+                walk(X, Y)
+
+    walk(rng.randrange(width), rng.randrange(height))
+    s = ""
+    for (h, v) in zip(hor, ver):
+        s += ''.join(h + ['\n'] + v + ['\n'])
+    return s
+
+
+def main():
+    rows = []
+    for size in (20, 30, 100, 1000, 2000):
+        repeat = 5 if size <= 100 else 1
+        try:
+            t_old = best_of(
+                lambda: legacy_generate(size, size, random.Random(0)),
+                repeat)
+            old = '{:.1f}'.format(t_old * 1000)
+        except RecursionError:
+            old = 'recursion limit ({})'.format(sys.getrecursionlimit())
+
+        maze = Maze(size, size, rng=random.Random(0))
+        t_cells = best_of(maze.cells, repeat)
+        t_text = best_of(maze.generate, repeat)
+        rows.append(('{0}x{0}'.format(size), old,
+                     '{:.1f}'.format(t_cells * 1000),
+                     '{:.1f}'.format(t_text * 1000)))
+
+    report('Maze generation (times in ms)', rows,
+           ['cells', 'recursive', 'iterative', 'iterative + text'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+'''
+Precomputed neighbour tables against rebuilding the neighbour list on every
+call, both in isolation and in the path_test.py A* scenario.
+'''
+import heapq
+import random
+
+from guildmaster.dungeon.mapgen import Dungeon
+from guildmaster.dungeon.pathfinding import PathFinder
+
+from .astar import build_path
+from .common import best_of, report
+
+
+def legacy_neighbouring_tiles(self, x, y, include_coords=False,
+                              include_offsets=False):
+    '''Map.neighbouring_tiles as it was before the neighbour tables'''
+    offsets = [(-1, 0), (1, 0), (0, -1), (0, 1),
+               (-1, -1), (-1, 1), (1, -1), (1, 1)]
+
+    tiles = []
+
+    for offset in offsets:
+        dx, dy = offset
+        X, Y = x + dx, y + dy
+        if (0 <= X < len(self.lmap[0])) and (0 <= Y < len(self.lmap)):
+            tiles.append(((X, Y), offset, self.lmap[Y][X]))
+
+    if include_coords:
+        return [(t[0], t[2]) for t in tiles]
+    elif include_offsets:
+        return [(t[1], t[2]) for t in tiles]
+    else:
+        return [t[2] for t in tiles]
+
+
+def legacy_a_star(floor, start, target):
+    '''PathFinder.a_star as it was before the neighbour tables'''
+    sx, sy = start
+    tx, ty = target
+    X, Y = (sx - tx), (sy - ty)
+
+    def heuristic(tile):
+        x, y = (tile[0] - tx), (tile[1] - ty)
+        heuristic = abs(tx - tile[0]) + abs(ty - tile[1])
+        cross = abs(x*Y - X*y)
+        return heuristic + (cross * 0.001)
+
+    open_set = [(0, start)]
+    came_from = {start: None}
+    cost_so_far = {start: 0}
+
+    while open_set:
+        current = heapq.heappop(open_set)[1]
+        if current == target:
+            break
+        x, y = current
+        for coords, tile in legacy_neighbouring_tiles(floor, x, y, True):
+            if tile.path_cost is not None:
+                cost = cost_so_far[current] + tile.path_cost
+                if (x - coords[0] != 0) and (y - coords[1] != 0):
+                    cost += 1
+                if coords not in cost_so_far or cost < cost_so_far[coords]:
+                    cost_so_far[coords] = cost
+                    heapq.heappush(open_set,
+                                   (cost + heuristic(coords), coords))
+                    came_from[coords] = current
+
+    return build_path(came_from, start, target)
+
+
+def all_neighbours(floor, func):
+    for y in range(floor.height):
+        for x in range(floor.width):
+            func(floor, x, y, True)
+
+
+def main():
+    random.seed(1)
+    floor = Dungeon(40, 80)[0]
+    finder = PathFinder(floor)
+    rooms = floor.rooms
+    start, target = rooms[0].center, rooms[-1].center
+
+    rows = []
+    t_old = best_of(lambda: all_neighbours(floor, legacy_neighbouring_tiles))
+    t_new = best_of(lambda: all_neighbours(floor,
+                                           type(floor).neighbouring_tiles))
+    rows.append(('neighbouring_tiles, every cell',
+                 '{:.2f}'.format(t_old * 1000), '{:.2f}'.format(t_new * 1000),
+                 '{:.1f}'.format(t_old / t_new)))
+
+    t_old = best_of(lambda: legacy_a_star(floor, start, target), 20)
+    t_new = best_of(lambda: finder.search(start, target), 20)
+    rows.append(('path_test.py: a_star room 0 -> last',
+                 '{:.2f}'.format(t_old * 1000), '{:.2f}'.format(t_new * 1000),
+                 '{:.1f}'.format(t_old / t_new)))
+
+    report('Neighbour lookups on an 80x40 floor', rows,
+           ['scenario', 'per call ms', 'tables ms', 'speedup'])
+
+
+if __name__ == '__main__':
+    main()
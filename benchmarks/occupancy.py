@@ -0,0 +1,52 @@
+'''
+Blocking checks for an enemy turn: scanning Map.objects (as GameObject.move
+used to) against looking the cell up in the floor's occupancy index.
+'''
+import random
+
+from guildmaster.config import MAX_ROOM_SIZE, MIN_ROOM_SIZE
+from guildmaster.dungeon.grid import OFFSETS
+from guildmaster.dungeon.mapgen import Map
+from guildmaster.player_character import new_PC
+
+from .common import best_of, report
+
+
+def legacy_blocked(floor, x, y):
+    for obj in floor.objects:
+        if obj.x == x and obj.y == y and obj.block_move:
+            return True
+    return False
+
+
+def indexed_blocked(floor, x, y):
+    return floor.occupancy.blocker(x, y) is not None
+
+
+def enemy_turn(floor, blocked):
+    '''Every enemy checks every cell it could step into'''
+    for enemy in floor.enemies:
+        for dx, dy in OFFSETS:
+            blocked(floor, enemy.x + dx, enemy.y + dy)
+
+
+def main():
+    random.seed(1)
+    rows = []
+    for width, height in [(90, 52), (200, 120), (400, 250)]:
+        floor = Map(width, height, 0, new_PC('Player', 'Human'))
+        count = len(floor.enemies)
+        t_old = best_of(lambda: enemy_turn(floor, legacy_blocked), 3)
+        t_new = best_of(lambda: enemy_turn(floor, indexed_blocked), 3)
+        rows.append(('{}x{}'.format(width, height), count,
+                     '{:.2f}'.format(t_old * 1000),
+                     '{:.2f}'.format(t_new * 1000),
+                     '{:.1f}'.format(t_old / t_new)))
+
+    report('Blocking checks for one enemy turn (ms), rooms {}-{}'.format(
+        MIN_ROOM_SIZE, MAX_ROOM_SIZE), rows,
+        ['size', 'enemies', 'scan objects', 'occupancy', 'speedup'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+'''
+Creatures chasing the player across a 200x120 floor, asking for a fresh
+path every tick, with and without the PathFinder path cache. The player
+moves to a new room every so often and a door is opened or closed to
+invalidate the cache. tests/test_pathfinding.py checks that cached paths
+cost the same as a fresh search.
+'''
+import random
+import time
+
+from guildmaster.dungeon.grid import CLOSED_DOOR
+from guildmaster.dungeon.mapgen import Dungeon
+from guildmaster.dungeon.pathfinding import PathFinder
+
+from .common import report
+
+
+def chase(floor, find, ticks=200, creatures=40):
+    '''Return the time taken to find every path in the chase'''
+    rng = random.Random(0)
+    grid = floor.lmap
+    doors = list(zip(*(grid.kind == CLOSED_DOOR).nonzero()))
+    positions = [r.random_point(rng=rng)
+                 for r in rng.choices(floor.rooms, k=creatures)]
+    target = floor.rooms[0].center
+    elapsed = 0
+
+    for tick in range(ticks):
+        if tick % 50 == 0:
+            target = rng.choice(floor.rooms).center
+        if doors and tick % 20 == 10:
+            y, x = rng.choice(doors)
+            tile = grid[y][x]
+            if tile.name == 'closed_door':
+                tile.open_door()
+            else:
+                tile.closed_door()
+
+        for ix, pos in enumerate(positions):
+            start = time.perf_counter()
+            path = find(pos, target)
+            elapsed += time.perf_counter() - start
+            if path and len(path) > 1:
+                positions[ix] = path[1]
+    return elapsed
+
+
+def main():
+    random.seed(2)
+    floor = Dungeon(120, 200)[0]
+
+    rows = []
+    finder = PathFinder(floor)
+    t_none = chase(floor, finder.search)
+    rows.append(('none', '{:.0f}'.format(t_none * 1000), '-', '-', '-',
+                 '-'))
+    for size in (16, 64, 256):
+        finder = PathFinder(floor)
+        finder.paths.size = size
+        elapsed = chase(floor, finder.a_star)
+        cache = finder.paths
+        queries = cache.hits + cache.suffix_hits + cache.misses
+        rows.append((size, '{:.0f}'.format(elapsed * 1000), cache.hits,
+                     cache.suffix_hits, cache.misses,
+                     '{:.0f}%'.format(100 * (queries - cache.misses) /
+                                      queries)))
+
+    report('8000 path queries while chasing the player', rows,
+           ['cache size', 'ms', 'hits', 'suffix hits', 'misses',
+            'hit rate'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+'''
+Room placement for Map generation: checking each candidate against every
+placed room for all MAX_ROOMS attempts against the RoomPlacer claimed-cell
+grid with its early stop. Both draw the same candidates from the same seed.
+Floors under ROOM_GRID_MIN_AREA (the game's own 90x52) keep the scan and try
+every candidate so there they should match the old placement exactly.
+'''
+import random
+import time
+
+from guildmaster.config import MAX_ROOMS, MAX_ROOM_SIZE, MIN_ROOM_SIZE
+from guildmaster.dungeon.mapgen import Map, Room
+from guildmaster.dungeon.placement import RoomPlacer
+
+from .common import best_of, report
+
+
+def candidates(width, height, seed):
+    '''The candidate rooms Map.__init__ would try, in order'''
+    rng = random.Random(seed)
+    for _ in range(MAX_ROOMS):
+        rwidth = rng.randint(MIN_ROOM_SIZE, MAX_ROOM_SIZE)
+        rheight = rng.randint(MIN_ROOM_SIZE, MAX_ROOM_SIZE)
+        x = rng.randint(0, width - rwidth - 1)
+        y = rng.randint(0, height - rheight - 1)
+        yield Room(x, y, rwidth, rheight)
+
+
+def legacy_placement(width, height, seed):
+    rooms = []
+    for new_room in candidates(width, height, seed):
+        for room in rooms:
+            if new_room.overlaps_with(room):
+                break
+        else:
+            rooms.append(new_room)
+    return rooms
+
+
+def grid_placement(width, height, seed):
+    rooms = []
+    placer = RoomPlacer(width, height, MIN_ROOM_SIZE)
+    for new_room in candidates(width, height, seed):
+        if placer.place(new_room):
+            rooms.append(new_room)
+        elif placer.exhausted:
+            break
+    return rooms, placer.attempts
+
+
+def main():
+    rows = []
+    for width, height in [(90, 52), (200, 120), (400, 250), (800, 500)]:
+        old_rooms = new_rooms = attempts = 0
+        for seed in range(5):
+            old = legacy_placement(width, height, seed)
+            new, tries = grid_placement(width, height, seed)
+            # The early stop can only drop rooms off the end
+            assert [r.__dict__ for r in new] == \
+                [r.__dict__ for r in old[:len(new)]]
+            old_rooms += len(old)
+            new_rooms += len(new)
+            attempts += tries
+
+        t_old = best_of(lambda: legacy_placement(width, height, 0), 3)
+        t_new = best_of(lambda: grid_placement(width, height, 0), 3)
+        if width * height <= 200 * 120:
+            random.seed(0)
+            start = time.perf_counter()
+            Map(width, height, 0)
+            t_map = '{:.1f}'.format((time.perf_counter() - start) * 1000)
+        else:
+            t_map = '-'
+        rows.append(('{}x{}'.format(width, height),
+                     '{:.1f}'.format(old_rooms / 5),
+                     '{:.1f}'.format(new_rooms / 5),
+                     '{:.0f}'.format(attempts / 5),
+                     '{:.2f}'.format(t_old * 1000),
+                     '{:.2f}'.format(t_new * 1000),
+                     '{:.1f}'.format(t_old / t_new), t_map))
+
+    report('Room placement, mean of 5 seeds (times in ms)', rows,
+           ['size', 'rooms', 'rooms (early stop)', 'attempts', 'scan',
+            'grid', 'speedup', 'whole Map()'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+'''
+Frame time of the map renderers, run headless against an off-screen tcod
+console: the original per-cell render loop, the retained mode MapRenderer
+and the bulk ArrayRenderer.
+'''
+import random
+import time
+
+import numpy as np
+import tcod.console
+
+from guildmaster.config import BLACK, DIM_FG1, DIM_FG2
+from guildmaster.dungeon.mapgen import Map
+from guildmaster.render import ArrayRenderer, MapRenderer
+
+from .common import report
+
+
+class DrawCharConsole:
+    '''The tdl draw_char API on top of an off-screen tcod console'''
+    def __init__(self, width, height):
+        self.console = tcod.console.Console(width, height, order='C')
+        self.ch = self.console.ch
+        self.fg = self.console.fg
+        self.bg = self.console.bg
+
+    def draw_char(self, x, y, char, fg=None, bg=None):
+        self.ch[y, x] = ord(char)
+        if fg is not None:
+            self.fg[y, x] = fg
+        if bg is not None:
+            self.bg[y, x] = bg
+
+
+class LegacyRenderer:
+    '''The render loop from GameScreen.render_map before MapRenderer'''
+    def __init__(self, con):
+        self.con = con
+
+    def render(self, lmap, visible, visible2, magic, objects):
+        for y, row in enumerate(lmap):
+            for x, tile in enumerate(row):
+                if (x, y) in visible:
+                    tile.explored = True
+                    self.con.draw_char(x, y, tile.char, fg=tile.fg, bg=tile.bg)
+                elif (x, y) in visible2:
+                    self.con.draw_char(x, y, tile.char, fg=DIM_FG2, bg=BLACK)
+                elif (x, y) in magic:
+                    self.con.draw_char(x, y, tile.char, fg=tile.fg, bg=BLACK)
+                elif tile.explored:
+                    self.con.draw_char(x, y, tile.char, fg=DIM_FG1, bg=BLACK)
+                else:
+                    self.con.draw_char(x, y, ' ', fg=None, bg=BLACK)
+
+            for obj in filter(None, objects):
+                if (obj.x, obj.y) in visible or (obj.x, obj.y) in magic:
+                    self.con.draw_char(obj.x, obj.y, obj.char, obj.colour)
+
+
+def disc(floor, x, y, radius):
+    '''Stand in for FOV: every cell within radius'''
+    xs = range(max(x - radius, 0), min(x + radius + 1, floor.width))
+    ys = range(max(y - radius, 0), min(y + radius + 1, floor.height))
+    return {(X, Y) for X in xs for Y in ys
+            if (X - x) ** 2 + (Y - y) ** 2 <= radius ** 2}
+
+
+def frames(floor, count, seed=0):
+    '''Visibility sets for a player wandering about the floor'''
+    rng = random.Random(seed)
+    x, y = floor.rooms[0].center
+    result = []
+    for _ in range(count):
+        dx, dy = rng.choice([(0, 1), (1, 0), (0, -1), (-1, 0), (0, 0)])
+        if not floor.lmap.block_move[y + dy, x + dx]:
+            x, y = x + dx, y + dy
+        inner = disc(floor, x, y, 7)
+        result.append((inner, disc(floor, x, y, 10) - inner))
+    return result
+
+
+def check_same_output(floor, views):
+    '''Both new renderers must leave the console in the same state'''
+    a = DrawCharConsole(floor.width, floor.height)
+    b = DrawCharConsole(floor.width, floor.height)
+    retained, bulk = MapRenderer(a), ArrayRenderer(b.console)
+    for visible, visible2 in views:
+        retained.render(floor.lmap, visible, visible2, set(), floor.objects)
+        bulk.render(floor.lmap, visible, visible2, set(), floor.objects)
+        assert np.array_equal(a.ch, b.ch) and np.array_equal(a.bg, b.bg)
+        drawn = a.ch != ord(' ')
+        assert np.array_equal(a.fg[drawn], b.fg[drawn])
+
+
+def time_frames(renderer, floor, views):
+    start = time.perf_counter()
+    for visible, visible2 in views:
+        renderer.render(floor.lmap, visible, visible2, set(), floor.objects)
+    return (time.perf_counter() - start) / len(views)
+
+
+def main():
+    random.seed(1)
+    rows = []
+    for width, height in [(90, 52), (160, 90)]:
+        floor = Map(width, height, 0)
+        views = frames(floor, 100)
+        check_same_output(floor, views)
+        timings = []
+        for make in (LegacyRenderer, MapRenderer):
+            timings.append(time_frames(
+                make(DrawCharConsole(width, height)), floor, views))
+        timings.append(time_frames(
+            ArrayRenderer(tcod.console.Console(width, height)), floor, views))
+        rows.append(['{}x{}'.format(width, height)] +
+                    ['{:.3f}'.format(t * 1000) for t in timings])
+
+    report('Map render: mean frame time (ms, headless)', rows,
+           ['size', 'per cell', 'dirty cells', 'bulk arrays'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+'''
+Save and load times and file sizes for a deep run, for each save codec,
+against pickling the whole dungeon (tests/test_savegame.py checks that the
+saves round trip).
+'''
+import os
+import pickle
+import random
+import tempfile
+
+import numpy as np
+
+from guildmaster import savegame
+from guildmaster.dungeon.mapgen import Dungeon
+from guildmaster.player_character import new_PC
+
+from .common import best_of, report
+
+
+def deep_run(width, height, floors, seed=0):
+    '''A dungeon the player has made their way down through'''
+    rng = random.Random(seed)
+    dungeon = Dungeon(height, width, new_PC('Player', 'Human'), seed=seed)
+    # NOTE: keep every floor live so that pickle has the whole run to save
+    dungeon.maps.size = floors
+    for _ in range(floors - 1):
+        floor = dungeon.maps[dungeon.current]
+        floor.lmap.explored[:] = np.random.default_rng(seed).random(
+            (height, width)) < 0.4
+        for enemy in rng.sample(floor.enemies, len(floor.enemies) // 2):
+            enemy.lose_hp(rng.randint(1, 20))
+        dungeon.descend()
+    return dungeon
+
+
+def main():
+    rows = []
+    directory = tempfile.mkdtemp()
+    for width, height, floors in [(90, 52, 10), (200, 120, 25)]:
+        dungeon = deep_run(width, height, floors)
+        player = dungeon.player
+        label = '{}x{} x {}'.format(width, height, floors)
+
+        state = (list(dungeon.maps), player)
+        t_dump = best_of(lambda: pickle.dumps(state), 3)
+        blob = pickle.dumps(state)
+        t_load = best_of(lambda: pickle.loads(blob), 3)
+        rows.append((label, 'pickle', len(blob) // 1024,
+                     '{:.1f}'.format(t_dump * 1000),
+                     '{:.1f}'.format(t_load * 1000), '-'))
+
+        for codec in savegame.CODECS:
+            path = os.path.join(directory, codec)
+            t_save = best_of(
+                lambda: savegame.save(path, dungeon, player, codec), 3)
+            t_lazy = best_of(lambda: savegame.load(path), 3)
+
+            def load_all():
+                loaded, _ = savegame.load(path)
+                loaded.maps.size = len(loaded.maps)
+                list(loaded.maps)
+                return loaded
+
+            t_full = best_of(load_all, 3)
+            rows.append((label, codec, os.path.getsize(path) // 1024,
+                         '{:.1f}'.format(t_save * 1000),
+                         '{:.1f}'.format(t_full * 1000),
+                         '{:.1f}'.format(t_lazy * 1000)))
+
+    report('Saving and loading a run (times in ms)', rows,
+           ['floors', 'format', 'KB', 'save', 'load all', 'load lazily'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+'''
+Enemy turns on a large, crowded floor: calling Creature.act for every enemy
+each tick (as GameScreen.run used to) against the TurnScheduler.
+'''
+import random
+import time
+
+import numpy as np
+
+from guildmaster.creatures import enemy
+from guildmaster.dungeon.mapgen import Map
+from guildmaster.player_character import new_PC
+from guildmaster.scheduler import TurnScheduler
+
+from .common import report
+
+
+class Screen:
+    '''Just enough of GameScreen for the enemies to take their turns'''
+    def __init__(self, floor, player):
+        self.current_map = floor
+        self.player = player
+
+    def send_enemy_to_back(self, obj):
+        pass
+
+
+def crowded_floor(width, height, count):
+    '''A floor with extra goblins dropped onto free floor cells'''
+    player = new_PC('Player', 'Human')
+    floor = Map(width, height, 0, player)
+    floor.occupancy.place(player, *floor.rooms[0].center)
+    ys, xs = np.nonzero(~floor.lmap.block_move)
+    for ix in random.sample(range(len(xs)), count - len(floor.enemies)):
+        x, y = int(xs[ix]), int(ys[ix])
+        if not floor.occupancy.at(x, y):
+            floor.spawn(enemy('Goblin', x, y))
+    return floor, player
+
+
+def legacy_tick(screen):
+    for e in screen.current_map.enemies:
+        e.act(screen)
+
+
+def time_ticks(tick, screen, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        tick(screen)
+    return (time.perf_counter() - start) / count
+
+
+def main():
+    rows = []
+    for width, height, count in [(200, 120, 1000), (300, 200, 3000)]:
+        random.seed(1)
+        floor, player = crowded_floor(width, height, count)
+        screen = Screen(floor, player)
+        floor.agro_field.update([((player.x, player.y), 0)],
+                                max(e.agro_range for e in floor.enemies))
+        scheduler = TurnScheduler()
+
+        t_old = time_ticks(legacy_tick, screen, 20)
+        t_new = time_ticks(scheduler.run, screen, 20)
+        rows.append(('{}x{}'.format(width, height), len(floor.enemies),
+                     scheduler.awake, '{:.2f}'.format(t_old * 1000),
+                     '{:.2f}'.format(t_new * 1000),
+                     '{:.1f}'.format(t_old / t_new)))
+
+    report('Enemy turns: mean time per tick (ms)', rows,
+           ['size', 'enemies', 'awake', 'act each', 'scheduler', 'speedup'])
+
+
+if __name__ == '__main__':
+    main()
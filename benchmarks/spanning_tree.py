@@ -0,0 +1,74 @@
+'''
+Map.generate_graph: the original Prim's (rebuilding every tree x remaining
+pair each step) against the array based Prim's, at 50, 500 and 5,000 rooms.
+'''
+import random
+import time
+
+from guildmaster.dungeon.mapgen import Map, Room
+
+from .common import best_of, report
+
+
+def legacy_spanning_tree(floor):
+    '''The MST part of Map.generate_graph as it was'''
+    rooms = set(floor.rooms)
+    G = {r: set() for r in rooms}
+    so_far = {floor.rooms[0]}
+
+    while len(so_far) < len(rooms):
+        remaining = rooms.difference(so_far)
+        weights = [(floor.room_cost(s, r), s, r)
+                   for s in so_far for r in remaining]
+        _, existing, new = min(weights, key=lambda w: w[0])
+        G[existing].add(new)
+        G[new].add(existing)
+        so_far.add(new)
+
+    return G
+
+
+def total_cost(floor, graph):
+    return sum(floor.room_cost(a, b) for a in graph for b in graph[a]) / 2
+
+
+def scattered_rooms(count, seed=0):
+    '''A bare Map holding count rooms with random (distinct) centres'''
+    rng = random.Random(seed)
+    side = int(count ** 0.5 * 20)
+    floor = Map.__new__(Map)
+    floor.rooms = []
+    for ID in range(count):
+        x, y = rng.randrange(side), rng.randrange(side)
+        floor.rooms.append(Room(x, y, 7, 7, ID))
+    return floor
+
+
+def main():
+    rows = []
+    for count in (50, 500, 5000):
+        floor = scattered_rooms(count)
+        t_new = best_of(lambda: floor.generate_graph(False), 3)
+        tree = floor.graph
+        assert sum(len(v) for v in tree.values()) == 2 * (count - 1)
+
+        if count <= 500:
+            start = time.perf_counter()
+            old = legacy_spanning_tree(floor)
+            t_old = time.perf_counter() - start
+            assert abs(total_cost(floor, old) - total_cost(floor, tree)) \
+                < 1e-6
+            old_ms = '{:.1f}'.format(t_old * 1000)
+            speedup = '{:.0f}'.format(t_old / t_new)
+        else:
+            # NOTE: this takes hours with the original version
+            old_ms = speedup = '-'
+
+        rows.append((count, old_ms, '{:.1f}'.format(t_new * 1000), speedup))
+
+    report('Minimum spanning tree over room centres (ms)', rows,
+           ['rooms', 'original', 'arrays', 'speedup'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+'''
+Memory use and construction time of the array backed TileGrid against the
+original list of lists of Tile objects.
+'''
+from guildmaster.config import DARK0, DARK1, DARK4
+from guildmaster.dungeon.grid import TileGrid, FLOOR
+
+from .common import best_of, peak_memory, report
+
+
+class LegacyTile:
+    '''The original per-cell Tile object (walls and floors only)'''
+    def __init__(self, name, room_id=-62):
+        self.explored = False
+        self.path_cost = None
+        self.agro_cost = 1
+        self.agro_weight = None
+        self.room_id = room_id
+        getattr(self, name)()
+
+    def wall(self):
+        self.name = 'wall'
+        self.char = '#'
+        self.fg, self.bg = DARK4, DARK1
+        self.block_move, self.block_sight = True, True
+        self.agro_cost = 4
+
+    def floor(self):
+        self.name = 'floor'
+        self.char = '.'
+        self.fg, self.bg = DARK4, DARK0
+        self.block_move, self.block_sight = False, False
+        self.path_cost = 1
+        self.agro_cost = 1
+
+
+def legacy_grid(width, height):
+    lmap = [[LegacyTile('wall') for x in range(width)] for y in range(height)]
+    # Carve out a room in the same way that Map.add_room used to
+    for x in range(1, width - 1):
+        for y in range(1, height - 1):
+            lmap[y][x] = LegacyTile('floor', 0)
+    return lmap
+
+
+def array_grid(width, height):
+    lmap = TileGrid(width, height)
+    lmap.fill(1, 1, width - 1, height - 1, FLOOR, 0)
+    return lmap
+
+
+def main():
+    rows = []
+    for width, height in [(90, 52), (250, 250), (500, 500)]:
+        repeat = 3 if width * height > 10000 else 10
+        t_legacy = best_of(lambda: legacy_grid(width, height), repeat)
+        t_array = best_of(lambda: array_grid(width, height), repeat)
+        _, m_legacy = peak_memory(lambda: legacy_grid(width, height))
+        _, m_array = peak_memory(lambda: array_grid(width, height))
+        rows.append((
+            '{}x{}'.format(width, height),
+            '{:.2f}'.format(t_legacy * 1000), '{:.2f}'.format(t_array * 1000),
+            '{:.1f}'.format(t_legacy / t_array),
+            '{:.0f}'.format(m_legacy / 1024), '{:.0f}'.format(m_array / 1024),
+            '{:.0f}'.format(m_legacy / m_array),
+        ))
+
+    report('Tile storage: list of Tile objects vs TileGrid', rows,
+           ['size', 'legacy ms', 'grid ms', 'speedup',
+            'legacy KiB', 'grid KiB', 'ratio'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+#! /usr/bin/python3.6
+'''
+Generate dungeon floors without the game and report on them.
+
+Floors are built from seeds in the same way as Dungeon builds them, so
+floor N of a run with --seed S is floor N of Dungeon(seed=S):
+
+    python3 generate_floors.py --count 5000 --seed 42
+    python3 generate_floors.py --seed 42 --show 3
+'''
+import argparse
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from guildmaster.dungeon.grid import KIND_IDS
+from guildmaster.dungeon.mapgen import build_floor
+from guildmaster.dungeon.pathfinding import PathFinder
+from guildmaster.dungeon.prefetch import floor_seed
+
+
+STATS = ['gen ms', 'rooms', 'enemies', 'floor %', 'doors', 'secret doors',
+         'path len', 'path ms']
+
+
+def floor_stats(width, height, seed, depth):
+    '''Build a single floor and measure it'''
+    start = time.perf_counter()
+    floor = build_floor(width, height, depth, floor_seed(seed, depth))
+    gen_time = time.perf_counter() - start
+
+    kind = floor.lmap.kind
+    start = time.perf_counter()
+    path = PathFinder(floor).a_star(floor.rooms[0].center,
+                                    floor.rooms[-1].center)
+    path_time = time.perf_counter() - start
+
+    return [gen_time * 1000, len(floor.rooms), len(floor.enemies),
+            100 * (~floor.lmap.block_move).mean(),
+            int((kind == KIND_IDS['closed_door']).sum()),
+            int((kind == KIND_IDS['secret_door']).sum()),
+            len(path) if path else 0, path_time * 1000]
+
+
+def _floor_stats(args):
+    return floor_stats(*args)
+
+
+def show(width, height, seed, depth):
+    '''Print a floor with the path from the first room to the last'''
+    floor = build_floor(width, height, depth, floor_seed(seed, depth))
+    path = PathFinder(floor).a_star(floor.rooms[0].center,
+                                    floor.rooms[-1].center) or []
+    on_path = set(path)
+    for y, row in enumerate(floor.lmap):
+        print(''.join('*' if (x, y) in on_path else tile.char
+                      for x, tile in enumerate(row)))
+    print('seed {} floor {}: {} rooms, path length {}'.format(
+        seed, depth, len(floor.rooms), len(path)))
+
+
+def summarise(results, elapsed, jobs):
+    '''Print min / mean / p95 / max for each statistic'''
+    count = len(results)
+    print('{} floors in {:.2f}s on {} processes ({:.0f} floors/s)'.format(
+        count, elapsed, jobs, count / elapsed))
+    print('{:>14} {:>9} {:>9} {:>9} {:>9}'.format(
+        '', 'min', 'mean', 'p95', 'max'))
+    for ix, name in enumerate(STATS):
+        values = sorted(r[ix] for r in results)
+        p95 = values[min(int(count * 0.95), count - 1)]
+        print('{:>14} {:>9.1f} {:>9.1f} {:>9.1f} {:>9.1f}'.format(
+            name, values[0], sum(values) / count, p95, values[-1]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('-n', '--count', type=int, default=1000,
+                        help='number of floors to generate')
+    parser.add_argument('--width', type=int, default=80)
+    parser.add_argument('--height', type=int, default=40)
+    parser.add_argument('--seed', type=int, default=None,
+                        help='dungeon seed (random if not given)')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+                        help='worker processes (default: all cores)')
+    parser.add_argument('--show', type=int, metavar='FLOOR', default=None,
+                        help='print a single floor instead')
+    args = parser.parse_args()
+
+    seed = random.getrandbits(32) if args.seed is None else args.seed
+    if args.show is not None:
+        show(args.width, args.height, seed, args.show)
+        return
+
+    print('seed {}, {}x{}'.format(seed, args.width, args.height))
+    tasks = [(args.width, args.height, seed, depth)
+             for depth in range(args.count)]
+    start = time.perf_counter()
+    if args.jobs > 1:
+        with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+            chunksize = max(len(tasks) // (args.jobs * 8), 1)
+            results = list(executor.map(_floor_stats, tasks,
+                                        chunksize=chunksize))
+    else:
+        results = [_floor_stats(task) for task in tasks]
+    summarise(results, time.perf_counter() - start, args.jobs)
+
+
+if __name__ == '__main__':
+    main()
@@ -55,6 +55,18 @@ DIM_FG2 = (37, 37, 37)
 MIN_ROOM_SIZE = 7
 MAX_ROOM_SIZE = 14
 MAX_ROOMS = 1000
+# 'rooms': place rooms at random and join them up (the original generator)
+# 'bsp': split the floor into a tree of areas with a room in each
+# 'maze': fill the floor with a maze and put a few rooms in it
+MAP_ALG = 'rooms'
+# Number of rooms to try to fit into a maze floor
+MAZE_ROOMS = 10
+# Stop placing rooms after this many failed attempts in a row
+ROOM_PLACEMENT_PATIENCE = 300
+# Floors with fewer cells than this check rooms against each other and try
+# every candidate: with only a few dozen rooms that is quicker than the
+# claimed cell grid and the early stop would only lose rooms
+ROOM_GRID_MIN_AREA = 150 * 100
 
 # FOV
 # BASIC, DIAMOND, SHADOW, PERMISSIVE, RESTRICTIVE
@@ -63,6 +75,53 @@ FOV_RADIUS1 = 7
 FOV_RADIUS2 = 10
 LIGHT_WALLS = True
 
+# Rendering
+# Compose the map as numpy arrays and write it to the console in one go
+# rather than redrawing the changed cells one at a time
+BULK_RENDER = True
+
+# Agro
+# Only flood the agro heatmap as far as the largest enemy agro range and
+# skip the update entirely when nothing relevant has changed
+AGRO_INCREMENTAL = True
+
+# Enemy turns
+# Enemies outside of their agro range only get a turn every this many ticks
+DORMANT_INTERVAL = 4
+
+# Pathfinding
+# Number of paths remembered by each PathFinder until the floor changes
+PATH_CACHE_SIZE = 256
+# Use jump point search (same paths, fewer tiles visited in open rooms)
+JUMP_POINT_SEARCH = True
+
+# Floor generation
+# Number of floors below the current one to build in background processes
+PREFETCH_DEPTH = 2
+# Number of floors kept in memory: the rest are packed away until needed.
+# The current floor and the ones either side of it are always kept.
+FLOOR_CACHE_SIZE = 5
+# Floors that have dropped out of the cache but are left to be packed while
+# the game is idle (rather than on the stairs)
+FLOOR_PACK_BACKLOG = 2
+
+# Saving
+# Compression for save files: 'none', 'zlib' or 'lzma'
+SAVE_COMPRESSION = 'zlib'
+SAVE_FILE = 'savegame.dat'
+
+# Open world
+# NOTE: nothing in the game builds a ChunkedMap (dungeon/chunks.py) yet so
+#       these only apply to the benchmarks and tests for now.
+# Chunked floors are built CHUNK_SIZE x CHUNK_SIZE cells at a time
+CHUNK_SIZE = 64
+# Number of chunks kept in memory: the rest are written to CHUNK_DIR (a
+# temporary directory if None) or dropped if they can be rebuilt. Chunks
+# within CHUNK_KEEP_RADIUS chunks of the player are always kept.
+CHUNK_CACHE_SIZE = 64
+CHUNK_KEEP_RADIUS = 2
+CHUNK_DIR = None
+
 
 # Panel config
 BAR_WIDTH = 16
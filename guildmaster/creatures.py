@@ -2,10 +2,12 @@
 Base classes and functions for creatures, NPCs and enemies
 '''
 import yaml
-from random import choice, randint
+import random
+from random import randint
 from .config import LIGHT0, BRIGHT_RED, FADED_RED, BRIGHT_YELLOW, FADED_GREEN
 from .config import BRIGHT_ORANGE, BRIGHT_PURPLE, LEVEL_UP_XP_MULTIPLIER
 from .utils import roll, SkillCheckResult, GameObject, Message
+from .dungeon.distance import downhill_step
 
 
 # load the enemy definitions
@@ -97,10 +99,10 @@ class Creature(GameObject):
         new_y = self.y + dy
 
         if self.player_character:
-            for obj in screen.current_map.objects:
-                if obj.alive and obj.x == new_x and obj.y == new_y:
-                    attack_messages = self.basic_attack(obj, screen)
-                    return attack_messages
+            target = screen.current_map.occupancy.creature_at(new_x, new_y)
+            if target is not None:
+                attack_messages = self.basic_attack(target, screen)
+                return attack_messages
         else:
             if screen.player.x == new_x and screen.player.y == new_y:
                 attack_messages = self.basic_attack(screen.player, screen)
@@ -283,33 +285,39 @@ class Creature(GameObject):
             return []
 
         floor = screen.current_map
-        messages = []
-        current_agro = floor.lmap[self.y][self.x].agro_weight
+        # NOTE: read the weights from the array: cells outside of the agro
+        #       field hold NO_AGRO rather than a weight
+        agro_weight = floor.lmap.agro_weight
+        current_agro = agro_weight[self.y, self.x]
         if current_agro <= self.agro_range:
             dx, dy = 0, 0
 
-            if randint(1, 100) <= 90:
-                # 90% chance of following the player
-                options = floor.neighbouring_tiles(self.x, self.y,
-                                                   include_offsets=True)
-                for offset, tile in options:
-                    if tile.agro_weight < current_agro and not tile.block_move:
-                        dx, dy = offset
-                        # x, y = self.x + dx, self.y + dy
-                        current_agro = tile.agro_weight
+            if self.chase_roll():
+                dx, dy = downhill_step(agro_weight, floor.lmap.block_move,
+                                       self.x, self.y)
         else:
-            # Either take a random step or stay put
-            if randint(0, 1) == 1:
-                dx, dy = randint(-1, 1), randint(-1, 1)
-            else:
-                dx, dy = 0, 0
+            dx, dy = self.wander_step()
 
         messages = self.move_or_melee(dx, dy, screen)
         return messages
 
+    @staticmethod
+    def chase_roll():
+        '''90% chance of following the player when in agro range'''
+        return randint(1, 100) <= 90
+
+    @staticmethod
+    def wander_step():
+        '''Either take a random step or stay put'''
+        if randint(0, 1) == 1:
+            return randint(-1, 1), randint(-1, 1)
+        else:
+            return 0, 0
+
 
-def enemy(name, x, y):
-    '''Create a new enemy'''
+def enemy(name, x, y, rng=None):
+    '''Create a new enemy, using rng (or the random module) for its kit'''
+    rng = random if rng is None else rng
     conf = enemies[name]
     STR, DEX, INT, VIT = conf['stats']
     enemy = Creature(
@@ -328,6 +336,6 @@ def enemy(name, x, y):
     enemy.agro_range = conf['agroRange']
 
     for equipment_type, options in conf['equipment'].items():
-        enemy.equipment['equipment_type'] = choice(options)
+        enemy.equipment['equipment_type'] = rng.choice(options)
 
     return enemy
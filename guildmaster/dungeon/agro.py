@@ -0,0 +1,221 @@
+'''
+Incrementally maintained agro heatmaps.
+
+Creatures only ever react to agro weights at or below their agro_range so
+there is no need to flood the whole floor: the field is only computed out to
+the largest agro_range on the floor and everything further away is left as
+NO_AGRO (which compares as 'very far away').
+'''
+import heapq
+
+import numpy as np
+
+from .grid import NO_AGRO
+
+
+def flood(grid, sources, limit=NO_AGRO):
+    '''
+    Heap based Dijkstra over the agro costs of a TileGrid, stopping once
+    past limit. Returns {(x, y): weight} for every cell reached within it.
+    '''
+    width = grid.width
+    weights = _flood(grid, sources, limit)
+    return {(ix % width, ix // width): c for ix, c in weights.items()}
+
+
+def _flood(grid, sources, limit):
+    '''flood keyed by flat index (y * width + x)'''
+    width = grid.width
+    open_set = []
+    cost_so_far = {}
+    for (x, y), weight in sources:
+        ix = y * width + x
+        if weight < cost_so_far.get(ix, NO_AGRO):
+            cost_so_far[ix] = weight
+            heapq.heappush(open_set, (weight, ix))
+
+    _relax(grid, cost_so_far, open_set, limit)
+    return {ix: c for ix, c in cost_so_far.items() if c <= limit}
+
+
+def _relax(grid, cost_so_far, open_set, limit):
+    '''
+    Run Dijkstra from the (weight, ix) entries in open_set, lowering the
+    weights in cost_so_far as cheaper routes are found. Returns the cells
+    that were lowered: those past limit are left in cost_so_far for the
+    caller to drop.
+    '''
+    agro_cost = grid.agro_cost.ravel()
+    neighbours = grid.neighbour_lists
+    lowered = []
+    while open_set:
+        cost, current = heapq.heappop(open_set)
+        if cost > limit:
+            # Everything left in the heap is at least this far away
+            break
+        if cost > cost_so_far[current]:
+            # Stale entry: we've already found a cheaper route here
+            continue
+
+        for n in neighbours[current]:
+            new_cost = cost + int(agro_cost[n])
+            if new_cost < cost_so_far.get(n, NO_AGRO):
+                cost_so_far[n] = new_cost
+                heapq.heappush(open_set, (new_cost, n))
+                lowered.append(n)
+    return lowered
+
+
+class AgroField:
+    '''
+    A bounded Dijkstra heatmap for a single map that is only recomputed
+    when something that can affect it has changed.
+
+    Between updates we remember the sources, the limit and the version of
+    the tile grid the field was built from along with the weight of every
+    cell that was written so that they can be reset without touching the
+    rest of the map. A change of tile kind inside the field (a door opening
+    or closing) is repaired locally: see repair.
+    '''
+    def __init__(self, grid):
+        self.grid = grid
+        self.sources = None
+        self.limit = None
+        self.version = None
+        # flat index -> weight for each cell within the limit
+        self.weights = {}
+        self.updates = 0
+        self.repairs = 0
+        self.skipped = 0
+
+    @property
+    def touched(self):
+        '''The (x, y) cells holding a weight'''
+        width = self.grid.width
+        return [(ix % width, ix // width) for ix in self.weights]
+
+    def update(self, sources, limit):
+        '''
+        Bring the field up to date for the given sources and limit.
+
+        sources is a list of ((x, y), weight) pairs and limit is the
+        highest weight that any creature will react to.
+        Returns True if the field had to be recomputed or repaired.
+
+        NOTE: a change of sources (every player step) is a full bounded
+              reflood rather than a repair. Moving the only source one
+              tile changes the weight of around 70% of the cells in the
+              field, so repairing it took twice as long as reflooding
+              (see benchmarks/agro.py).
+        '''
+        sources = tuple(sources)
+        if sources == self.sources and limit == self.limit:
+            changed = self._changed_cells()
+            if changed == []:
+                self.version = self.grid.version
+                self.skipped += 1
+                return False
+            if changed is not None:
+                self.repair(changed)
+                self.version = self.grid.version
+                self.repairs += 1
+                return True
+
+        self.reset()
+        self.weights = _flood(self.grid, sources, limit)
+        self._write(self.weights)
+        self.sources = sources
+        self.limit = limit
+        self.version = self.grid.version
+        self.updates += 1
+        return True
+
+    def reset(self):
+        '''Clear the cells written by the last update'''
+        np.put(self.grid.agro_weight, list(self.weights), NO_AGRO)
+        self.weights = {}
+        self.sources = None
+
+    def repair(self, cells):
+        '''
+        Patch the field after the agro cost of some (x, y) cells changed,
+        touching only the cells whose weight could depend on them.
+
+        Anything whose weight might have been reached through a changed
+        cell (a neighbour whose weight is exactly one step more) is
+        cleared, then refilled from the untouched cells around it and
+        relaxed outwards: which also spreads any drop in cost (an opened
+        door) into the rest of the field.
+        '''
+        grid, weights, limit = self.grid, self.weights, self.limit
+        width = grid.width
+        agro_cost = grid.agro_cost.ravel()
+        neighbours = grid.neighbour_lists
+        seeds = [y * width + x for x, y in cells]
+
+        cleared = set()
+        stack = [ix for ix in seeds if ix in weights]
+        while stack:
+            ix = stack.pop()
+            if ix in cleared:
+                continue
+            cleared.add(ix)
+            weight = weights[ix]
+            for n in neighbours[ix]:
+                if n not in cleared and \
+                        weights.get(n) == weight + int(agro_cost[n]):
+                    stack.append(n)
+        for ix in cleared:
+            del weights[ix]
+
+        start = {}
+        for (x, y), weight in self.sources:
+            ix = y * width + x
+            start[ix] = min(weight, start.get(ix, NO_AGRO))
+        open_set = []
+        for ix in cleared.union(seeds):
+            best = start.get(ix, NO_AGRO)
+            cost = int(agro_cost[ix])
+            for n in neighbours[ix]:
+                if n in weights and weights[n] + cost < best:
+                    best = weights[n] + cost
+            if best < weights.get(ix, NO_AGRO):
+                weights[ix] = best
+                open_set.append((best, ix))
+        heapq.heapify(open_set)
+
+        touched = cleared.union(ix for _, ix in open_set)
+        touched.update(_relax(grid, weights, open_set, limit))
+        changed = {}
+        for ix in touched:
+            weight = weights.get(ix, NO_AGRO)
+            if weight > limit:
+                weights.pop(ix, None)
+                weight = NO_AGRO
+            changed[ix] = weight
+        self._write(changed)
+
+    def _write(self, weights):
+        '''Copy {flat index: weight} into the grid's agro weights'''
+        if weights:
+            np.put(self.grid.agro_weight, list(weights),
+                   list(weights.values()))
+
+    def _changed_cells(self):
+        '''
+        The cells that have changed kind since the last update and can have
+        altered the field: changes to cells that neither hold nor border an
+        agro weight can't have done. None if the changes are unknown.
+        '''
+        if self.version == self.grid.version:
+            return []
+        changes = self.grid.changes_since(self.version)
+        if changes is None:
+            return None
+
+        weights = self.weights
+        width = self.grid.width
+        neighbours = self.grid.neighbour_lists
+        return [(x, y) for x, y in changes
+                if y * width + x in weights or
+                any(n in weights for n in neighbours[y * width + x])]
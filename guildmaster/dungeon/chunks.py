@@ -0,0 +1,406 @@
+'''
+Open world floors that are too big to keep in memory.
+
+The world is a grid of CHUNK_SIZE square chunks. Each one is built on
+demand from the world seed and its chunk coordinates (rooms joined up as on
+a normal floor) with a gate on each side that lines up with the gate of the
+chunk next to it, so the corridors carry on from one chunk into the next.
+
+Chunks are held in an LRU cache (ChunkStore). Those that drop out of it are
+written to disk if they have changed since they were built and are simply
+built again from their seed otherwise.
+
+Anything that has to look across chunk boundaries (rendering, paths, agro)
+works on an Area: a TileGrid pasted together from the chunks covering a
+rectangle of the world, with its own coordinates.
+'''
+import os
+import random
+import shutil
+import tempfile
+from collections import OrderedDict
+
+import numpy as np
+
+from .agro import flood
+from .grid import TileGrid, FLOOR
+from .mapgen import Map
+from .pathfinding import PathFinder, DIAGONAL_PENALTY
+from ..config import CHUNK_SIZE, CHUNK_CACHE_SIZE, CHUNK_KEEP_RADIUS
+from ..config import CHUNK_DIR
+
+
+# Number of Areas remembered by a ChunkedMap (the camera, paths, agro...)
+AREA_CACHE_SIZE = 4
+
+
+def path_cost(grid, path):
+    '''What a path of (x, y) on grid costs (as PathFinder.search counts)'''
+    cost = 0
+    for (x1, y1), (x2, y2) in zip(path, path[1:]):
+        cost += int(grid.path_cost[y2, x2])
+        if x1 != x2 and y1 != y2:
+            cost += DIAGONAL_PENALTY
+    return cost
+
+
+def chunk_seed(seed, cx, cy):
+    '''The seed for chunk (cx, cy) of a world'''
+    return random.Random('{}:{}:{}'.format(seed, cx, cy)).getrandbits(64)
+
+
+def gate(seed, cx, cy, side, size):
+    '''
+    Position along the east ('e') or south ('s') edge of chunk (cx, cy) of
+    the gate through it. The chunk on the other side works out the same.
+    '''
+    rng = random.Random('{}:{}:{}:{}'.format(seed, cx, cy, side))
+    return rng.randint(2, size - 3)
+
+
+def gates(seed, cx, cy, size, chunks_x, chunks_y):
+    '''
+    (x, y, horizontal) for the cells on the edges of a chunk that open
+    onto its neighbours: horizontal if the gate is on the east or west side.
+    '''
+    last = size - 1
+    found = []
+    if cx + 1 < chunks_x:
+        found.append((last, gate(seed, cx, cy, 'e', size), True))
+    if cx > 0:
+        found.append((0, gate(seed, cx - 1, cy, 'e', size), True))
+    if cy + 1 < chunks_y:
+        found.append((gate(seed, cx, cy, 's', size), last, False))
+    if cy > 0:
+        found.append((gate(seed, cx, cy - 1, 's', size), 0, False))
+    return found
+
+
+def build_chunk(seed, cx, cy, size=CHUNK_SIZE, chunks_x=1, chunks_y=1):
+    '''Generate the tiles of chunk (cx, cy) of a chunks_x x chunks_y world'''
+    floor = Map(size, size, 0, rng=random.Random(chunk_seed(seed, cx, cy)),
+                generate=False)
+    floor.place_rooms()
+    floor.generate_graph()
+    floor.connect()
+    grid = floor.lmap
+    # NOTE: there are no stairs in the open world
+    grid.set_kind(floor.starting_x, floor.starting_y, FLOOR)
+
+    # Run a corridor out to each gate from the closest room
+    centres = np.array([r.center for r in floor.rooms])
+    segments = []
+    for gx, gy, horizontal in gates(seed, cx, cy, size, chunks_x, chunks_y):
+        distance = np.abs(centres - (gx, gy)).sum(axis=1)
+        rx, ry = centres[np.argmin(distance)].tolist()
+        if horizontal:
+            segments.append((rx, ry, gy, False))
+            segments.append((gy, rx, gx, True))
+        else:
+            segments.append((ry, rx, gx, True))
+            segments.append((gx, ry, gy, False))
+    grid.carve(segments, FLOOR)
+    floor.add_doors()
+    return grid
+
+
+class ChunkStore:
+    '''
+    LRU cache of chunk TileGrids keyed by (cx, cy). build(cx, cy) makes a
+    chunk from scratch.
+
+    At most size chunks are kept in memory, dropping the least recently
+    used first, but never those within keep chunks of the focus (see
+    focus). Chunks that have changed since they were built are written to
+    directory as they are dropped and read back from there when needed.
+    '''
+    def __init__(self, build, directory, size=CHUNK_CACHE_SIZE,
+                 keep=CHUNK_KEEP_RADIUS):
+        self.build = build
+        self.directory = directory
+        self.size = size
+        self.keep = keep
+        self.chunks = OrderedDict()  # key -> TileGrid, least recent first
+        self.versions = {}  # key -> version of the grid when built / read
+        self.changed = set()  # changes that don't bump the version
+        self.saved = set()  # keys with a file in directory
+        self.focus_chunk = (0, 0)
+        self.built = 0
+        self.read = 0
+        self.written = 0
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def __contains__(self, key):
+        return key in self.chunks
+
+    def __getitem__(self, key):
+        grid = self.chunks.get(key)
+        if grid is not None:
+            self.chunks.move_to_end(key)
+            return grid
+
+        if key in self.saved:
+            grid = self._read(key)
+        else:
+            grid = self.build(*key)
+            self.built += 1
+        self.chunks[key] = grid
+        self.versions[key] = grid.version
+        self._evict(keep=key)
+        return grid
+
+    def path(self, key):
+        return os.path.join(self.directory, '{}_{}.npz'.format(*key))
+
+    def mark_changed(self, key):
+        '''Note a change to a chunk that didn't go through set_kind'''
+        self.changed.add(key)
+
+    def focus(self, cx, cy):
+        '''Set the chunk the player is in: those around it stay in memory'''
+        self.focus_chunk = (cx, cy)
+        self._evict()
+
+    def pinned(self, key):
+        fx, fy = self.focus_chunk
+        return max(abs(key[0] - fx), abs(key[1] - fy)) <= self.keep
+
+    def flush(self):
+        '''Write every changed chunk in memory to disk'''
+        for key, grid in self.chunks.items():
+            if self._is_changed(key, grid):
+                self._write(key, grid)
+                self.versions[key] = grid.version
+        self.changed.clear()
+
+    def _is_changed(self, key, grid):
+        return key in self.changed or grid.version != self.versions[key]
+
+    def _evict(self, keep=None):
+        '''Drop the least recently used chunks until there are size left'''
+        for key in list(self.chunks):
+            if len(self.chunks) <= self.size:
+                break
+            if key == keep or self.pinned(key):
+                continue
+            grid = self.chunks.pop(key)
+            if self._is_changed(key, grid):
+                self._write(key, grid)
+            del self.versions[key]
+            self.changed.discard(key)
+
+    def _write(self, key, grid):
+        # NOTE: the rest of the arrays follow from the tile kinds
+        np.savez_compressed(self.path(key), kind=grid.kind,
+                            path_cost=grid.path_cost, explored=grid.explored,
+                            room_id=grid.room_id)
+        self.saved.add(key)
+        self.written += 1
+
+    def _read(self, key):
+        with np.load(self.path(key)) as data:
+            height, width = data['kind'].shape
+            grid = TileGrid(width, height)
+            grid.restore(data['kind'], data['path_cost'], data['explored'],
+                         data['room_id'])
+        self.read += 1
+        return grid
+
+
+class Area:
+    '''
+    A rectangle of the world pasted together from whole chunks: lmap holds
+    the cells from (x, y) to (x + lmap.width, y + lmap.height). It is a
+    copy, so changes to it only reach the world through the ChunkedMap.
+    '''
+    def __init__(self, lmap, x, y, sources):
+        self.lmap = lmap
+        self.x = x
+        self.y = y
+        self.sources = sources  # ((cx, cy), grid, version) for each chunk
+
+    def local(self, x, y):
+        '''World coordinates to coordinates on lmap'''
+        return x - self.x, y - self.y
+
+    def world(self, x, y):
+        '''Coordinates on lmap to world coordinates'''
+        return x + self.x, y + self.y
+
+    def is_current(self, store):
+        '''Check that none of the chunks have changed since it was made'''
+        return all(key in store and store.chunks[key] is grid and
+                   grid.version == version
+                   for key, grid, version in self.sources)
+
+
+class ChunkedMap:
+    '''
+    An open world floor of chunks_x by chunks_y chunks, each of which is
+    only built (or read back from disk) once something looks at it.
+
+    Coordinates are world coordinates throughout. Chunks are kept under
+    directory, a temporary directory that is removed by close() if None.
+    '''
+    def __init__(self, chunks_x, chunks_y, seed=None, size=CHUNK_SIZE,
+                 directory=CHUNK_DIR, cache_size=CHUNK_CACHE_SIZE,
+                 rng=None):
+        if seed is None:
+            seed = (random if rng is None else rng).getrandbits(64)
+        self.seed = seed
+        self.size = size
+        self.chunks_x = chunks_x
+        self.chunks_y = chunks_y
+        self.width = chunks_x * size
+        self.height = chunks_y * size
+
+        self.temporary = directory is None
+        if directory is None:
+            directory = tempfile.mkdtemp(prefix='guildmaster-chunks-')
+        else:
+            os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.store = ChunkStore(self._build, directory, cache_size)
+        self.areas = OrderedDict()  # chunk rectangle -> Area
+        self.pathfinder = PathFinder()
+
+    def _build(self, cx, cy):
+        return build_chunk(self.seed, cx, cy, self.size, self.chunks_x,
+                           self.chunks_y)
+
+    def chunk_of(self, x, y):
+        return x // self.size, y // self.size
+
+    def chunk(self, cx, cy):
+        '''The TileGrid of a chunk (building or reading it if needed)'''
+        if not (0 <= cx < self.chunks_x and 0 <= cy < self.chunks_y):
+            raise IndexError('chunk out of range')
+        return self.store[cx, cy]
+
+    def focus(self, x, y):
+        '''Keep the chunks around the cell (x, y) in memory'''
+        self.store.focus(*self.chunk_of(x, y))
+
+    def tile(self, x, y):
+        '''Tile view onto a cell: changes to it go straight to the chunk'''
+        cx, cy = self.chunk_of(x, y)
+        return self.chunk(cx, cy).tile(x - cx * self.size, y - cy * self.size)
+
+    def set_kind(self, x, y, kind):
+        cx, cy = self.chunk_of(x, y)
+        self.chunk(cx, cy).set_kind(x - cx * self.size, y - cy * self.size,
+                                    kind)
+
+    def area(self, x1, y1, x2, y2):
+        '''
+        An Area covering the cells [x1, x2) x [y1, y2), clipped to the
+        world and rounded out to whole chunks. Areas are reused until one
+        of their chunks changes.
+        '''
+        size = self.size
+        cx1, cy1 = max(x1 // size, 0), max(y1 // size, 0)
+        cx2 = min((x2 - 1) // size + 1, self.chunks_x)
+        cy2 = min((y2 - 1) // size + 1, self.chunks_y)
+        rect = (cx1, cy1, cx2, cy2)
+
+        area = self.areas.get(rect)
+        if area is not None and area.is_current(self.store):
+            self.areas.move_to_end(rect)
+            return area
+
+        grid = TileGrid((cx2 - cx1) * size, (cy2 - cy1) * size)
+        sources = []
+        for cy in range(cy1, cy2):
+            for cx in range(cx1, cx2):
+                chunk = self.chunk(cx, cy)
+                grid.paste(chunk, (cx - cx1) * size, (cy - cy1) * size)
+                sources.append(((cx, cy), chunk, chunk.version))
+        area = self.areas[rect] = Area(grid, cx1 * size, cy1 * size, sources)
+        self.areas.move_to_end(rect)
+        if len(self.areas) > AREA_CACHE_SIZE:
+            self.areas.popitem(last=False)
+        return area
+
+    def keep_explored(self, area):
+        '''Copy the cells marked as explored on an Area into the world'''
+        size = self.size
+        explored = area.lmap.explored
+        for (cx, cy), _, _ in area.sources:
+            x, y = area.local(cx * size, cy * size)
+            seen = explored[y:y+size, x:x+size]
+            chunk = self.chunk(cx, cy)
+            if (seen & ~chunk.explored).any():
+                chunk.explored |= seen
+                self.store.mark_changed((cx, cy))
+
+    def path(self, start, target, margin=None):
+        '''
+        Shortest path between two cells as a list of (x, y), or None. The
+        search is run on the Area around both ends, widening it (as far as
+        the whole world) until a path is found that no path leaving the
+        Area could beat (see exit_cost).
+        '''
+        margin = self.size if margin is None else margin
+        (sx, sy), (tx, ty) = start, target
+        while True:
+            area = self.area(min(sx, tx) - margin, min(sy, ty) - margin,
+                             max(sx, tx) + margin + 1,
+                             max(sy, ty) + margin + 1)
+            self.pathfinder.map = area
+            path = self.pathfinder.a_star(area.local(sx, sy),
+                                          area.local(tx, ty))
+            bound = self.exit_cost(area, start, target)
+            if path is None:
+                if bound == float('inf'):  # the Area is the whole world
+                    return None
+                margin *= 2
+                continue
+            cost = path_cost(area.lmap, path)
+            if cost <= bound:
+                return [area.world(x, y) for x, y in path]
+            # NOTE: only just wide enough for the bound to cover this path,
+            #       which is as long as the shortest one can be
+            margin = max(margin + 1, (cost + 1) // 2)
+
+    def exit_cost(self, area, start, target):
+        '''
+        A lower bound on the cost of any path from start to target that
+        goes outside area: it has to step out over one of the sides that
+        are not the edge of the world and back, and every step costs at
+        least one.
+        '''
+        (sx, sy), (tx, ty) = start, target
+        x1, y1 = area.world(0, 0)
+        x2, y2 = x1 + area.lmap.width, y1 + area.lmap.height
+        gaps = []
+        if x1 > 0:
+            gaps.append(min(sx, tx) - x1 + 1)
+        if y1 > 0:
+            gaps.append(min(sy, ty) - y1 + 1)
+        if x2 < self.width:
+            gaps.append(x2 - max(sx, tx))
+        if y2 < self.height:
+            gaps.append(y2 - max(sy, ty))
+        return 2 * min(gaps) if gaps else float('inf')
+
+    def agro(self, sources, limit):
+        '''
+        The bounded agro field (see agro.flood) for ((x, y), weight)
+        sources as {(x, y): weight}. Every step costs at least one so it
+        never reaches more than limit cells away from the sources.
+        '''
+        xs = [x for (x, _), _ in sources]
+        ys = [y for (_, y), _ in sources]
+        area = self.area(min(xs) - limit, min(ys) - limit,
+                         max(xs) + limit + 1, max(ys) + limit + 1)
+        weights = flood(area.lmap, [(area.local(*cell), weight)
+                                    for cell, weight in sources], limit)
+        return {area.world(*cell): weight
+                for cell, weight in weights.items()}
+
+    def close(self):
+        '''Remove the chunk files if they were only kept for this run'''
+        if self.temporary:
+            shutil.rmtree(self.directory, ignore_errors=True)
@@ -0,0 +1,167 @@
+'''
+Vectorised distance fields over a cost array.
+
+distance_field computes the same multi-source, 8-connected field as a heap
+based Dijkstra where stepping into a cell costs cost[y, x], but does it with
+whole-row numpy operations:
+
+  - a pass down the rows relaxes each row from the three cells above it and
+    then sweeps along the row in both directions,
+  - a pass back up the rows does the same from the cells below,
+  - passes right and left do the same over the columns,
+
+and passes are repeated until nothing changes. Sweeping along a row is a
+single `minimum.accumulate` over `d - prefix_cost` so the only Python level
+loop is over the rows (or columns).
+'''
+import numpy as np
+
+from .grid import NO_AGRO, OFFSETS
+
+
+def _relax_row(d, c, inclusive, exclusive):
+    '''Relax a row in place along itself in both directions'''
+    # Left to right: d[x] = min_k<=x (d[k] + c[k+1] + ... + c[x])
+    np.minimum(d, np.minimum.accumulate(d - inclusive) + inclusive, out=d)
+    # Right to left: d[x] = min_k>=x (d[k] + c[x] + ... + c[k-1])
+    back = np.minimum.accumulate((d + exclusive)[::-1])[::-1] - exclusive
+    np.minimum(d, back, out=d)
+
+
+def _relax_from(d, c, src):
+    '''Relax row d from the three neighbouring cells in row src'''
+    best = src.copy()
+    np.minimum(best[1:], src[:-1], out=best[1:])
+    np.minimum(best[:-1], src[1:], out=best[:-1])
+    np.minimum(d, best + c, out=d)
+
+
+def _sweep(d, c, inclusive, exclusive, rows):
+    '''Pass over the rows in the given order, returning True on change'''
+    before = d.copy()
+    prev = None
+    for y in rows:
+        if prev is not None:
+            _relax_from(d[y], c[y], d[prev])
+        _relax_row(d[y], c[y], inclusive[y], exclusive[y])
+        prev = y
+    return not np.array_equal(before, d)
+
+
+def _converge(d, c):
+    '''
+    Alternate sweeps down, right, up and left until the field is stable.
+
+    Each sweep leaves the relaxations it performs satisfied, and a pair of
+    opposite sweeps between them cover all eight neighbours. So we are done
+    once both sweeps of an opposite pair have run without anything changing
+    in between. Column sweeps are row sweeps over the transposed arrays.
+    '''
+    # Per orientation (rows, columns): costs and prefix sums along the rows
+    costs = [c, np.ascontiguousarray(c.T)]
+    prefix = []
+    for cost in costs:
+        inclusive = np.cumsum(cost, axis=1)
+        prefix.append((inclusive, inclusive - cost))
+
+    sweeps = [(0, True), (1, True), (0, False), (1, False)]
+    satisfied = set()
+    orientation = 0
+    step = 0
+    while True:
+        axis, forward = sweeps[step % 4]
+        if axis != orientation:
+            d = np.ascontiguousarray(d.T)
+            orientation = axis
+        count = d.shape[0]
+        rows = range(count) if forward else range(count - 1, -1, -1)
+        inclusive, exclusive = prefix[axis]
+        if _sweep(d, costs[axis], inclusive, exclusive, rows):
+            satisfied = set()
+        satisfied.add((axis, forward))
+        if (axis, not forward) in satisfied:
+            break
+        step += 1
+
+    return d.T if orientation else d
+
+
+def distance_field(cost, sources, limit=None):
+    '''
+    Compute the weighted distance from the nearest source for every cell.
+
+    cost is a (height, width) array of the cost of stepping into each cell
+    and sources is an iterable of ((x, y), weight) pairs.
+    Returns an int32 array holding NO_AGRO for any cell further than limit.
+    '''
+    sources = list(sources)
+    height, width = cost.shape
+    if not sources:
+        return np.full((height, width), NO_AGRO, dtype=np.int32)
+
+    # Paths only ever get more expensive so with a limit we only need to
+    # look at the cells that are close enough to a source to be in range
+    x0, y0, x1, y1 = 0, 0, width, height
+    if limit is not None:
+        reach = max(limit - min(w for _, w in sources), 0)
+        xs = [p[0] for p, _ in sources]
+        ys = [p[1] for p, _ in sources]
+        x0, x1 = max(min(xs) - reach, 0), min(max(xs) + reach + 1, width)
+        y0, y1 = max(min(ys) - reach, 0), min(max(ys) + reach + 1, height)
+
+    # NOTE: float64 holds every integer cost exactly and gives us inf
+    c = cost[y0:y1, x0:x1].astype(np.float64)
+    d = np.full(c.shape, np.inf)
+    for (x, y), weight in sources:
+        if x0 <= x < x1 and y0 <= y < y1:
+            d[y - y0, x - x0] = min(d[y - y0, x - x0], weight)
+
+    d = _converge(d, c)
+
+    if limit is not None:
+        d[d > limit] = np.inf
+
+    field = np.full((height, width), NO_AGRO, dtype=np.int32)
+    reached = np.isfinite(d)
+    field[y0:y1, x0:x1][reached] = d[reached]
+    return field
+
+
+def downhill_step(field, blocked, x, y):
+    '''
+    Return the (dx, dy) step from (x, y) to the lowest unblocked neighbour
+    in field, or (0, 0) if no neighbour is lower than the current cell.
+    Ties go to the first neighbour in OFFSETS order.
+    '''
+    height, width = field.shape
+    best = field[y, x]
+    step = (0, 0)
+    for dx, dy in OFFSETS:
+        X, Y = x + dx, y + dy
+        if 0 <= X < width and 0 <= Y < height:
+            weight = field[Y, X]
+            if weight < best and not blocked[Y, X]:
+                best = weight
+                step = (dx, dy)
+    return step
+
+
+def downhill_steps(field, blocked, xs, ys):
+    '''
+    downhill_step for many cells at once: xs and ys are integer arrays of
+    positions and the result is a (dxs, dys) pair of arrays.
+    '''
+    height, width = field.shape
+    best = field[ys, xs]
+    dxs = np.zeros(len(xs), dtype=np.intp)
+    dys = np.zeros(len(ys), dtype=np.intp)
+    for dx, dy in OFFSETS:
+        X, Y = xs + dx, ys + dy
+        inside = (X >= 0) & (X < width) & (Y >= 0) & (Y < height)
+        X, Y = np.clip(X, 0, width - 1), np.clip(Y, 0, height - 1)
+        weight = field[Y, X]
+        lower = inside & (weight < best) & ~blocked[Y, X]
+        best = np.where(lower, weight, best)
+        dxs[lower] = dx
+        dys[lower] = dy
+    return dxs, dys
@@ -0,0 +1,161 @@
+'''
+Keeping only the floors that are in play in memory.
+
+Floors the player has left behind are packed into bytes once they drop out
+of the cache and unpacked again if they are ever needed, so a long run
+holds a handful of Map objects rather than all of them. Packing is put off
+until the game is idle (see FloorCache.pack_leaving) so that it never sits
+on the stairs.
+'''
+import sys
+from collections import OrderedDict
+from itertools import chain
+
+import numpy as np
+
+from ..config import FLOOR_CACHE_SIZE, FLOOR_PACK_BACKLOG
+
+
+def resident_size(floor):
+    '''
+    Approximate number of bytes held by a live floor: its tile and agro
+    arrays plus the objects, rooms and lookup tables on it.
+    '''
+    size = 0
+    for holder in (floor.lmap, floor.agro_field):
+        for value in vars(holder).values():
+            arrays = value.values() if isinstance(value, dict) else [value]
+            size += sum(a.nbytes for a in arrays
+                        if isinstance(a, np.ndarray) and a.base is None)
+
+    for obj in chain(floor.rooms, floor.enemies, floor.items):
+        size += sys.getsizeof(obj) + sys.getsizeof(vars(obj))
+    size += sys.getsizeof(floor.graph)
+    size += sum(sys.getsizeof(linked) for linked in floor.graph.values())
+    size += sys.getsizeof(floor.occupancy.cells)
+    size += sys.getsizeof(floor.occupancy.positions)
+    size += sum(sys.getsizeof(objs) for objs in floor.occupancy.cells.values())
+    return size
+
+
+class FloorCache:
+    '''
+    Stands in for the list of floors in a Dungeon.
+
+    At most size floors are kept as Map objects, dropping the least
+    recently used first. The current floor and the ones either side of it
+    (see focus) are never dropped. Dropped floors are stored as
+    pack(floor) and come back through unpack when indexed.
+
+    Floors that drop out are only queued up as leaving: pack_leaving does
+    the packing when there is time for it. Should more than backlog floors
+    be waiting the oldest is packed there and then.
+
+    Floors can also be added already packed (add_packed) with their own
+    unpack function, which is how saved floors are loaded lazily.
+    '''
+    def __init__(self, pack, unpack, size=FLOOR_CACHE_SIZE,
+                 backlog=FLOOR_PACK_BACKLOG):
+        self.pack = pack
+        self.unpack = unpack
+        self.size = size
+        self.backlog = backlog
+        self.floors = []  # Map, or None when packed
+        self.packed = {}  # index -> (unpack, data)
+        self.recent = OrderedDict()  # live indices, least recent first
+        self.leaving = OrderedDict()  # dropped but not packed yet
+        self.current = 0
+        self.paged_in = 0
+        self.paged_out = 0
+
+    def __len__(self):
+        return len(self.floors)
+
+    def __getitem__(self, ix):
+        ix = self._index(ix)
+        floor = self.floors[ix]
+        if floor is None:
+            unpack, data = self.packed.pop(ix)
+            floor = self.floors[ix] = unpack(data)
+            self.paged_in += 1
+        # NOTE: a floor that was on its way out is simply kept
+        self.leaving.pop(ix, None)
+        self.recent[ix] = None
+        self.recent.move_to_end(ix)
+        self._evict(keep=ix)
+        return floor
+
+    def __iter__(self):
+        for ix in range(len(self)):
+            yield self[ix]
+
+    def _index(self, ix):
+        if ix < 0:
+            ix += len(self)
+        if not 0 <= ix < len(self):
+            raise IndexError('floor index out of range')
+        return ix
+
+    def append(self, floor):
+        self.floors.append(floor)
+        self.recent[len(self.floors) - 1] = None
+        self._evict(keep=len(self.floors) - 1)
+
+    def add_packed(self, unpack, data):
+        '''Add a floor that has not been unpacked yet'''
+        self.packed[len(self.floors)] = (unpack, data)
+        self.floors.append(None)
+
+    def focus(self, ix):
+        '''Set the current floor: it and its neighbours stay in memory'''
+        self.current = self._index(ix)
+        self._evict()
+
+    def pinned(self, ix):
+        return abs(ix - self.current) <= 1
+
+    def is_live(self, ix):
+        return self.floors[self._index(ix)] is not None
+
+    def peek(self, ix):
+        '''Return a floor without bringing it (back) into the cache'''
+        ix = self._index(ix)
+        if self.floors[ix] is not None:
+            return self.floors[ix]
+        unpack, data = self.packed[ix]
+        return unpack(data)
+
+    def memory(self):
+        '''
+        Return (index, 'live' or 'packed', bytes) for each floor. Sizes of
+        live floors are estimates (see resident_size).
+        '''
+        usage = []
+        for ix, floor in enumerate(self.floors):
+            if floor is None:
+                usage.append((ix, 'packed', len(self.packed[ix][1])))
+            else:
+                usage.append((ix, 'live', resident_size(floor)))
+        return usage
+
+    def pack_leaving(self, count=None):
+        '''Pack (up to count of) the floors that have dropped out'''
+        while self.leaving and count != 0:
+            ix, _ = self.leaving.popitem(last=False)
+            self.packed[ix] = (self.unpack, self.pack(self.floors[ix]))
+            self.floors[ix] = None
+            self.paged_out += 1
+            if count is not None:
+                count -= 1
+
+    def _evict(self, keep=None):
+        '''Drop the least recently used floors until there are size left'''
+        for ix in list(self.recent):
+            if len(self.recent) <= self.size:
+                break
+            if ix == keep or self.pinned(ix):
+                continue
+            del self.recent[ix]
+            self.leaving[ix] = None
+        if len(self.leaving) > self.backlog:
+            self.pack_leaving(len(self.leaving) - self.backlog)
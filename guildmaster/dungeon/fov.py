@@ -0,0 +1,94 @@
+'''
+Field of view calculations for the player.
+'''
+import math
+
+import numpy as np
+import tcod.map
+
+from ..config import FOV_ALG, LIGHT_WALLS
+
+
+# The fov names used by tdl.map mapped to the libtcod algorithm ids
+FOV_ALGORITHMS = {'BASIC': 0, 'DIAMOND': 1, 'SHADOW': 2,
+                  'PERMISSIVE': 11, 'RESTRICTIVE': 12}
+
+
+class FieldOfView:
+    '''
+    Computes the near and far FOV sets for a creature's two vision radii.
+
+    Only the larger radius is cast: the libtcod algorithms only use the
+    radius to clip the result, so the near set is the far set filtered by
+    distance. The transparency map is kept between calls and patched from
+    the grid's change log, and the last result is reused as long as the
+    position, radii and grid version are unchanged (resting, searching...).
+    '''
+    def __init__(self, algorithm=FOV_ALG, light_walls=LIGHT_WALLS):
+        self.algorithm = FOV_ALGORITHMS[algorithm]
+        self.light_walls = light_walls
+        self.grid = None
+        self.version = None
+        self.tcod_map = None
+        self.key = None
+        self.result = (set(), set())
+        self.computed = 0
+        self.cached = 0
+
+    def compute(self, grid, x, y, radii):
+        '''
+        Return (visible, visible2): the (x, y) cells within the first
+        radius and those only within the second, matching two calls to
+        tdl.map.quickFOV with sphere=True.
+        '''
+        self._sync(grid)
+        near, far = radii
+        key = (x, y, near, far)
+        if key == self.key:
+            self.cached += 1
+            return self.result
+
+        radius = int(math.ceil(far))
+        self.tcod_map.compute_fov(x, y, radius, self.light_walls,
+                                  self.algorithm)
+
+        # Only look at the window the radius can reach
+        x0, y0 = max(x - radius, 0), max(y - radius, 0)
+        x1 = min(x + radius + 1, grid.width)
+        y1 = min(y + radius + 1, grid.height)
+        ys, xs = np.nonzero(self.tcod_map.fov[y0:y1, x0:x1])
+        xs += x0
+        ys += y0
+        dist2 = (xs - x) ** 2 + (ys - y) ** 2
+        inner = dist2 <= near ** 2
+        outer = (dist2 <= far ** 2) & ~inner
+
+        visible = set(zip(xs[inner].tolist(), ys[inner].tolist()))
+        visible2 = set(zip(xs[outer].tolist(), ys[outer].tolist()))
+
+        self.key = key
+        self.result = (visible, visible2)
+        self.computed += 1
+        return self.result
+
+    def _sync(self, grid):
+        '''Make sure the transparency map matches the grid'''
+        if grid is not self.grid:
+            # NOTE: order='C' so that the arrays are indexed [y, x] like
+            #       the TileGrid ones
+            self.tcod_map = tcod.map.Map(grid.width, grid.height, order='C')
+            self.grid = grid
+            changes = None
+        elif grid.version != self.version:
+            changes = grid.changes_since(self.version)
+        else:
+            return
+
+        transparent = self.tcod_map.transparent
+        if changes is None:
+            transparent[:] = ~grid.block_sight
+        else:
+            for x, y in changes:
+                transparent[y, x] = not grid.block_sight[y, x]
+        self.version = grid.version
+        self.key = None
@@ -0,0 +1,413 @@
+'''
+Structure-of-arrays storage for the tiles on a floor.
+
+Each tile attribute lives in its own (height, width) numpy array rather than
+in the __dict__ of a per-cell object. Tile instances are now light weight
+views onto a single cell of a TileGrid so that existing code using
+`lmap[y][x].name` and friends keeps working.
+'''
+from collections import deque, namedtuple
+
+import numpy as np
+
+from ..utils import roll
+from ..config import DARK0, DARK1, DARK4, WHITE, FADED_BROWN
+
+
+TileKind = namedtuple(
+    'TileKind',
+    'name char fg bg block_move block_sight path_cost agro_cost')
+
+# NOTE: a path_cost of None leaves the existing cost untouched when a tile
+#       changes kind (matching the original Tile methods).
+KINDS = (
+    TileKind('wall', '#', DARK4, DARK1, True, True, None, 4),
+    TileKind('floor', '.', DARK4, DARK0, False, False, 1, 1),
+    TileKind('closed_door', '+', FADED_BROWN, DARK0, True, True, 2, 2),
+    TileKind('open_door', "'", FADED_BROWN, DARK0, False, False, 1, 1),
+    TileKind('secret_door', '#', DARK4, DARK1, True, True, None, 3),
+    TileKind('up', '<', WHITE, DARK0, False, False, 1, 1),
+    TileKind('down', '>', WHITE, DARK0, False, False, 1, 1),
+)
+WALL, FLOOR, CLOSED_DOOR, OPEN_DOOR, SECRET_DOOR, UP, DOWN = range(len(KINDS))
+KIND_IDS = {kind.name: ix for ix, kind in enumerate(KINDS)}
+
+# NOTE: room_id=-62 sets char to '#' on the path_preview script
+NO_ROOM = -62
+# Sentinels for the 'unset' values that used to be None
+NO_PATH = 0
+NO_AGRO = np.iinfo(np.int32).max
+
+# (dx, dy) of the eight neighbours of a cell in the order that
+# Map.neighbouring_tiles has always returned them
+OFFSETS = ((-1, 0), (1, 0), (0, -1), (0, 1),
+           (-1, -1), (-1, 1), (1, -1), (1, 1))
+
+# Number of single cell kind changes remembered for changes_since
+CHANGE_LOG_SIZE = 256
+
+# Per kind lookup tables so that whole arrays can be converted at once
+KIND_PATH_COST = np.array(
+    [NO_PATH if k.path_cost is None else k.path_cost for k in KINDS],
+    dtype=np.uint8)
+KIND_AGRO_COST = np.array([k.agro_cost for k in KINDS], dtype=np.uint8)
+KIND_BLOCK_MOVE = np.array([k.block_move for k in KINDS])
+KIND_BLOCK_SIGHT = np.array([k.block_sight for k in KINDS])
+
+
+class TileGrid:
+    '''
+    The tiles of a map stored as one array per attribute.
+
+    Indexing mirrors the old list of lists: grid[y] is a Row and
+    grid[y][x] is a Tile view onto that cell. Arrays are indexed [y, x].
+
+    `version` is bumped every time a cell changes kind so that anything
+    derived from the layout (agro fields, paths...) can tell it is stale.
+    '''
+    def __init__(self, width, height, kind=WALL, room_id=NO_ROOM):
+        self.width = width
+        self.height = height
+        shape = (height, width)
+
+        self.version = 0
+        # (version, x, y) for recent single cell changes. Bulk changes
+        # clear the log as we can't say which cells they touched.
+        self._changes = deque(maxlen=CHANGE_LOG_SIZE)
+        self._bulk_version = 0
+
+        # Lazily built neighbour lookups: see neighbour_table
+        self._neighbour_table = None
+        self._neighbour_lists = None
+
+        self.kind = np.full(shape, kind, dtype=np.uint8)
+        self.path_cost = np.full(shape, NO_PATH, dtype=np.uint8)
+        self.agro_cost = np.ones(shape, dtype=np.uint8)
+        self.agro_weight = np.full(shape, NO_AGRO, dtype=np.int32)
+        self.explored = np.zeros(shape, dtype=np.bool_)
+        self.block_move = np.zeros(shape, dtype=np.bool_)
+        self.block_sight = np.zeros(shape, dtype=np.bool_)
+        self.room_id = np.full(shape, room_id, dtype=np.int16)
+
+        self.fill(0, 0, width, height, kind)
+
+    def restore(self, kind, path_cost, explored, room_id):
+        '''
+        Overwrite the grid from the arrays that can't be derived from the
+        tile kinds (see savegame). path_cost is needed as cells that stop
+        being walkable keep their old cost.
+        '''
+        self.kind[:] = kind
+        self.path_cost[:] = path_cost
+        self.agro_cost[:] = KIND_AGRO_COST[kind]
+        self.block_move[:] = KIND_BLOCK_MOVE[kind]
+        self.block_sight[:] = KIND_BLOCK_SIGHT[kind]
+        self.explored[:] = explored
+        self.room_id[:] = room_id
+        self._record_change()
+
+    @property
+    def arrays(self):
+        '''Name -> array for every per-cell attribute'''
+        return {
+            'kind': self.kind, 'path_cost': self.path_cost,
+            'agro_cost': self.agro_cost, 'agro_weight': self.agro_weight,
+            'explored': self.explored, 'block_move': self.block_move,
+            'block_sight': self.block_sight, 'room_id': self.room_id,
+        }
+
+    @property
+    def nbytes(self):
+        '''Total size of the backing arrays in bytes'''
+        return sum(a.nbytes for a in self.arrays.values())
+
+    def __getstate__(self):
+        # The neighbour lookups are cheap to rebuild so don't store them
+        state = self.__dict__.copy()
+        state['_neighbour_table'] = state['_neighbour_lists'] = None
+        return state
+
+    def __len__(self):
+        return self.height
+
+    def __getitem__(self, y):
+        if isinstance(y, slice):
+            return [Row(self, Y) for Y in range(self.height)[y]]
+        if y < 0:
+            y += self.height
+        if not 0 <= y < self.height:
+            raise IndexError('row index out of range')
+        return Row(self, y)
+
+    def __iter__(self):
+        for y in range(self.height):
+            yield Row(self, y)
+
+    def tile(self, x, y):
+        '''Return a Tile view onto the cell at (x, y)'''
+        return Tile._view(self, x, y)
+
+    def set_kind(self, x, y, kind):
+        '''Change the kind of a single cell'''
+        self._apply_kind((y, x), kind)
+        self._record_change(x, y)
+
+    def fill(self, x1, y1, x2, y2, kind, room_id=None):
+        '''
+        Set every cell in the half open rectangle [x1, x2) x [y1, y2) to
+        the given kind (and optionally room).
+        '''
+        ix = (slice(y1, y2), slice(x1, x2))
+        self._apply_kind(ix, kind)
+        if room_id is not None:
+            self.room_id[ix] = room_id
+        self._record_change()
+
+    def carve(self, segments, kind=FLOOR):
+        '''
+        Set every cell on a list of straight (const, start, finish,
+        horizontal) segments to kind in one go. Horizontal segments run
+        along row const from x = start to finish (inclusive, either way
+        round), vertical ones down column const.
+        '''
+        if not segments:
+            return
+        const, start, finish, horizontal = np.array(segments).T
+        lo, hi = np.minimum(start, finish), np.maximum(start, finish)
+        lengths = hi - lo + 1
+        # Position of each cell along its segment
+        first = np.repeat(np.cumsum(lengths) - lengths, lengths)
+        along = np.repeat(lo, lengths) + np.arange(lengths.sum()) - first
+        fixed = np.repeat(const, lengths)
+        horizontal = np.repeat(horizontal.astype(bool), lengths)
+        xs = np.where(horizontal, along, fixed)
+        ys = np.where(horizontal, fixed, along)
+        self._apply_kind((ys, xs), kind)
+        self._record_change()
+
+    def paint(self, mask, x=0, y=0, kind=FLOOR):
+        '''
+        Set the cells where a bool array is True to kind, with the top left
+        corner of the array at (x, y).
+        '''
+        ys, xs = np.nonzero(mask)
+        self._apply_kind((ys + y, xs + x), kind)
+        self._record_change()
+
+    def floor_neighbours(self):
+        '''
+        Two int8 arrays counting how many of the left / right neighbours
+        and of the up / down neighbours of each cell are plain floor.
+        '''
+        floor = np.pad(self.kind == FLOOR, 1).astype(np.int8)
+        across = floor[1:-1, :-2] + floor[1:-1, 2:]
+        down = floor[:-2, 1:-1] + floor[2:, 1:-1]
+        return across, down
+
+    def _record_change(self, x=None, y=None):
+        '''Bump the version, logging the cell if only one was changed'''
+        self.version += 1
+        if x is None:
+            self._changes.clear()
+            self._bulk_version = self.version
+        else:
+            self._changes.append((self.version, x, y))
+
+    def changes_since(self, version):
+        '''
+        Return the (x, y) cells that have changed kind since version, or
+        None if that is no longer known (after a bulk change or once the
+        change log has wrapped).
+        '''
+        if version >= self.version:
+            return []
+        oldest = self._bulk_version
+        if self._changes:
+            oldest = max(oldest, self._changes[0][0] - 1)
+        if version < oldest:
+            return None
+        return [(x, y) for v, x, y in self._changes if v > version]
+
+    def _apply_kind(self, ix, kind):
+        '''Write the settings for a kind into the cells selected by ix'''
+        spec = KINDS[kind]
+        self.kind[ix] = kind
+        self.block_move[ix] = spec.block_move
+        self.block_sight[ix] = spec.block_sight
+        self.agro_cost[ix] = spec.agro_cost
+        if spec.path_cost is not None:
+            self.path_cost[ix] = spec.path_cost
+
+    def copy_cell(self, x, y, other, ox, oy):
+        '''Overwrite the cell at (x, y) with cell (ox, oy) of other'''
+        for name, array in self.arrays.items():
+            array[y, x] = getattr(other, name)[oy, ox]
+        self._record_change(x, y)
+
+    def paste(self, other, x=0, y=0):
+        '''Overwrite the cells under other with its top left at (x, y)'''
+        ix = (slice(y, y + other.height), slice(x, x + other.width))
+        for name, array in self.arrays.items():
+            array[ix] = getattr(other, name)
+        self._record_change()
+
+    @property
+    def neighbour_table(self):
+        '''
+        (width * height, 8) int32 array of the flat index (y * width + x) of
+        each neighbour of each cell in OFFSETS order, -1 if off the map.
+        This only depends on the size of the grid so is built once.
+        '''
+        if self._neighbour_table is None:
+            ys, xs = np.divmod(np.arange(self.width * self.height),
+                               self.width)
+            table = np.empty((xs.size, len(OFFSETS)), dtype=np.int32)
+            for k, (dx, dy) in enumerate(OFFSETS):
+                X, Y = xs + dx, ys + dy
+                inside = (X >= 0) & (X < self.width) & \
+                    (Y >= 0) & (Y < self.height)
+                table[:, k] = np.where(inside, Y * self.width + X, -1)
+            self._neighbour_table = table
+        return self._neighbour_table
+
+    @property
+    def neighbour_lists(self):
+        '''
+        The neighbour_table as a list of tuples (skipping cells that are off
+        the map) for tight pure Python loops over flat indices.
+        '''
+        if self._neighbour_lists is None:
+            self._neighbour_lists = [
+                tuple(n for n in row if n >= 0)
+                for row in self.neighbour_table.tolist()]
+        return self._neighbour_lists
+
+    def iter_neighbours(self, x, y):
+        '''Yield (dx, dy, X, Y) for each neighbour of (x, y) on the map'''
+        width = self.width
+        for n in self.neighbour_lists[y * width + x]:
+            X, Y = n % width, n // width
+            yield X - x, Y - y, X, Y
+
+
+class Row:
+    '''A single row of a TileGrid'''
+    __slots__ = ('_grid', '_y')
+
+    def __init__(self, grid, y):
+        self._grid = grid
+        self._y = y
+
+    def __len__(self):
+        return self._grid.width
+
+    def __getitem__(self, x):
+        grid, y = self._grid, self._y
+        if isinstance(x, slice):
+            return [Tile._view(grid, X, y) for X in range(grid.width)[x]]
+        if x < 0:
+            x += grid.width
+        if not 0 <= x < grid.width:
+            raise IndexError('tile index out of range')
+        return Tile._view(grid, x, y)
+
+    def __setitem__(self, x, tile):
+        self._grid.copy_cell(x, self._y, tile._grid, tile._x, tile._y)
+
+    def __iter__(self):
+        grid, y = self._grid, self._y
+        for x in range(grid.width):
+            yield Tile._view(grid, x, y)
+
+
+def _cell_attribute(name, unset=None, convert=int):
+    '''Property reading/writing one cell of the named TileGrid array'''
+    def fget(self):
+        value = getattr(self._grid, name)[self._y, self._x]
+        if unset is not None and value == unset:
+            return None
+        return convert(value)
+
+    def fset(self, value):
+        if value is None:
+            value = unset
+        getattr(self._grid, name)[self._y, self._x] = value
+
+    return property(fget, fset)
+
+
+def _kind_attribute(field):
+    '''Read only property derived from the kind of the cell'''
+    def fget(self):
+        return getattr(KINDS[self._grid.kind[self._y, self._x]], field)
+    return property(fget)
+
+
+class Tile:
+    '''
+    A tile in the dungeon map.
+
+    Tile('floor') creates a stand alone tile backed by its own 1x1 grid,
+    tiles read from a map are views onto a cell of the map's TileGrid.
+    '''
+    __slots__ = ('_grid', '_x', '_y')
+
+    def __init__(self, name, room_id=NO_ROOM):
+        self._grid = TileGrid(1, 1, room_id=room_id)
+        self._x = self._y = 0
+        # Initialise the tile settings
+        getattr(self, name)()
+
+    @classmethod
+    def _view(cls, grid, x, y):
+        tile = cls.__new__(cls)
+        tile._grid = grid
+        tile._x = x
+        tile._y = y
+        return tile
+
+    name = _kind_attribute('name')
+    char = _kind_attribute('char')
+    fg = _kind_attribute('fg')
+    bg = _kind_attribute('bg')
+
+    explored = _cell_attribute('explored', convert=bool)
+    path_cost = _cell_attribute('path_cost', unset=NO_PATH)
+    agro_cost = _cell_attribute('agro_cost')
+    agro_weight = _cell_attribute('agro_weight', unset=NO_AGRO)
+    block_move = _cell_attribute('block_move', convert=bool)
+    block_sight = _cell_attribute('block_sight', convert=bool)
+    room_id = _cell_attribute('room_id')
+
+    def __lt__(self, other):
+        return self.path_cost <= other.path_cost
+
+    def __repr__(self):
+        return '<Tile {} ({}, {})>'.format(self.name, self._x, self._y)
+
+    def _set_kind(self, kind):
+        self._grid.set_kind(self._x, self._y, kind)
+
+    def wall(self):
+        self._set_kind(WALL)
+
+    def floor(self):
+        self._set_kind(FLOOR)
+
+    def closed_door(self, allow_secret_door=False, rng=None):
+        if allow_secret_door and roll(100, rng=rng) >= 98:
+            self.secret_door()
+        else:
+            self._set_kind(CLOSED_DOOR)
+
+    def open_door(self):
+        self._set_kind(OPEN_DOOR)
+
+    def secret_door(self):
+        self._set_kind(SECRET_DOOR)
+
+    def up(self):
+        self._set_kind(UP)
+
+    def down(self):
+        self._set_kind(DOWN)
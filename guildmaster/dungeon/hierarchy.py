@@ -0,0 +1,328 @@
+'''
+Hierarchical pathfinding: route across the rooms and corridors of a floor
+before looking at individual tiles.
+
+The floor is split into regions: each room is one and each connected run
+of corridor outside of the rooms (within a CORRIDOR_BLOCK square) is
+another. Wherever two regions touch there are portals, one per
+PORTAL_SPACING cells of each unbroken stretch of border, and the cells
+either side of them are the nodes of an abstract graph. Moving between the
+two cells of a portal is a single step; moving between the portals of one
+region uses the shortest path inside that region. Those paths are found
+with a Dijkstra search from each portal that is kept for the life of the
+planner, so the route is refined into tiles without searching again.
+
+Routes are close to, but not always exactly, the shortest path: crossing
+a border away from a portal is never considered.
+
+When cells change cost (doors opening and closing) the planner only drops
+the searches and abstract edges of the regions holding them: see update.
+'''
+import heapq
+from collections import defaultdict
+
+import numpy as np
+
+from .grid import OFFSETS
+
+
+# Corridors are split into regions at most this many cells across so that
+# the searches inside them stay small
+CORRIDOR_BLOCK = 16
+# Long stretches of border get a crossing point every this many cells
+PORTAL_SPACING = 16
+
+# Offsets with a positive flat index so that each border is seen once
+FORWARD = [(dx, dy) for dx, dy in OFFSETS if (dy, dx) > (0, 0)]
+
+
+def label_regions(grid):
+    '''
+    Return a (height, width) int32 array with the region of each cell that
+    can be walked through (-1 for the rest) and the number of regions.
+    Rooms keep their room_id, corridors are numbered after them and are
+    split up along a grid of CORRIDOR_BLOCK sized squares.
+    '''
+    passable = grid.path_cost > 0
+    in_room = passable & (grid.room_id >= 0)
+    region = np.where(in_room, grid.room_id, -1).astype(np.int32)
+    count = int(region.max()) + 1 if in_room.any() else 0
+
+    # Flood fill the corridors: there are few enough cells for a Python loop
+    flat = region.ravel().tolist()
+    is_open = passable.ravel().tolist()
+    ys, xs = np.indices(region.shape) // CORRIDOR_BLOCK
+    block = (ys * (grid.width // CORRIDOR_BLOCK + 1) + xs).ravel().tolist()
+    neighbours = grid.neighbour_lists
+    for start in np.flatnonzero((passable & ~in_room).ravel()).tolist():
+        if flat[start] >= 0:
+            continue
+        flat[start] = count
+        home = block[start]
+        stack = [start]
+        while stack:
+            ix = stack.pop()
+            for n in neighbours[ix]:
+                if flat[n] == -1 and is_open[n] and block[n] == home:
+                    flat[n] = count
+                    stack.append(n)
+        count += 1
+    return np.array(flat, dtype=np.int32).reshape(region.shape), count
+
+
+class RegionPlanner:
+    '''
+    Plans paths on one grid, as of version. costs and penalties are the
+    flat path costs and per-neighbour diagonal penalties of PathFinder;
+    cheapest is the lowest path cost on the grid (for the heuristic).
+    '''
+    def __init__(self, grid, costs, penalties, cheapest, diagonal_penalty):
+        self.grid = grid
+        self.version = grid.version
+        self.width = grid.width
+        self.costs = costs
+        self.penalties = penalties
+        self.neighbours = grid.neighbour_lists
+        self.diagonal_penalty = diagonal_penalty
+        self.straight = cheapest
+        self.extra = diagonal_penalty - cheapest
+
+        region, self.count = label_regions(grid)
+        self.region = region.ravel().tolist()
+        self.portals = defaultdict(list)  # region -> portal cells in it
+        self.links = defaultdict(list)  # cell -> (cell across, step cost)
+        self._find_portals(region)
+
+        self.trees = {}  # portal cell -> (dist, parent) inside its region
+        self.edges = {}  # portal cell -> see portal_edges
+        self.searches = 0
+
+    def _find_portals(self, region):
+        '''Pick a crossing point for each stretch of border between regions'''
+        height, width = region.shape
+        borders = defaultdict(list)
+        for dx, dy in FORWARD:
+            # a: cells that have a neighbour in another region at (dx, dy)
+            a = region[max(0, -dy):height - max(0, dy),
+                       max(0, -dx):width - max(0, dx)]
+            b = region[max(0, dy):height - max(0, -dy),
+                       max(0, dx):width - max(0, -dx)]
+            ys, xs = np.nonzero((a >= 0) & (b >= 0) & (a != b))
+            ys, xs = ys + max(0, -dy), xs + max(0, -dx)
+            for x, y in zip(xs.tolist(), ys.tolist()):
+                ra, rb = region[y, x], region[y + dy, x + dx]
+                pair = (y * width + x, (y + dy) * width + x + dx)
+                if ra > rb:
+                    ra, rb, pair = rb, ra, pair[::-1]
+                borders[int(ra), int(rb)].append(pair)
+
+        for pairs in borders.values():
+            for stretch in self._stretches(pairs):
+                spaced = len(stretch) // PORTAL_SPACING + 1
+                offset = (len(stretch) - 1) % PORTAL_SPACING // 2
+                for a, b in stretch[offset::PORTAL_SPACING][:spaced]:
+                    self._add_link(a, b)
+
+    def _stretches(self, pairs):
+        '''Group crossings whose cells touch into unbroken stretches'''
+        width = self.width
+        pairs = sorted(pairs)
+        group = {}
+        stretches = []
+        for pair in pairs:
+            near = set()
+            for cell in pair:
+                x, y = cell % width, cell // width
+                for dx in (-1, 0, 1):
+                    for dy in (-1, 0, 1):
+                        if (y + dy) * width + x + dx in group:
+                            near.add(group[(y + dy) * width + x + dx])
+            if near:
+                # Merge every stretch this crossing touches into one
+                keep = min(near)
+                for other in near - {keep}:
+                    stretches[keep].extend(stretches[other])
+                    for a, b in stretches[other]:
+                        group[a] = group[b] = keep
+                    stretches[other] = []
+            else:
+                keep = len(stretches)
+                stretches.append([])
+            stretches[keep].append(pair)
+            group[pair[0]] = group[pair[1]] = keep
+        return [sorted(s) for s in stretches if s]
+
+    def _add_link(self, a, b):
+        for cell, other in ((a, b), (b, a)):
+            if other not in [c for c, _ in self.links[cell]]:
+                self.links[cell].append((other, self.step_cost(cell, other)))
+            if cell not in self.portals[self.region[cell]]:
+                self.portals[self.region[cell]].append(cell)
+
+    def update(self, costs, cheapest, changes):
+        '''
+        Catch up with the (x, y) cells that have changed since version,
+        given the new path costs. Only the regions holding those cells
+        (and the portals linked to them) lose their searches and edges.
+
+        Returns False, changing nothing, if a cell has become passable or
+        impassable: the regions themselves are out of date and the planner
+        needs building again.
+        '''
+        width, region, links = self.width, self.region, self.links
+        cells = {y * width + x for x, y in changes}
+        if any((costs[ix] > 0) != (region[ix] >= 0) for ix in cells):
+            return False
+
+        self.costs = costs
+        self.straight = cheapest
+        self.extra = self.diagonal_penalty - cheapest
+        stale = {region[ix] for ix in cells if region[ix] >= 0}
+        for portal in [p for r in stale for p in self.portals.get(r, ())]:
+            self.trees.pop(portal, None)
+            self.edges.pop(portal, None)
+
+        # Crossings onto a changed cell cost something else now
+        linked = {other for ix in cells if ix in links
+                  for other, _ in links[ix]}
+        for cell in linked | (cells & links.keys()):
+            links[cell] = [(other, self.step_cost(cell, other))
+                           for other, _ in links[cell]]
+            self.edges.pop(cell, None)
+
+        self.version = self.grid.version
+        return True
+
+    def step_cost(self, a, b):
+        '''Cost of stepping from cell a onto neighbouring cell b'''
+        penalty = self.penalties[a][self.neighbours[a].index(b)]
+        return self.costs[b] + penalty
+
+    def tree(self, root, reverse=False):
+        '''
+        Dijkstra search from root that stays inside its region. Returns
+        (dist, parent): the cost of getting from root to each cell (or from
+        each cell to root if reverse) and the next cell back towards root.
+        '''
+        self.searches += 1
+        region, costs = self.region, self.costs
+        neighbours, penalties = self.neighbours, self.penalties
+        home = region[root]
+        dist = {root: 0}
+        parent = {root: None}
+        queue = [(0, root)]
+        while queue:
+            d, ix = heapq.heappop(queue)
+            if d > dist[ix]:
+                continue
+            for n, penalty in zip(neighbours[ix], penalties[ix]):
+                if region[n] != home:
+                    continue
+                cost = d + (costs[ix] if reverse else costs[n]) + penalty
+                if cost < dist.get(n, cost + 1):
+                    dist[n] = cost
+                    parent[n] = ix
+                    heapq.heappush(queue, (cost, n))
+        return dist, parent
+
+    def portal_tree(self, cell):
+        if cell not in self.trees:
+            self.trees[cell] = self.tree(cell)
+        return self.trees[cell]
+
+    def portal_edges(self, cell):
+        '''
+        (other portal, cost, 'region' or 'link') for the portals reachable
+        from a portal without crossing into another region or by crossing
+        it. These are the abstract edges and are only worked out once.
+        '''
+        if cell not in self.edges:
+            dist = self.portal_tree(cell)[0]
+            edges = [(portal, dist[portal], 'region')
+                     for portal in self.portals[self.region[cell]]
+                     if portal != cell and portal in dist]
+            edges.extend((other, step, 'link')
+                         for other, step in self.links[cell])
+            self.edges[cell] = edges
+        return self.edges[cell]
+
+    def path(self, start, target):
+        '''
+        Route from start to target as a list of (x, y), or None if target
+        can't be reached.
+        '''
+        width, region = self.width, self.region
+        s, t = start[1] * width + start[0], target[1] * width + target[0]
+        if s == t:
+            return [tuple(start)]
+        if region[s] < 0 or region[t] < 0:
+            return None
+
+        s_tree = self.portal_tree(s) if s in self.links else self.tree(s)
+        t_dist, t_next = self.tree(t, reverse=True)
+        tx, ty = target
+
+        def estimate(ix):
+            dx, dy = abs(ix % width - tx), abs(ix // width - ty)
+            return (self.straight * (dx + dy) +
+                    self.extra * (dx if dx < dy else dy))
+
+        # via[node] = (previous node, how it was reached)
+        best = {s: 0}
+        via = {s: (None, None)}
+        closed = set()
+        queue = [(estimate(s), 0, s)]
+        pop, push = heapq.heappop, heapq.heappush
+
+        while queue:
+            _, cost, node = pop(queue)
+            if node in closed:
+                continue
+            if node == t:
+                return self._refine(via, s, t, s_tree, t_next)
+            closed.add(node)
+
+            edges = self.portal_edges(node) if node in self.links else []
+            if node == s:
+                dist = s_tree[0]
+                edges = [(portal, dist[portal], 'start')
+                         for portal in self.portals[region[s]]
+                         if portal in dist] + edges
+            if node in t_dist:
+                edges = edges + [(t, t_dist[node], 'goal')]
+
+            for other, step, how in edges:
+                if other in closed:
+                    continue
+                step += cost
+                if step < best.get(other, step + 1):
+                    best[other] = step
+                    via[other] = (node, how)
+                    push(queue, (step + estimate(other), step, other))
+        return None
+
+    def _refine(self, via, s, t, s_tree, t_next):
+        '''Turn the route through the abstract graph into tiles'''
+        cells = [t]
+        node = t
+        while node != s:
+            prev, how = via[node]
+            if how == 'goal':
+                # Walk from prev towards t, then flip to fit the backwards
+                # walk that cells is being built with
+                walk = [prev]
+                while walk[-1] != node:
+                    walk.append(t_next[walk[-1]])
+                cells.extend(reversed(walk[:-1]))
+            elif how in ('start', 'region'):
+                parent = (s_tree if how == 'start' else self.trees[prev])[1]
+                step = parent[node]
+                while step is not None:
+                    cells.append(step)
+                    step = parent[step]
+            else:
+                cells.append(prev)
+            node = prev
+        cells.reverse()
+        width = self.width
+        return [(ix % width, ix // width) for ix in cells]
@@ -6,88 +6,25 @@ http://dungeonmaker.sourceforge.net/DM2_Manual/manual1.html
 http://www.futuredatalab.com/proceduraldungeon/
 https://eskerda.com/bsp-dungeon-generation/
 '''
-import tdl
 import math
-from random import choice, randint
+import random
+from functools import partial
+
+import numpy as np
 
 from ..creatures import enemy
+# NOTE: Tile is imported here so that existing `mapgen.Tile` users still work
+from .grid import Tile, TileGrid, DOWN, FLOOR
+from .agro import AgroField
+from .occupancy import Occupancy
+from .placement import RoomPlacer
+from .mazemap import Maze
+from .floorcache import FloorCache
+from .prefetch import FloorPrefetcher, pack_floor, unpack_floor
 from .pathfinding import PathFinder
-from ..utils import GameObject, Message, key_to_coords, roll
-from ..config import DARK0, DARK1, DARK4, WHITE, FADED_BROWN
-from ..config import MIN_ROOM_SIZE, MAX_ROOM_SIZE, MAX_ROOMS, LIGHT1
-
-
-class Tile:
-    '''A tile in the dungeon map'''
-    def __init__(self, name, room_id=-62):
-        # NOTE: room_id=-62 sets char to '#' on the path_preview script
-        self.explored = False
-        self.path_cost = None
-        self.agro_cost = 1
-        self.agro_weight = None
-        self.room_id = room_id
-        # Initialise the tile settings
-        getattr(self, name)()
-
-    def __lt__(self, other):
-        return self.path_cost <= other.path_cost
-
-    def wall(self):
-        self.name = 'wall'
-        self.char = '#'
-        self.fg, self.bg = DARK4, DARK1
-        self.block_move, self.block_sight = True, True
-        self.agro_cost = 4
-
-    def floor(self):
-        self.name = 'floor'
-        self.char = '.'
-        self.fg, self.bg = DARK4, DARK0
-        self.block_move, self.block_sight = False, False
-        self.path_cost = 1
-        self.agro_cost = 1
-
-    def closed_door(self, allow_secret_door=False):
-        if allow_secret_door and roll(100) >= 98:
-            self.secret_door()
-        else:
-            self.name = 'closed_door'
-            self.char = '+'
-            self.fg, self.bg = FADED_BROWN, DARK0
-            self.block_move, self.block_sight = True, True
-            self.path_cost = 2
-            self.agro_cost = 2
-
-    def open_door(self):
-        self.name = 'open_door'
-        self.char = "'"
-        self.fg, self.bg = FADED_BROWN, DARK0
-        self.block_move, self.block_sight = False, False
-        self.path_cost = 1
-        self.agro_cost = 1
-
-    def secret_door(self):
-        self.name = 'secret_door'
-        self.char = "#"
-        self.fg, self.bg = DARK4, DARK1
-        self.block_move, self.block_sight = True, True
-        self.agro_cost = 3
-
-    def up(self):
-        self.name = 'up'
-        self.char = "<"
-        self.fg, self.bg = WHITE, DARK0
-        self.block_move, self.block_sight = False, False
-        self.path_cost = 1
-        self.agro_cost = 1
-
-    def down(self):
-        self.name = 'down'
-        self.char = ">"
-        self.fg, self.bg = WHITE, DARK0
-        self.block_move, self.block_sight = False, False
-        self.path_cost = 1
-        self.agro_cost = 1
+from ..utils import GameObject
+from ..config import MIN_ROOM_SIZE, MAX_ROOM_SIZE, MAX_ROOMS
+from ..config import MAP_ALG, MAZE_ROOMS
 
 
 class Room(GameObject):
@@ -125,16 +62,31 @@ class Room(GameObject):
         right = self.x1 > other.x1 and self.x1 > other.x2
         return left or right
 
-    def random_point(self, offset=1):
+    def random_point(self, offset=1, rng=None):
         '''Return a random point inside the room'''
-        x = randint(self.x1+offset, self.x2-offset)
-        y = randint(self.y1+offset, self.y2-offset)
+        rng = random if rng is None else rng
+        x = rng.randint(self.x1+offset, self.x2-offset)
+        y = rng.randint(self.y1+offset, self.y2-offset)
         return (x, y)
 
 
 class Map:
-    '''Map for a floor in the dungeon'''
-    def __init__(self, width, height, depth, player=None):
+    '''
+    Map for a floor in the dungeon
+
+    All of the randomness in generating the floor comes from rng, a
+    random.Random: by default one seeded from the random module.
+    With generate=False the floor is left as solid rock for the caller to
+    fill in (see savegame). algorithm picks how the rooms are laid out:
+    'rooms', 'bsp' or 'maze' (see MAP_ALG).
+    '''
+    def __init__(self, width, height, depth, player=None, rng=None,
+                 generate=True, algorithm=MAP_ALG):
+        if rng is None:
+            rng = random.Random(random.getrandbits(64))
+        self.rng = rng
+        self.algorithm = algorithm
+
         # NOTE: these are read from config.py
         self.max_rooms = MAX_ROOMS
         self.max_room_size = MAX_ROOM_SIZE
@@ -143,70 +95,125 @@ class Map:
         self.width = width
         self.height = height
         self.depth = depth + 1  # depth is the depth before adding this map
-        self.lmap = [[Tile('wall') for x in range(width)]
-                     for y in range(height)]
+        self.lmap = TileGrid(width, height)
+        self.agro_field = AgroField(self.lmap)
         self.rooms = []
         self.enemies = []
         self.items = []
         self.player = player
+        self.occupancy = Occupancy()
+        if player is not None:
+            self.occupancy.add(player)
         self.graph = {}
         self.centers = {}
         self.starting_x = 0
         self.starting_y = 0
 
-        # Add the rooms
-        for rm in range(self.max_rooms):
-            rwidth = randint(self.min_room_size, self.max_room_size)
-            rheight = randint(self.min_room_size, self.max_room_size)
-            x = randint(0, self.width - rwidth - 1)
-            y = randint(0, self.height - rheight - 1)
+        if generate:
+            self.generate()
 
-            new_room = Room(x, y, rwidth, rheight)
-            for room in self.rooms:
-                if new_room.overlaps_with(room):
-                    break
-            else:
-                self.add_room(new_room)
+    def generate(self):
+        '''Lay out, connect and populate the floor'''
+        if self.algorithm == 'bsp':
+            self.bsp()
+        elif self.algorithm == 'maze':
+            self.maze()
+        else:
+            self.place_rooms()
+            self.generate_graph()
 
         # Connect the rooms and populate with features
-        self.generate_graph()
         self.connect()
         self.add_doors()
         self.add_features()
         self.populate()
 
+    def place_rooms(self):
+        '''Add rooms at random places until the floor is full'''
+        rng = self.rng
+        placer = RoomPlacer(self.width, self.height, self.min_room_size)
+        for rm in range(self.max_rooms):
+            rwidth = rng.randint(self.min_room_size, self.max_room_size)
+            rheight = rng.randint(self.min_room_size, self.max_room_size)
+            x = rng.randint(0, self.width - rwidth - 1)
+            y = rng.randint(0, self.height - rheight - 1)
+
+            new_room = Room(x, y, rwidth, rheight)
+            if placer.place(new_room):
+                self.add_room(new_room)
+            elif placer.exhausted:
+                break
+
     @property
     def objects(self):
+        # NOTE: this builds a new list each time: use self.occupancy for
+        #       anything that only cares about particular cells
         return self.items + self.enemies + [self.player]
 
+    def enter(self, player):
+        '''Put the player on the up stairs of this floor'''
+        self.player = player
+        self.occupancy.place(player, self.starting_x, self.starting_y)
+
+    def leave(self):
+        '''Take the player off this floor'''
+        if self.player in self.occupancy:
+            self.occupancy.remove(self.player)
+        self.player = None
+
+    def spawn(self, obj, item=False):
+        '''Add a new enemy (or item) to the floor'''
+        if item:
+            self.items.append(obj)
+        else:
+            self.enemies.append(obj)
+        self.occupancy.add(obj)
+
     def generate_graph(self, additional_connections=True):
         '''
         Generate a randomised connected graph via an inital spanning tree
         generated using Prim's MST algorithm.
         NOTE: each edge is stored twice: a->b, b->a for path finding
         '''
-        rooms = set(self.rooms)
+        rooms = self.rooms
+        count = len(rooms)
         G = {r: set() for r in rooms}
-        so_far = {self.rooms[0]}
-
-        # Prim's MST
-        while len(so_far) < len(rooms):
-            remaining = rooms.difference(so_far)
-            weights = [(self.room_cost(s, r), s, r)
-                       for s in so_far for r in remaining]
-            # Select the two rooms that are closest to one another, one from
-            # 'so_far' and one from 'remaining'
-            _, existing, new = min(weights, key=lambda w: w[0])
-            G[existing].add(new)
-            G[new].add(existing)
-            so_far.add(new)
-
-        if additional_connections:
-            for n in range(randint(5, len(rooms))):
-                n1 = choice(list(rooms))
-                existing = G[n1]
-                existing.add(n1)
-                n2 = choice(list(rooms.difference(existing)))
+
+        # Prim's MST over the complete graph of room centres. Rather than
+        # searching every (tree, remaining) pair each step we keep the
+        # distance from each room to its closest room in the tree and
+        # update that from the room added last.
+        # NOTE: distances match room_cost
+        centers = np.array([r.center for r in rooms], dtype=np.float64)
+        closest = np.full(count, np.inf)
+        parent = np.zeros(count, dtype=np.intp)
+        in_tree = np.zeros(count, dtype=np.bool_)
+        new = 0
+        for _ in range(count - 1):
+            in_tree[new] = True
+            offsets = centers - centers[new]
+            cost = np.hypot(offsets[:, 0], offsets[:, 1])
+            closer = (cost < closest) & ~in_tree
+            closest[closer] = cost[closer]
+            parent[closer] = new
+            new = int(np.argmin(closest))
+            closest[new] = np.inf
+            existing = rooms[parent[new]]
+            G[existing].add(rooms[new])
+            G[rooms[new]].add(existing)
+
+        if additional_connections and count > 1:
+            rng = self.rng
+            for n in range(rng.randint(min(5, count), count)):
+                n1 = rng.choice(rooms)
+                if len(G[n1]) == count - 1:
+                    # Already connected to everything
+                    continue
+                # Most rooms only have a handful of connections so keep
+                # picking until we find a room that isn't one of them
+                n2 = n1
+                while n2 is n1 or n2 in G[n1]:
+                    n2 = rng.choice(rooms)
                 G[n1].add(n2)
                 G[n2].add(n1)
 
@@ -215,15 +222,13 @@ class Map:
     @property
     def graph_edges(self):
         '''return a list of edges in the graph'''
-        edges = set()
+        # NOTE: sorted so that a given seed always generates the same map
+        edges = []
         for node, connections in self.graph.items():
-            for connection in connections:
-                edge = (node, connection)
-                if (edge in edges) or ((edge[1], edge[0]) in edges):
-                    pass
-                else:
-                    edges.add(edge)
-        return list(edges)
+            for connection in sorted(connections):
+                if node.id < connection.id:
+                    edges.append((node, connection))
+        return edges
 
     def neighbouring_rooms(self, room):
         '''Return all rooms connected to this one'''
@@ -235,23 +240,15 @@ class Map:
         if include_coords and include_offsets:
             raise ValueError('asking for both coords and offsets')
 
-        offsets = [(-1, 0), (1, 0), (0, -1), (0, 1),
-                   (-1, -1), (-1, 1), (1, -1), (1, 1)]
-
-        tiles = []
-
-        for offset in offsets:
-            dx, dy = offset
-            X, Y = x + dx, y + dy
-            if (0 <= X < len(self.lmap[0])) and (0 <= Y < len(self.lmap)):
-                tiles.append(((X, Y), offset, self.lmap[Y][X]))
-
+        lmap = self.lmap
+        neighbours = lmap.iter_neighbours(x, y)
         if include_coords:
-            return [(t[0], t[2]) for t in tiles]
+            return [((X, Y), lmap.tile(X, Y)) for _, _, X, Y in neighbours]
         elif include_offsets:
-            return [(t[1], t[2]) for t in tiles]
+            return [((dx, dy), lmap.tile(X, Y))
+                    for dx, dy, X, Y in neighbours]
         else:
-            return [t[2] for t in tiles]
+            return [lmap.tile(X, Y) for _, _, X, Y in neighbours]
 
     def room_cost(self, r1, r2):
         '''Weight edges based on displacement of room centres'''
@@ -264,141 +261,222 @@ class Map:
         ID = len(self.rooms)
         room.id = ID
 
-        for x in range(room.x1+1, room.x2):
-            for y in range(room.y1+1, room.y2):
-                self.lmap[y][x] = Tile('floor', ID)
+        self.lmap.fill(room.x1+1, room.y1+1, room.x2, room.y2, FLOOR, ID)
 
         if len(self.rooms) == 0:
             # First room is the entry point
-            self.starting_x, self.starting_y = room.random_point()
+            self.starting_x, self.starting_y = room.random_point(
+                rng=self.rng)
             self.lmap[self.starting_y][self.starting_x].up()
         else:
             pass
 
         self.rooms.append(room)
 
-    def corridor(self, p1, p2, const, horizontal):
-        '''Draw a corridor from p1 to p2 at constant x/y'''
-        start, finish = min(p1, p2), max(p1, p2)
-
-        if horizontal:
-            for x in range(start, finish+1):
-                self.lmap[const][x].floor()
-        else:
-            for y in range(start, finish+1):
-                self.lmap[y][const].floor()
-
     def connect(self):
         '''Ensure that all rooms can be reached'''
+        segments = []
         for room, neighbour in self.graph_edges:
             # Check the relative positions of the two rooms
             horizontal = room.horizontal_with(neighbour)
             # Take a random point from each room to work with
-            x1, y1 = room.random_point(offset=3)
-            x2, y2 = neighbour.random_point(offset=3)
+            x1, y1 = room.random_point(offset=3, rng=self.rng)
+            x2, y2 = neighbour.random_point(offset=3, rng=self.rng)
 
             # Connect the rooms
             if horizontal:
-                div = randint(min(x1, x2), max(x1, x2))
+                div = self.rng.randint(min(x1, x2), max(x1, x2))
                 p1, p2, const1, const2 = x1, x2, y1, y2
             else:
-                div = randint(min(y1, y2), max(y1, y2))
+                div = self.rng.randint(min(y1, y2), max(y1, y2))
                 p1, p2, const1, const2 = y1, y2, x1, x2
 
             # This makes sure that each corridor has a bend in it
-            self.corridor(p1, div, const1, horizontal)
-            self.corridor(p2, div, const2, horizontal)
-            self.corridor(const1, const2, div, not horizontal)
+            segments.append((const1, p1, div, horizontal))
+            segments.append((const2, p2, div, horizontal))
+            segments.append((div, const1, const2, not horizontal))
+
+        # NOTE: the same cells as calling self.corridor for each segment
+        self.lmap.carve(segments, FLOOR)
 
     def add_doors(self):
         '''
-        Try to add some doors to the dungeon
+        Try to add some doors to the dungeon: floor on the edge of a room
+        with floor either side of it in one direction and none in the other
         '''
-        def valid_cell(x, y):
-            x_neighbours = [self.lmap[y][x-1].name, self.lmap[y][x+1].name]
-            y_neighbours = [self.lmap[y-1][x].name, self.lmap[y+1][x].name]
-            x2 = len([x for x in x_neighbours if x == 'floor'])
-            y2 = len([y for y in y_neighbours if y == 'floor'])
-            return (x2 == 2 and y2 == 0) or (x2 == 0 and y2 == 2)
+        grid = self.lmap
+        floor = grid.kind == FLOOR
+        across, down = grid.floor_neighbours()
+        # NOTE: padded by a cell on each side so that edges need no checks
+        placed = np.zeros((self.height + 2, self.width + 2), dtype=np.int8)
 
         for room in self.rooms:
-            for i, cell in enumerate(self.lmap[room.y1][room.x1:room.x2]):
-                if cell.name == 'floor' and valid_cell(room.x1+i, room.y1):
-                    cell.closed_door(allow_secret_door=True)
-
-            for i, cell in enumerate(self.lmap[room.y2][room.x1:room.x2]):
-                if cell.name == 'floor' and valid_cell(room.x1+i, room.y2):
-                    cell.closed_door(allow_secret_door=True)
-
-            for i, row in enumerate(self.lmap[room.y1:room.y2]):
-                cell = row[room.x1]
-                if cell.name == 'floor' and valid_cell(room.x1, room.y1+i):
-                    cell.closed_door(allow_secret_door=True)
-
-            for i, row in enumerate(self.lmap[room.y1:room.y2]):
-                cell = row[room.x2]
-                if cell.name == 'floor' and valid_cell(room.x2, room.y1+i):
-                    cell.closed_door(allow_secret_door=True)
+            # The floor on the edges of the room in the order that they have
+            # always been walked in (which decides the secret door rolls)
+            xs = np.arange(room.x1, room.x2)
+            ys = np.arange(room.y1, room.y2)
+            cells = [(x, room.y1)
+                     for x in xs[floor[room.y1, room.x1:room.x2]].tolist()]
+            cells += [(x, room.y2)
+                      for x in xs[floor[room.y2, room.x1:room.x2]].tolist()]
+            cells += [(room.x1, y)
+                      for y in ys[floor[room.y1:room.y2, room.x1]].tolist()]
+            cells += [(room.x2, y)
+                      for y in ys[floor[room.y1:room.y2, room.x2]].tolist()]
+
+            for x, y in cells:
+                around = placed[y:y+3, x:x+3]
+                if around[1, 1]:
+                    continue  # corners are on two edges
+                # Doors placed so far in this pass are no longer floor
+                h = across[y, x] - around[1, 0] - around[1, 2]
+                v = down[y, x] - around[0, 1] - around[2, 1]
+                if (h == 2 and v == 0) or (h == 0 and v == 2):
+                    grid.tile(x, y).closed_door(allow_secret_door=True,
+                                                rng=self.rng)
+                    placed[y+1, x+1] = 1
 
     def add_features(self):
-        exit_room = choice(self.rooms)
-        x, y = exit_room.random_point()
-        self.lmap[y][x] = Tile('down', exit_room.id)
+        exit_room = self.rng.choice(self.rooms)
+        x, y = exit_room.random_point(rng=self.rng)
+        self.lmap.set_kind(x, y, DOWN)
+        self.lmap.room_id[y, x] = exit_room.id
 
-    def close_door(self, screen, x, y):
-        '''Allow the player to close a door'''
-        neighbours = self.neighbouring_tiles(x, y)
-        doors = [n for n in neighbours if n.name == 'open_door']
+    def open_doors(self, x, y):
+        '''The open doors next to (x, y)'''
+        return [n for n in self.neighbouring_tiles(x, y)
+                if n.name == 'open_door']
+
+    def close_door(self, x, y, direction=None):
+        '''
+        The open door for the player at (x, y) to close: the one in
+        direction (dx, dy) if given, otherwise the only one next to them.
+        None if there isn't one (or there are several to choose from).
+        '''
+        if direction is not None:
+            dx, dy = direction
+            tile = self.lmap[y + dy][x + dx]
+            return tile if tile.name == 'open_door' else None
 
+        doors = self.open_doors(x, y)
         if len(doors) == 1:
             return doors[0]
-        elif len(doors) > 1:
-            screen.add_message(Message('Select a door...', LIGHT1))
-            screen.panel.render_messages(screen.messages)
-            tdl.flush()
-            tdl.event.key_wait()
-            keypress = tdl.event.key_wait()
-            keys = ['UP', 'DOWN', 'LEFT', 'RIGHT']
-            keychars = ['h', 'j', 'k', 'l', 'y', 'u', 'b', 'n']
-            if keypress.key in keys:
-                key = keypress.key
-            elif keypress.keychar in keychars:
-                key = keypress.keychar
-            else:
-                return None
-            x, y = key_to_coords(key, x, y)
-            tile = screen.current_map.lmap[y][x]
-            if tile.name == 'open_door':
-                return tile
-            else:
-                return None
-        else:
-            return None
+        return None
 
     def populate(self):
         '''Add enemies to the floor'''
         for room in self.rooms[1:]:
-            x, y = room.random_point()
-            self.enemies.append(enemy('Goblin', x, y))
+            x, y = room.random_point(rng=self.rng)
+            self.spawn(enemy('Goblin', x, y, self.rng))
 
     def bsp(self):
         '''
-        Use binary space partitioning to generate a map.
+        Use binary space partitioning to generate a map: split the floor
+        into a tree of containers, put a room in each leaf and join the
+        rooms either side of each split.
+        '''
+        root = Container(0, 0, self.width, self.height, rng=self.rng)
+        root.split_all(self.min_room_size + 2)
+        for room in root.get_rooms(self.min_room_size, self.max_room_size):
+            self.add_room(room)
+
+        G = {r: set() for r in self.rooms}
+        for r1, r2 in root.connections():
+            G[r1].add(r2)
+            G[r2].add(r1)
+        self.graph = G
+
+    def maze(self):
+        '''
+        Fill the floor with a maze and then cut rooms out of it. The maze
+        already joins every part of the floor so no corridors are needed
+        and the rooms are left unlinked in the graph.
         '''
-        root = Container(self.width, self.height)
+        Maze((self.width - 1) // 2, (self.height - 1) // 2,
+             rng=self.rng).carve(self.lmap)
+
+        # NOTE: rooms are kept to even coordinates so that their walls are
+        #       on the walls of the maze
+        rng = self.rng
+        placer = RoomPlacer(self.width, self.height, self.min_room_size)
+        for _ in range(self.max_rooms):
+            rwidth = 2 * rng.randint(self.min_room_size // 2,
+                                     self.max_room_size // 2)
+            rheight = 2 * rng.randint(self.min_room_size // 2,
+                                      self.max_room_size // 2)
+            x = 2 * rng.randint(0, (self.width - rwidth - 1) // 2)
+            y = 2 * rng.randint(0, (self.height - rheight - 1) // 2)
+
+            new_room = Room(x, y, rwidth, rheight)
+            if placer.place(new_room):
+                self.add_room(new_room)
+                if len(self.rooms) == MAZE_ROOMS:
+                    break
+            elif placer.exhausted:
+                break
+        self.graph = {r: set() for r in self.rooms}
+
+
+def build_floor(width, height, depth, seed, algorithm=MAP_ALG):
+    '''Generate the floor at depth (the number of floors above it)'''
+    return Map(width, height, depth, rng=random.Random(seed),
+               algorithm=algorithm)
 
 
 class Dungeon:
-    '''Control class for a map and its contents'''
-    def __init__(self, height=40, width=60, player=None, new_alg=False):
+    '''
+    Control class for a map and its contents
+
+    Each floor is generated from its own seed derived from the dungeon
+    seed, which is drawn from rng (or the random module) if not given.
+    algorithm picks the generator for every floor (see MAP_ALG); new_alg
+    is the older way of asking for 'bsp'.
+    With prefetch > 0 that many floors below the deepest one are
+    built ahead of time in worker processes. The work is handed to them
+    from idle, which the game calls while it waits on the player, so
+    that taking the stairs only has to collect the next floor.
+
+    Floors are held in a FloorCache so only the ones near the player stay
+    in memory. Passing floors (a FloorCache, and current) restores a saved
+    dungeon instead of generating the first floor: the player stays where
+    they were.
+    '''
+    def __init__(self, height=40, width=60, player=None, new_alg=False,
+                 seed=None, prefetch=0, rng=None, floors=None, current=0,
+                 algorithm=None):
         self.height = height
         self.width = width
 
         self.player = player
-
-        self.maps = []
+        if algorithm is None:
+            algorithm = 'bsp' if new_alg else MAP_ALG
+        self.algorithm = algorithm
+        self.new_alg = self.algorithm == 'bsp'
+        if seed is None:
+            seed = (random if rng is None else rng).getrandbits(64)
+        self.seed = seed
+        self.prefetcher = FloorPrefetcher(
+            partial(build_floor, algorithm=self.algorithm), width, height,
+            self.seed, prefetch)
+
+        self.current = 0
+        # Depth of the deepest floor if it has been built since the last
+        # prefetch (see idle)
+        self.prefetch_from = None
         self.pathfinder = PathFinder()
-        self.new_floor(new_alg)  # Appends a new map to self.maps
+        if floors is None:
+            self.maps = FloorCache(pack_floor, unpack_floor)
+            self.new_floor(new_alg)  # Appends a new map to self.maps
+        else:
+            self.maps = floors
+            self.current = current
+            floors.focus(current)
+            floor = floors[current]
+            if player is not None:
+                floor.player = player
+                floor.occupancy.place(player, player.x, player.y)
+            self.pathfinder.map = floor
+            self.prefetch_from = len(floors) - 1
 
     def __getitem__(self, ix):
         return self.maps[ix]
@@ -406,41 +484,152 @@ class Dungeon:
     def new_floor(self, new_alg):
         '''Generate a new map'''
         # TODO: have some additional stuff set by the current level etc
-        new_map = Map(self.width, self.height, len(self.maps), self.player)
+        depth = len(self.maps)
+        if self.prefetch_from is not None:
+            # NOTE: idle hasn't been called since the last floor was built
+            self.prefetcher.prefetch(self.prefetch_from)
+        new_map = self.prefetcher.get(depth)
+        if self.player is not None and depth == self.current:
+            new_map.enter(self.player)
         self.maps.append(new_map)
         self.pathfinder.map = new_map
+        self.prefetch_from = depth
+
+    def descend(self):
+        '''Take the player down to the next floor and return its map'''
+        if self.current + 1 == len(self.maps):
+            self.new_floor(self.new_alg)
+        self.maps[self.current].leave()
+        self.current += 1
+        self.maps.focus(self.current)
+        new_map = self.maps[self.current]
+        if self.player is not None:
+            new_map.enter(self.player)
+        self.pathfinder.map = new_map
+        return new_map
+
+    def idle(self):
+        '''
+        Start building the floors below the deepest one and pack away the
+        floors that have dropped out of the cache
+        '''
+        if self.prefetch_from is not None:
+            self.prefetcher.prefetch(self.prefetch_from)
+            self.prefetch_from = None
+        self.maps.pack_leaving()
+
+    def close(self):
+        '''Stop generating floors in the background'''
+        self.prefetcher.close()
 
 
 class Container:
-    '''Container for splitting a map using bsp'''
-    def __init__(self, width, height, ratio=0.45):
+    '''
+    Container for splitting a map using bsp
+
+    A rectangle of the floor at (x, y) that is either a leaf or split in
+    two. Containers are never split into children thinner than ratio
+    times their length.
+    '''
+    def __init__(self, x, y, width, height, ratio=0.45, rng=None):
+        self.x = x
+        self.y = y
         self.width = width
         self.height = height
-        self.vertical_split = choice([True, False])
+        self.ratio = ratio
+        self.rng = random if rng is None else rng
+        self.vertical_split = self.rng.choice([True, False])
         self.children = []
+        self.room = None
 
-    def split(self):
-        '''create two new containers with a minimum desired ratio'''
-        if self.vertical_split:
-            w1 = randint(0, self.width)
-            w2 = self.width - w1
-            h1 = h2 = self.height
+    def split(self, min_size):
+        '''
+        Create two new containers, each at least min_size across. Returns
+        False if this one is too small to split.
+        '''
+        vertical = self.vertical_split
+        # Keep the children from getting long and thin
+        if self.width < self.height * self.ratio:
+            vertical = False
+        elif self.height < self.width * self.ratio:
+            vertical = True
+        length = self.width if vertical else self.height
+        if length < 2 * min_size:
+            vertical = not vertical
+            length = self.width if vertical else self.height
+            if length < 2 * min_size:
+                return False
+
+        cut = self.rng.randint(min_size, length - min_size)
+        if vertical:
+            self.children = [
+                Container(self.x, self.y, cut, self.height, self.ratio,
+                          rng=self.rng),
+                Container(self.x + cut, self.y, self.width - cut,
+                          self.height, self.ratio, rng=self.rng)]
         else:
-            h1 = randint(0, self.height)
-            h2 = self.height - h1
-            w1 = w2 = self.width
-
-        self.children = [Container(w1, h1), Container(w2, h2)]
+            self.children = [
+                Container(self.x, self.y, self.width, cut, self.ratio,
+                          rng=self.rng),
+                Container(self.x, self.y + cut, self.width,
+                          self.height - cut, self.ratio, rng=self.rng)]
+        return True
+
+    def split_all(self, min_size):
+        '''Keep splitting until every leaf is as small as it can be'''
+        pending = [self]
+        while pending:
+            container = pending.pop()
+            if container.split(min_size):
+                pending.extend(container.children)
+
+    def leaves(self):
+        if self.children == []:
+            return [self]
+        return [leaf for child in self.children for leaf in child.leaves()]
 
-    def split_children(self):
+    def get_rooms(self, min_size, max_size):
+        '''
+        Make a room inside each leaf (walls included) and return them all,
+        left to right / top to bottom through the tree.
+        '''
+        rooms = []
+        for leaf in self.leaves():
+            # NOTE: a room's walls are at x and x + width
+            width = self.rng.randint(min_size, min(max_size, leaf.width - 1))
+            height = self.rng.randint(min_size,
+                                      min(max_size, leaf.height - 1))
+            x = self.rng.randint(leaf.x, leaf.x + leaf.width - 1 - width)
+            y = self.rng.randint(leaf.y, leaf.y + leaf.height - 1 - height)
+            leaf.room = Room(x, y, width, height)
+            rooms.append(leaf.room)
+        return rooms
+
+    def connections(self):
+        '''
+        The pairs of rooms to join: for each split, the closest pair of
+        rooms with one on either side of it.
+        '''
+        # NOTE: the leaves under each container are a run of this list
+        leaves = self.leaves()
+        centres = np.array([leaf.room.center for leaf in leaves])
+        span = {leaf: (ix, ix + 1) for ix, leaf in enumerate(leaves)}
+        pairs = []
+        # Children come before their parents in reverse pre-order
+        for container in reversed(self.containers()):
+            if container.children == []:
+                continue
+            (lo, mid), (_, hi) = (span[c] for c in container.children)
+            span[container] = (lo, hi)
+            dx = centres[lo:mid, None, 0] - centres[None, mid:hi, 0]
+            dy = centres[lo:mid, None, 1] - centres[None, mid:hi, 1]
+            i, j = np.unravel_index(np.argmin(dx * dx + dy * dy), dx.shape)
+            pairs.append((leaves[lo + i].room, leaves[mid + j].room))
+        return pairs
+
+    def containers(self):
+        '''Every container in the tree, this one first'''
+        found = [self]
         for child in self.children:
-            child.split()
-
-    def get_rooms(self):
-        if self.children == []:
-            # we're at the bottom level so make the rooms
-            # XXX: Need to ensure correct room dimensions
-            x, y = randint(1, self.width-1), randint(1, self.height-1)
-        else:
-            for child in self.children:
-                child.get_rooms()
+            found.extend(child.containers())
+        return found
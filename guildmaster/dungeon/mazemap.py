@@ -1,45 +1,101 @@
-from random import shuffle, randrange
+'''
+Maze generation with a randomised depth first search.
+
+Mazes are kept in a single cell representation: a (2 * height + 1,
+2 * width + 1) array where the maze cells sit at odd coordinates, the
+cells between them are either wall or a passage and the outer ring is
+always wall. That is the same layout as the tiles of a floor so a maze can
+be painted straight onto a TileGrid (see Maze.carve).
+'''
+import random
+
+import numpy as np
+
+from .grid import FLOOR
 
 
 class Maze:
     '''A simple maze generator'''
-    def __init__(self, width, height):
+    def __init__(self, width, height, rng=None):
         self.width = width
         self.height = height
+        self.rng = random if rng is None else rng
 
     def set_dims(self, w, h):
         self.width = w
         self.height = h
 
-    def generate(self):
-        '''Generate the maze'''
-        # TODO :: Move from walls + 2x2 cells to my single cell representation
-        self.visited = [[0] * self.width + [1] for _ in range(self.height)]
-        self.visited += [[1] * (self.width + 1)]
-        self.ver = [["|  "] * self.width + ['|'] for _ in range(self.height)] + [[]]
-        self.hor = [["+--"] * self.width + ['+'] for _ in range(self.height + 1)]
+    def cells(self):
+        '''
+        Generate a maze and return it as a bool array of open cells (see
+        the module docstring for the layout).
+        '''
+        return self.walk(self.rng.randrange(self.width),
+                         self.rng.randrange(self.height))
+
+    def walk(self, x, y):
+        '''
+        Carve out the maze from cell (x, y), backtracking along an explicit
+        stack rather than recursing so that the size is only limited by
+        memory.
+        '''
+        width, height = self.width, self.height
+        # NOTE: the array is padded with an extra ring of cells that are
+        #       marked as already visited so that the walk never needs a
+        #       bounds check. Cells are 0 until they are carved out.
+        row = 2 * width + 3
+        visited = bytearray(row * (2 * height + 3))
+        visited[:row] = visited[-row:] = b'\1' * row
+        visited[::row] = visited[row-1::row] = b'\1' * (2 * height + 3)
 
-        self.walk(randrange(self.width), randrange(self.height))
+        # Unvisited neighbours (as a bit mask) -> the steps to each of them
+        steps = (2, -2, 2 * row, -2 * row)
+        choices = [[s for bit, s in enumerate(steps) if mask >> bit & 1]
+                   for mask in range(16)]
+        right, left, down, up = steps
 
-        s = ""
-        for (h, v) in zip(self.hor, self.ver):
-            s += ''.join(h + ['\n'] + v + ['\n'])
-        return s
+        ix = (2 * y + 2) * row + 2 * x + 2
+        visited[ix] = 1
+        stack = [ix]
+        push, pop = stack.append, stack.pop
+        rand = self.rng.random
+        while True:
+            options = choices[(visited[ix + right] ^ 1) |
+                              (visited[ix + left] ^ 1) << 1 |
+                              (visited[ix + down] ^ 1) << 2 |
+                              (visited[ix + up] ^ 1) << 3]
+            if not options:
+                pop()
+                if not stack:
+                    break
+                ix = stack[-1]
+                continue
+            step = options[int(rand() * len(options))]
+            visited[ix + step // 2] = 1  # the wall in between
+            ix += step
+            visited[ix] = 1
+            push(ix)
 
-    def walk(self, x, y):
-        '''Take a step through the map and mark the maze'''
-        self.visited[y][x] = 1
-
-        directions = [(x - 1, y), (x, y + 1), (x + 1, y), (x, y - 1)]
-        shuffle(directions)
-
-        for (X, Y) in directions:
-            if not self.visited[Y][X]:
-                if X == x:
-                    self.hor[max(y, Y)][x] = "+  "
-                if Y == y:
-                    self.ver[y][max(x, X)] = "   "
-                self.walk(X, Y)
+        padded = np.frombuffer(visited, dtype=np.uint8).reshape(-1, row)
+        return padded[1:-1, 1:-1].astype(np.bool_)
+
+    def carve(self, grid, x=0, y=0, kind=FLOOR):
+        '''
+        Generate a maze and paint its open cells onto a TileGrid with its
+        top left corner at (x, y). Returns the array from cells.
+        '''
+        cells = self.cells()
+        grid.paint(cells, x, y, kind)
+        return cells
+
+    def generate(self):
+        '''Generate the maze as text'''
+        is_open = self.cells()
+        pieces = np.full(is_open.shape, '  ', dtype='<U2')
+        pieces[::2, ::2] = '+'
+        pieces[::2, 1::2] = np.where(is_open[::2, 1::2], '  ', '--')
+        pieces[1::2, ::2] = np.where(is_open[1::2, ::2], ' ', '|')
+        return ''.join(''.join(line) + '\n' for line in pieces.tolist())
 
 
 if __name__ == '__main__':
@@ -0,0 +1,93 @@
+'''
+Spatial index of the creatures and items on a floor.
+'''
+
+
+class Occupancy:
+    '''
+    Maps cells to the objects standing in them so that blocking checks,
+    finding attack targets and finding what is inside the FOV don't need
+    to scan every object on the floor.
+
+    Objects in a cell are kept in draw order: the last one is drawn on top.
+    All moves need to go through move() (or place()) to keep the index in
+    sync with the objects' x and y.
+    '''
+    def __init__(self):
+        self.cells = {}
+        self.positions = {}
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __contains__(self, obj):
+        return obj in self.positions
+
+    def add(self, obj):
+        '''Start tracking an object at its current position'''
+        if obj in self.positions:
+            raise ValueError('{} is already on this floor'.format(obj))
+        position = (obj.x, obj.y)
+        self.positions[obj] = position
+        self.cells.setdefault(position, []).append(obj)
+
+    def remove(self, obj):
+        '''Stop tracking an object'''
+        position = self.positions.pop(obj)
+        occupants = self.cells[position]
+        occupants.remove(obj)
+        if not occupants:
+            del self.cells[position]
+
+    def move(self, obj, x, y):
+        '''Move a tracked object to (x, y), on top of anything there'''
+        self.remove(obj)
+        obj.x, obj.y = x, y
+        self.add(obj)
+
+    def place(self, obj, x, y):
+        '''Move an object to (x, y), tracking it if it isn't already'''
+        if obj in self.positions:
+            self.move(obj, x, y)
+        else:
+            obj.x, obj.y = x, y
+            self.add(obj)
+
+    def send_to_back(self, obj):
+        '''Draw an object under everything else in its cell'''
+        occupants = self.cells[self.positions[obj]]
+        occupants.remove(obj)
+        occupants.insert(0, obj)
+
+    def send_to_front(self, obj):
+        '''Draw an object over everything else in its cell'''
+        occupants = self.cells[self.positions[obj]]
+        occupants.remove(obj)
+        occupants.append(obj)
+
+    def at(self, x, y):
+        '''All objects at (x, y) in draw order'''
+        return self.cells.get((x, y), [])
+
+    def blocker(self, x, y):
+        '''The object blocking movement into (x, y), if there is one'''
+        for obj in self.cells.get((x, y), []):
+            if obj.block_move:
+                return obj
+        return None
+
+    def creature_at(self, x, y):
+        '''The first living creature at (x, y), if there is one'''
+        for obj in self.cells.get((x, y), []):
+            if getattr(obj, 'alive', False):
+                return obj
+        return None
+
+    def objects_in(self, cells):
+        '''All objects inside a set of (x, y), in draw order per cell'''
+        # NOTE: walk whichever of the two is smaller
+        if len(cells) < len(self.cells):
+            found = (self.cells[c] for c in cells if c in self.cells)
+        else:
+            found = (objs for c, objs in self.cells.items() if c in cells)
+        return [obj for objs in found for obj in objs]
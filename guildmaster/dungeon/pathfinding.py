@@ -2,98 +2,472 @@
 Pathfinding on a map.
 '''
 import heapq
+from collections import OrderedDict
+
+import numpy as np
+
+from .distance import distance_field
+from .grid import OFFSETS
+from .hierarchy import RegionPlanner
+from ..config import AGRO_INCREMENTAL, PATH_CACHE_SIZE, JUMP_POINT_SEARCH
+
+
+# Extra cost of a diagonal step on top of the path_cost of the tile
+DIAGONAL_PENALTY = 1
+
+
+class PathCache:
+    '''
+    The last size paths found, least recently used dropped first.
+
+    Entries are for a single grid at a single version: they are all dropped
+    when the grid or its version changes (a door opening or closing, a tile
+    being dug out...) so a (start, target) key is in effect keyed on the
+    layout as well.
+
+    Every suffix of a shortest path is itself a shortest path so a query
+    starting anywhere along a remembered path to the same target is
+    answered from that path.
+    '''
+    def __init__(self, size=PATH_CACHE_SIZE):
+        self.size = size
+        self.grid = None
+        self.version = None
+        self.paths = OrderedDict()  # (start, target) -> path or None
+        self.through = {}  # target -> {cell: (start of a path via cell, ix)}
+        self.hits = 0
+        self.suffix_hits = 0
+        self.misses = 0
+
+    def clear(self):
+        self.paths.clear()
+        self.through.clear()
+
+    def check(self, grid):
+        '''Forget everything if the layout has changed'''
+        if grid is not self.grid or grid.version != self.version:
+            self.clear()
+            self.grid = grid
+            self.version = grid.version
+
+    def get(self, start, target):
+        '''
+        Return (True, path) for a remembered query, with the path possibly
+        None, or (False, None) if it needs searching for.
+        '''
+        key = (start, target)
+        if key in self.paths:
+            self.paths.move_to_end(key)
+            self.hits += 1
+            path = self.paths[key]
+            return True, path if path is None else list(path)
+
+        via = self.through.get(target, {}).get(start)
+        if via is not None:
+            first, ix = via
+            self.paths.move_to_end((first, target))
+            self.suffix_hits += 1
+            return True, list(self.paths[(first, target)][ix:])
+
+        self.misses += 1
+        return False, None
+
+    def put(self, start, target, path):
+        self.paths[(start, target)] = None if path is None else tuple(path)
+        if path is not None:
+            through = self.through.setdefault(target, {})
+            for ix, cell in enumerate(path[:-1]):
+                through.setdefault(cell, (start, ix))
+        while len(self.paths) > self.size:
+            self._drop(*self.paths.popitem(last=False))
+
+    def _drop(self, key, path):
+        start, target = key
+        if path is None:
+            return
+        through = self.through[target]
+        for cell in path[:-1]:
+            if through.get(cell, (None,))[0] == start:
+                del through[cell]
+        if not through:
+            del self.through[target]
 
 
 class PathFinder:
     def __init__(self, map=None):
         '''A pathfinder works from a dungeon of floors'''
         self.map = map
+        self.incremental_agro = AGRO_INCREMENTAL
+        self.jump_points = JUMP_POINT_SEARCH
+        self.paths = PathCache()
+        self.planner = None
+        self._grid = None
 
-    @staticmethod
-    def build_path(came_from, start, target):
-        '''Rebuild the path from the search'''
-        current = target
-        path = [current]
+    def _search_state(self, grid):
+        '''
+        Return the per floor tables used by a_star, (re)building them when
+        the floor changes, and start a new search generation.
+        '''
+        if self._grid is not grid:
+            size = grid.width * grid.height
+            self._grid = grid
+            self._costs_version = None
+            # The extra cost of each step in grid.neighbour_lists: cells with
+            # the same neighbours on the map share a tuple
+            valid = grid.neighbour_table >= 0
+            codes, first = np.unique(np.packbits(valid, axis=1).ravel(),
+                                     return_index=True)
+            patterns = {
+                code: tuple(DIAGONAL_PENALTY if dx and dy else 0
+                            for (dx, dy), ok in zip(OFFSETS, valid[ix]) if ok)
+                for code, ix in zip(codes.tolist(), first.tolist())}
+            self._penalties = [
+                patterns[code]
+                for code in np.packbits(valid, axis=1).ravel().tolist()]
+            self._xs = list(range(grid.width)) * grid.height
+            self._ys = np.repeat(np.arange(grid.height),
+                                 grid.width).tolist()
+            self._g = [0] * size
+            self._parent = [0] * size
+            self._seen = [0] * size
+            self._closed = [0] * size
+            self._generation = 0
+
+        if self._costs_version != grid.version:
+            self._costs = grid.path_cost.ravel().tolist()
+            self._costs_version = grid.version
+            passable = grid.path_cost[grid.path_cost > 0]
+            self._cheapest = int(passable.min()) if passable.size else 1
+            self._special = None
+
+        # NOTE: a cell's g / parent are only valid if its _seen entry is the
+        #       current generation so nothing needs clearing between searches
+        self._generation += 1
+        return self._generation
 
-        while current is not start:
-            current = came_from[current]
-            path.append(current)
+    def a_star(self, start, target):
+        '''
+        Shortest path from start to target as a list of (x, y) inclusive of
+        both, or None if target can't be reached. Repeated and overlapping
+        queries are answered from self.paths, the rest by jump_search if
+        jump_points is set or search if not.
+        '''
+        start, target = tuple(start), tuple(target)
+        self.paths.check(self.map.lmap)
+        found, path = self.paths.get(start, target)
+        if not found:
+            find = self.jump_search if self.jump_points else self.search
+            path = find(start, target)
+            self.paths.put(start, target, path)
+        return path
 
+    def route(self, start, target):
+        '''
+        Like a_star but plans across the rooms and corridors of the floor
+        before refining the route into tiles (see hierarchy.RegionPlanner).
+        Much quicker for long paths but not always exactly the shortest.
+        '''
+        grid = self.map.lmap
+        self._search_state(grid)
+        planner = self.planner
+        if planner is not None and planner.grid is grid and \
+                planner.version != grid.version:
+            # Try to patch just the regions that changed
+            changes = grid.changes_since(planner.version)
+            if changes is None or not planner.update(
+                    self._costs, self._cheapest, changes):
+                planner = None
+        if planner is None or planner.grid is not grid:
+            self.planner = planner = RegionPlanner(
+                grid, self._costs, self._penalties, self._cheapest,
+                DIAGONAL_PENALTY)
+        return planner.path(tuple(start), tuple(target))
+
+    def search(self, start, target):
+        '''
+        A* search on tiles (a_star without the cache).
+
+        Moving onto a tile costs its path_cost, plus DIAGONAL_PENALTY for
+        diagonal steps. The heuristic is the octile distance with the
+        cheapest possible step costs so it never overestimates and no tile
+        needs expanding twice.
+        '''
+        grid = self.map.lmap
+        generation = self._search_state(grid)
+        width = grid.width
+        costs, penalties = self._costs, self._penalties
+        neighbours = grid.neighbour_lists
+        xs, ys = self._xs, self._ys
+        g, parent = self._g, self._parent
+        seen, closed = self._seen, self._closed
+
+        tx, ty = target
+        start_ix, target_ix = start[1] * width + start[0], ty * width + tx
+        if start_ix == target_ix:
+            return [start]
+        if not costs[target_ix]:  # 0 -> can't get through
+            return None
+
+        # Octile distance: min(dx, dy) diagonal steps and the rest straight
+        straight = self._cheapest
+        diagonal = straight + DIAGONAL_PENALTY
+        extra = diagonal - 2 * straight
+
+        seen[start_ix] = generation
+        g[start_ix] = 0
+        # (estimated total, estimate to go, index): ties go to the tile
+        # nearest the target
+        open_set = [(0, 0, start_ix)]
+        pop, push = heapq.heappop, heapq.heappush
+
+        while open_set:
+            current = pop(open_set)[2]
+            if closed[current] == generation:
+                continue  # stale entry for a tile already expanded
+            if current == target_ix:
+                break
+            closed[current] = generation
+            base = g[current]
+
+            for n, penalty in zip(neighbours[current], penalties[current]):
+                step = costs[n]
+                if not step or closed[n] == generation:
+                    continue
+                cost = base + step + penalty
+                if seen[n] != generation or cost < g[n]:
+                    seen[n] = generation
+                    g[n] = cost
+                    parent[n] = current
+                    dx, dy = abs(xs[n] - tx), abs(ys[n] - ty)
+                    h = straight * (dx + dy) + extra * (dx if dx < dy else dy)
+                    push(open_set, (cost + h, h, n))
+        else:
+            return None
+
+        path = [target]
+        current = target_ix
+        while current != start_ix:
+            current = parent[current]
+            path.append((xs[current], ys[current]))
         path.reverse()
         return path
 
-    def a_star(self, start, target):
-        '''A* search on tiles'''
-        # Avoid repeated tuple index lookups while we iterate
-        sx, sy = start
+    def _jump_tables(self, grid):
+        '''
+        Flat lists over the grid padded by a border of walls (so that
+        stepping off the map needs no bounds checks): the path cost of each
+        cell and whether it is special. Special cells are passable cells
+        that cost more than the cheapest tile or that neighbour one. Jump
+        point pruning is only valid away from these.
+        '''
+        if self._special is None:
+            cost = np.pad(grid.path_cost, 1)
+            odd = np.pad((cost > 0) & (cost != self._cheapest), 1)
+            near = np.zeros(cost.shape, dtype=bool)
+            for dy in range(3):
+                for dx in range(3):
+                    near |= odd[dy:dy + cost.shape[0], dx:dx + cost.shape[1]]
+            self._special = (cost.ravel().tolist(),
+                             (near & (cost > 0)).ravel().tolist())
+        return self._special
+
+    def jump_search(self, start, target):
+        '''
+        Jump point search: search without the cache that finds paths of
+        the same cost as search but skips over the open floor between
+        interesting cells rather than adding every tile to the open set.
+
+        Runs of cheapest cost tiles are crossed in straight and diagonal
+        jumps that stop at obstacles' corners (forced neighbours) and the
+        target. Cells on or next to dearer tiles (doors) are expanded one
+        step at a time as in search.
+        '''
+        grid = self.map.lmap
+        self._search_state(grid)
+        costs, special = self._jump_tables(grid)
+        # NOTE: indices here are into the padded grid
+        width = grid.width + 2
+
         tx, ty = target
-        X, Y = (sx - tx), (sy - ty)
+        start_ix = (start[1] + 1) * width + start[0] + 1
+        target_ix = (ty + 1) * width + tx + 1
+        if start_ix == target_ix:
+            return [start]
+        if not costs[target_ix]:
+            return None
 
-        def heuristic(tile):
-            # see here for more on heuristics
-            # http://theory.stanford.edu/~amitp/GameProgramming/index.html
-            x, y = (tile[0] - tx), (tile[1] - ty)
-            heuristic = abs(tx - tile[0]) + abs(ty - tile[1])
-            cross = abs(x*Y - X*y)  # compute the vector cross product
-            return heuristic + (cross * 0.001)
+        straight = self._cheapest
+        diagonal = straight + DIAGONAL_PENALTY
+        extra = diagonal - 2 * straight
+        steps = {(dx, dy): dy * width + dx for dx, dy in OFFSETS}
 
-        open_set = []
-        heapq.heappush(open_set, (0, start))
+        def jump(ix, dx, dy):
+            '''
+            Step from ix in direction (dx, dy) until reaching a jump point
+            and return (its index, number of steps), or None on a dead end.
+            '''
+            step = dy * width + dx
+            count = 0
+            while True:
+                ix += step
+                count += 1
+                if not costs[ix]:
+                    return None
+                if ix == target_ix or special[ix]:
+                    return ix, count
+                if dx and dy:
+                    back_x, back_y = ix - dx, ix - dy * width
+                    if (not costs[back_x] and costs[back_x + dy * width] or
+                            not costs[back_y] and costs[back_y + dx]):
+                        return ix, count
+                    if jump(ix, dx, 0) or jump(ix, 0, dy):
+                        return ix, count
+                else:
+                    side = width if dx else 1
+                    if (not costs[ix + side] and costs[ix + side + step] or
+                            not costs[ix - side] and
+                            costs[ix - side + step]):
+                        return ix, count
 
-        came_from = {start: None}
-        cost_so_far = {start: 0}
+        def directions(ix, dx, dy):
+            '''The natural and forced neighbours after moving by (dx, dy)'''
+            if dx and dy:
+                dirs = [(dx, 0), (0, dy), (dx, dy)]
+                if not costs[ix - dx]:
+                    dirs.append((-dx, dy))
+                if not costs[ix - dy * width]:
+                    dirs.append((dx, -dy))
+            elif dx:
+                dirs = [(dx, 0)]
+                dirs.extend((dx, side) for side in (1, -1)
+                            if not costs[ix + side * width])
+            else:
+                dirs = [(0, dy)]
+                dirs.extend((side, dy) for side in (1, -1)
+                            if not costs[ix + side])
+            return dirs
 
-        while len(open_set) > 0:
-            current = heapq.heappop(open_set)[1]
+        g = {start_ix: 0}
+        parent = {}
+        heading = {start_ix: None}
+        closed = set()
+        open_set = [(0, 0, start_ix)]
+        pop, push = heapq.heappop, heapq.heappush
 
-            if current == target:
+        while open_set:
+            current = pop(open_set)[2]
+            if current in closed:
+                continue
+            if current == target_ix:
                 break
+            closed.add(current)
+            base = g[current]
 
-            x, y = current
-
-            # NOTE: True here is a flag to return the coordinates as well
-            #       as the Tile objects themselves
-            for coords, tile in self.map.neighbouring_tiles(x, y, True):
-                if tile.path_cost is not None:  # None -> can't get through
-                    cost = cost_so_far[current] + tile.path_cost
-                    if (x - coords[0] != 0) and (y - coords[1] != 0):
-                        # Penalise diagonal movement to avoid crazy paths
-                        cost += 1
-
-                    if coords not in cost_so_far or cost < cost_so_far[coords]:
-                        cost_so_far[coords] = cost
-                        visit_cost = cost + heuristic(coords)
-                        heapq.heappush(open_set, (visit_cost, coords))
-                        came_from[coords] = current
-
-        return self.build_path(came_from, start, target)
-
-    def has_los(self, map_id, start, target):
-        '''Check for straight line LOS using Bresenham's algorithm'''
-        dx = target[0] - start[0]
-        dy = target[1] - start[1]
-
-        if dx == 0:
-            # Simple case for vertical lines
-            y1, y2 = min(start[1], target[1]), max(start[1], target[1])
-            for tile in self.map.lmap[y1:y2+1][start[0]]:
-                if tile.block_sight:
-                    return False
-            return True
+            if special[current] or heading[current] is None:
+                # Plain single steps around dear tiles (and from the start)
+                found = [(current + step, dx, dy, 1)
+                         for (dx, dy), step in steps.items()
+                         if costs[current + step]]
+            else:
+                found = []
+                for dx, dy in directions(current, *heading[current]):
+                    point = jump(current, dx, dy)
+                    if point is not None:
+                        found.append((point[0], dx, dy, point[1]))
+
+            for n, dx, dy, count in found:
+                if n in closed:
+                    continue
+                # Every step but the last is onto a cheapest cost tile
+                cost = base + costs[n]
+                if dx and dy:
+                    cost += diagonal * (count - 1) + DIAGONAL_PENALTY
+                else:
+                    cost += straight * (count - 1)
+                if cost < g.get(n, cost + 1):
+                    g[n] = cost
+                    parent[n] = current
+                    heading[n] = (dx, dy)
+                    hx = abs(n % width - 1 - tx)
+                    hy = abs(n // width - 1 - ty)
+                    h = straight * (hx + hy) + extra * (hx if hx < hy else hy)
+                    push(open_set, (cost + h, h, n))
         else:
-            derr = abs(dy/dx)
-            error = derr - 0.5
-            y = start[1]
-            for x in range(start[0], target[0]+1):
-                if tile.block_sight:
-                    return False
+            return None
 
-                error += derr
+        # Fill in the cells between the jump points
+        path = [target]
+        current = target_ix
+        while current != start_ix:
+            x, y = current % width - 1, current // width - 1
+            current = parent[current]
+            px, py = current % width - 1, current // width - 1
+            dx, dy = (px > x) - (px < x), (py > y) - (py < y)
+            while (x, y) != (px, py):
+                x += dx
+                y += dy
+                path.append((x, y))
+        path.reverse()
+        return path
+
+    @staticmethod
+    def line(start, target):
+        '''
+        The cells strictly between start and target on a straight line.
+
+        Works for every octant by stepping along the longer axis and
+        rounding the other (a DDA line: the same cells as Bresenham's
+        algorithm up to how ties are broken). los_mask steps the same way.
+        '''
+        (sx, sy), (tx, ty) = start, target
+        dx, dy = tx - sx, ty - sy
+        steps = max(abs(dx), abs(dy))
+        return [(sx + (2 * dx * k + steps) // (2 * steps),
+                 sy + (2 * dy * k + steps) // (2 * steps))
+                for k in range(1, steps)]
+
+    def has_los(self, start, target, floor=None):
+        '''
+        True if nothing between start and target blocks sight, on floor (a
+        Map) or the floor this pathfinder is working on. Raises ValueError
+        if either point is off the map.
+        '''
+        grid = (self.map if floor is None else floor).lmap
+        for x, y in (start, target):
+            if not (0 <= x < grid.width and 0 <= y < grid.height):
+                raise ValueError('({}, {}) is off the map'.format(x, y))
+        block_sight = grid.block_sight
+        return not any(block_sight[y, x] for x, y in self.line(start, target))
+
+    def los_mask(self, starts, target, floor=None):
+        '''
+        has_los from each of starts (a sequence of (x, y), e.g. every
+        creature on the floor) to the one target, as a boolean array.
+        All of the lines are checked at once against block_sight.
+        '''
+        grid = (self.map if floor is None else floor).lmap
+        block_sight = grid.block_sight
+        starts = np.asarray(starts, dtype=np.int64).reshape(-1, 2)
+        points = np.vstack([starts, [target]])
+        if ((points < 0).any() or (points[:, 0] >= grid.width).any() or
+                (points[:, 1] >= grid.height).any()):
+            # NOTE: negative indices would silently wrap around
+            raise ValueError('line of sight from off the map')
+        dx = target[0] - starts[:, 0]
+        dy = target[1] - starts[:, 1]
+        steps = np.maximum(np.abs(dx), np.abs(dy))
+        if not starts.size or steps.max() < 2:
+            return np.ones(len(starts), dtype=bool)
 
-                if error >= 0.5:
-                    y += 1
-                    error -= 1
-        return True
+        # (creature, k) for k = 1 .. longest line, masked past each end
+        k = np.arange(1, steps.max())[None, :]
+        inside = k < steps[:, None]
+        div = 2 * np.maximum(steps, 1)[:, None]
+        xs = starts[:, :1] + (2 * dx[:, None] * k + steps[:, None]) // div
+        ys = starts[:, 1:] + (2 * dy[:, None] * k + steps[:, None]) // div
+        blocked = np.zeros(inside.shape, dtype=bool)
+        blocked[inside] = block_sight[ys[inside], xs[inside]]
+        return ~blocked.any(axis=1)
 
     def agro_heatmap(self, player, additional_coords=[]):
         '''
@@ -116,30 +490,19 @@ class PathFinder:
         vision distance.
 
         NOTE: It is not always the case that vision_distance > agro_range
-        '''
-        x, y = player.x, player.y
-        open_set = []
-        heapq.heappush(open_set, (0, (x, y)))
-        cost_so_far = {(x, y): 0}
-
-        for point, weight in additional_coords:
-            heapq.heappush(open_set, (weight, point))
-            cost_so_far = {point: weight}
 
-        while len(open_set) > 0:
-            current = heapq.heappop(open_set)[1]
-            x, y = current
-
-            # NOTE: True here is a flag to return the coordinates as well
-            #       as the Tile objects themselves
-            for coords, tile in self.map.neighbouring_tiles(x, y, True):
-                cost = cost_so_far[current] + tile.agro_cost
+        With incremental_agro set the heatmap is only computed out to the
+        largest agro_range on the floor (see agro.AgroField) and is reused
+        until the sources or the layout near them change.
+        '''
+        sources = [((player.x, player.y), 0)] + list(additional_coords)
 
-                if coords not in cost_so_far or cost < cost_so_far[coords]:
-                    cost_so_far[coords] = cost
-                    heapq.heappush(open_set, (cost, coords))
+        if self.incremental_agro:
+            limit = max([e.agro_range for e in self.map.enemies if e.alive],
+                        default=0)
+            self.map.agro_field.update(sources, limit)
+            return
 
-        # Bind the new agro weights to the tiles (creatures check with the map)
-        for coords in cost_so_far:
-            x, y = coords
-            self.map.lmap[y][x].agro_weight = cost_so_far[coords]
+        # Full floor field computed with whole-row numpy sweeps
+        lmap = self.map.lmap
+        lmap.agro_weight[:] = distance_field(lmap.agro_cost, sources)
@@ -0,0 +1,69 @@
+'''
+Placement of non-overlapping rooms on a map.
+'''
+import numpy as np
+
+from ..config import ROOM_PLACEMENT_PATIENCE, ROOM_GRID_MIN_AREA
+
+
+class RoomPlacer:
+    '''
+    Keeps a grid of the cells claimed by the rooms placed so far so that a
+    candidate room can be checked in one lookup over its own area instead
+    of against every room in turn.
+
+    Floors smaller than ROOM_GRID_MIN_AREA only hold a few dozen rooms so
+    there the candidates are checked against each placed room (as
+    Room.overlaps_with does) and there is no patience cut-off.
+
+    NOTE: Room.overlaps_with counts rooms that share an edge as overlapping
+          so each room claims its full (x1, y1) -> (x2, y2) rectangle,
+          inclusive of its walls.
+    '''
+    def __init__(self, width, height, min_room_size,
+                 patience=ROOM_PLACEMENT_PATIENCE):
+        self.claimed = None
+        self.placed = []
+        if width * height >= ROOM_GRID_MIN_AREA:
+            self.claimed = np.zeros((height, width), dtype=np.bool_)
+        else:
+            patience = float('inf')
+        self.free = width * height
+        # The smallest rectangle any room will need
+        self.min_area = (min_room_size + 1) ** 2
+        self.patience = patience
+        self.failures = 0
+        self.attempts = 0
+
+    def fits(self, room):
+        '''Check if a room would overlap with any placed so far'''
+        if self.claimed is None:
+            x1, y1, x2, y2 = room.x1, room.y1, room.x2, room.y2
+            for X1, Y1, X2, Y2 in self.placed:
+                if x1 <= X2 and x2 >= X1 and y1 <= Y2 and y2 >= Y1:
+                    return False
+            return True
+        return not self.claimed[room.y1:room.y2+1, room.x1:room.x2+1].any()
+
+    def place(self, room):
+        '''Claim the cells for a room if it fits, returning True if it did'''
+        self.attempts += 1
+        if not self.fits(room):
+            self.failures += 1
+            return False
+        if self.claimed is None:
+            self.placed.append((room.x1, room.y1, room.x2, room.y2))
+        else:
+            self.claimed[room.y1:room.y2+1, room.x1:room.x2+1] = True
+        self.free -= (room.x2 - room.x1 + 1) * (room.y2 - room.y1 + 1)
+        self.failures = 0
+        return True
+
+    @property
+    def exhausted(self):
+        '''
+        True once further attempts are unlikely to place anything: there
+        isn't enough free space left for the smallest room or the last
+        `patience` attempts in a row have all failed.
+        '''
+        return self.free < self.min_area or self.failures >= self.patience
@@ -0,0 +1,101 @@
+'''
+Generating dungeon floors ahead of time in worker processes.
+'''
+import multiprocessing
+import pickle
+import random
+import sys
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+
+def floor_seed(seed, depth):
+    '''The seed for the floor at a given depth of a dungeon'''
+    return random.Random('{}:{}'.format(seed, depth)).getrandbits(64)
+
+
+def pack_floor(floor):
+    '''Serialise a floor for sending between processes'''
+    return zlib.compress(pickle.dumps(floor, pickle.HIGHEST_PROTOCOL))
+
+
+def unpack_floor(data):
+    '''Inverse of pack_floor'''
+    return pickle.loads(zlib.decompress(data))
+
+
+def _process_pool(workers):
+    '''
+    A process pool whose workers start as fresh interpreters rather than
+    forks of the game process (which holds an SDL window and its threads).
+    '''
+    if sys.version_info < (3, 7):
+        # NOTE: mp_context is new in 3.7: use the platform default
+        return ProcessPoolExecutor(max_workers=workers)
+    return ProcessPoolExecutor(max_workers=workers,
+                               mp_context=multiprocessing.get_context('spawn'))
+
+
+def _build_packed(build, *args):
+    '''Run in the worker: build a floor and pack it up'''
+    return pack_floor(build(*args))
+
+
+class FloorPrefetcher:
+    '''
+    Builds the floors below the current one in a process pool so that they
+    are ready by the time the player takes the stairs.
+
+    build(width, height, depth, seed) must be a module level function
+    (so that it can be sent to the workers) that generates the floor
+    at depth from its seed. Floors are the same whether they were
+    prefetched or built on demand.
+    '''
+    def __init__(self, build, width, height, seed, depth_ahead):
+        self.build = build
+        self.width = width
+        self.height = height
+        self.seed = seed
+        self.depth_ahead = depth_ahead
+        self.pending = {}
+        self.executor = None
+
+    def args(self, depth):
+        return self.width, self.height, depth, floor_seed(self.seed, depth)
+
+    def prefetch(self, depth):
+        '''Start building the floors below depth that aren't under way'''
+        if self.depth_ahead <= 0:
+            return
+        if self.executor is None:
+            self.executor = _process_pool(self.depth_ahead)
+        for below in range(depth + 1, depth + 1 + self.depth_ahead):
+            if below not in self.pending:
+                self.pending[below] = self.executor.submit(
+                    _build_packed, self.build, *self.args(below))
+
+    def get(self, depth):
+        '''
+        Return the floor at depth, waiting for it if it is still being
+        built in the background or building it now if it was never started.
+        '''
+        future = self.pending.pop(depth, None)
+        if future is not None:
+            try:
+                return unpack_floor(future.result())
+            except BrokenProcessPool:
+                # NOTE: a worker died: carry on without prefetching
+                self.close()
+                self.depth_ahead = 0
+        return self.build(*self.args(depth))
+
+    def close(self):
+        '''Stop the workers, dropping anything not collected'''
+        if self.executor is not None:
+            # NOTE: shutdown only gained cancel_futures in 3.9
+            for future in self.pending.values():
+                future.cancel()
+            self.executor.shutdown(wait=False)
+            self.executor = None
+        self.pending = {}
@@ -0,0 +1,121 @@
+'''
+The game without the window: the state of a run and the turn processing.
+
+GameScreen draws an Engine and turns key presses into calls on it. Anything
+else (the headless simulator, benchmarks) can drive one directly.
+'''
+from .dungeon.fov import FieldOfView
+from .dungeon.mapgen import Dungeon
+from .scheduler import TurnScheduler
+from . import savegame
+from .player_character import new_PC
+from .utils import Message
+from .config import LIGHT0
+
+
+class Engine:
+    '''
+    A run in progress: the dungeon, the player on it and what they can see.
+
+    Creatures take their turns against the engine (it is the `screen` that
+    Creature.move_or_melee and TurnScheduler.run are given).
+    '''
+    def __init__(self, width, height, player=None, seed=None, prefetch=0,
+                 dungeon=None):
+        self.player = new_PC('Player', 'Human') if player is None else player
+        if dungeon is None:
+            dungeon = Dungeon(height=height, width=width, player=self.player,
+                              seed=seed, prefetch=prefetch)
+            dungeon.pathfinder.agro_heatmap(self.player)
+            floor = dungeon[0]
+            floor.occupancy.place(self.player, *floor.rooms[0].center)
+        self.dungeon = dungeon
+        self.current_map = dungeon[dungeon.current]
+
+        self.fov = FieldOfView()
+        self.scheduler = TurnScheduler()
+        self.visible_tiles = set()
+        self.visible_tiles2 = set()
+        self.magically_visible = set()
+        self.turns = 0
+
+    @classmethod
+    def load(cls, path, prefetch=0):
+        '''Continue the run saved at path'''
+        dungeon, player = savegame.load(path, prefetch=prefetch)
+        return cls(dungeon.width, dungeon.height, player, dungeon=dungeon)
+
+    def save(self, path):
+        savegame.save(path, self.dungeon, self.player)
+
+    def close(self):
+        self.dungeon.close()
+
+    # Per turn updates
+    def update_agro(self):
+        '''Bring the agro field up to date (cached if nothing changed)'''
+        self.dungeon.pathfinder.agro_heatmap(self.player)
+
+    def update_fov(self):
+        '''Work out what the player can see (cached if nothing changed)'''
+        if self.player.alive:
+            self.visible_tiles, self.visible_tiles2 = self.fov.compute(
+                self.current_map.lmap, self.player.x, self.player.y,
+                self.player.vision)
+        else:
+            self.visible_tiles, self.visible_tiles2 = set(), set()
+
+    def update_view(self):
+        self.update_agro()
+        self.update_fov()
+
+    def shown_objects(self):
+        '''The objects in the cells the player can see, bottom first'''
+        shown = self.visible_tiles | self.magically_visible
+        return self.current_map.occupancy.objects_in(shown)
+
+    def end_turn(self):
+        '''Let everything else on the floor take its turn'''
+        self.turns += 1
+        return self.scheduler.run(self)
+
+    def idle(self):
+        '''
+        Do any work that was put off to keep turns quick: call this while
+        waiting on the player (after a frame has been shown)
+        '''
+        self.dungeon.idle()
+
+    # Player actions: each returns the messages for the player
+    def move(self, dx, dy):
+        return self.player.move_or_melee(dx, dy, self)
+
+    def rest(self):
+        return self.player.rest()
+
+    def search(self):
+        return self.player.search(self.current_map)
+
+    def on_stairs(self):
+        x, y = self.player.x, self.player.y
+        return self.current_map.lmap.tile(x, y).name == 'down'
+
+    def descend(self):
+        '''Take the stairs down if the player is on them'''
+        if not self.on_stairs():
+            return [Message("There are no stairs down here", LIGHT0)]
+        self.current_map = self.dungeon.descend()
+        return [Message('You descend the stairs', LIGHT0)]
+
+    # Called by creatures as they take their turns
+    def send_enemy_to_back(self, obj):
+        '''Cause an object to be rendered first, under everything else'''
+        self.current_map.enemies.remove(obj)
+        self.current_map.enemies.insert(0, obj)
+        self.current_map.occupancy.send_to_back(obj)
+
+    def send_enemy_to_front(self, obj):
+        '''Cause an object to be rendered last, on top of everything else'''
+        self.current_map.enemies.remove(obj)
+        self.current_map.enemies.append(obj)
+        self.current_map.occupancy.send_to_front(obj)
@@ -0,0 +1,175 @@
+'''
+Running the game with no display, to measure how quickly turns go by.
+
+A policy picks the player's action for each turn from the state of the
+Engine. simulate plays one for a number of turns, doing what GameScreen.run
+does each time round its loop and timing each part of it: the agro field,
+FOV, composing the frame into the console arrays, the player's action, the
+enemy turns (AI) and the work left for when the game waits on the player
+(idle: packing away floors that have dropped out of the cache).
+'''
+import time
+import tracemalloc
+
+import numpy as np
+import tcod.console
+
+from .dungeon.grid import DOWN, SECRET_DOOR
+from .render import ArrayRenderer, Camera
+
+try:
+    import resource
+except ImportError:
+    # NOTE: not available on Windows: peak RSS is reported as None
+    resource = None
+
+
+SUBSYSTEMS = ('agro', 'fov', 'render', 'player', 'ai', 'idle')
+
+DIRECTIONS = [(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)
+              if dx or dy]
+
+# Keys for scripted players (the vim bindings) -> action
+SCRIPT_KEYS = {
+    'h': ('move', -1, 0), 'j': ('move', 0, 1),
+    'k': ('move', 0, -1), 'l': ('move', 1, 0),
+    'y': ('move', -1, -1), 'u': ('move', 1, -1),
+    'b': ('move', -1, 1), 'n': ('move', 1, 1),
+    '.': ('wait',), 's': ('search',), 'R': ('rest',), '>': ('descend',),
+}
+
+
+def random_policy(rng):
+    '''Wander about at random, taking any stairs that turn up'''
+    def choose(engine):
+        if engine.on_stairs():
+            return ('descend',)
+        roll = rng.random()
+        if roll < 0.05:
+            return ('search',)
+        elif roll < 0.1:
+            return ('wait',)
+        return ('move',) + rng.choice(DIRECTIONS)
+    return choose
+
+
+def stairs_policy(rng):
+    '''
+    Head for the stairs down on each floor, fighting through anything and
+    searching for any secret door that is in the way
+    '''
+    stairs = {}
+
+    def choose(engine):
+        if engine.on_stairs():
+            return ('descend',)
+        floor = engine.current_map
+        if floor not in stairs:
+            y, x = np.argwhere(floor.lmap.kind == DOWN)[0].tolist()
+            stairs[floor] = (x, y)
+        player = engine.player
+        path = engine.dungeon.pathfinder.a_star((player.x, player.y),
+                                                stairs[floor])
+        if not path or len(path) < 2:
+            return ('move',) + rng.choice(DIRECTIONS)
+        x, y = path[1]
+        # NOTE: secret doors keep the path cost of the floor they were put
+        #       on so routes go through them, but they block the way until
+        #       they are found
+        if floor.lmap.kind[y, x] == SECRET_DOOR:
+            return ('search',)
+        return ('move', x - player.x, y - player.y)
+    return choose
+
+
+def script_policy(keys):
+    '''Press keys (see SCRIPT_KEYS) in order, starting again at the end'''
+    actions = [SCRIPT_KEYS[key] for key in keys]
+    turn = 0
+
+    def choose(engine):
+        nonlocal turn
+        action = actions[turn % len(actions)]
+        turn += 1
+        return action
+    return choose
+
+
+def take_action(engine, action):
+    '''Carry out a policy's action, returning the messages for it'''
+    name, args = action[0], action[1:]
+    if name == 'wait':
+        return []
+    return getattr(engine, name)(*args)
+
+
+def peak_rss():
+    '''Peak resident memory of this process in bytes (None if unknown)'''
+    if resource is None:
+        return None
+    # NOTE: ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def simulate(engine, turns, policy, immortal=False, trace_memory=False):
+    '''
+    Play up to turns turns of policy on engine with the map drawn to an
+    off-screen console. The run stops early if the player dies, unless
+    immortal (which heals them fully after every turn).
+
+    Returns a dict of the turns played, the total seconds, the seconds
+    spent in each of SUBSYSTEMS, the deepest floor reached, whether the
+    player is still alive and the peak memory: RSS and, if trace_memory,
+    the peak traced by tracemalloc (which slows everything down).
+    '''
+    floor = engine.current_map
+    camera = Camera(floor.width, floor.height)
+    renderer = ArrayRenderer(tcod.console.Console(camera.width,
+                                                  camera.height, order='C'))
+    timings = dict.fromkeys(SUBSYSTEMS, 0.0)
+    player = engine.player
+    clock = time.perf_counter
+
+    if trace_memory:
+        tracemalloc.start()
+    played = 0
+    try:
+        while played < turns and player.alive:
+            t0 = clock()
+            engine.update_agro()
+            t1 = clock()
+            engine.update_fov()
+            t2 = clock()
+            lmap = engine.current_map.lmap
+            camera.follow(player.x, player.y, lmap.width, lmap.height)
+            renderer.render(lmap, engine.visible_tiles, engine.visible_tiles2,
+                            engine.magically_visible, engine.shown_objects(),
+                            camera)
+            t3 = clock()
+            take_action(engine, policy(engine))
+            t4 = clock()
+            engine.end_turn()
+            t5 = clock()
+            engine.idle()
+            t6 = clock()
+
+            marks = (t0, t1, t2, t3, t4, t5, t6)
+            for name, start, end in zip(SUBSYSTEMS, marks, marks[1:]):
+                timings[name] += end - start
+            played += 1
+            if immortal:
+                player.HP = player.MAX_HP
+        traced = tracemalloc.get_traced_memory()[1] if trace_memory else None
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+
+    return {
+        'turns': played,
+        'seconds': sum(timings.values()),
+        'timings': timings,
+        'depth': engine.current_map.depth,
+        'alive': player.alive,
+        'peak_rss': peak_rss(),
+        'peak_traced': traced,
+    }
@@ -0,0 +1,286 @@
+'''
+Rendering of the map console.
+
+MapRenderer is retained mode: the map console keeps whatever was last drawn
+to it so it only redraws (cell by cell) the cells whose appearance can have
+changed since the last frame.
+
+ArrayRenderer composes the whole map layer as numpy glyph / colour arrays
+from the tile grid and the visibility masks and writes them to the console
+buffers in one go.
+
+Both draw the part of the map under a Camera if they are given one, so
+maps can be bigger than the console. The visibility sets and objects are
+always in map coordinates.
+'''
+import numpy as np
+import tcod.console
+
+from .dungeon.grid import KINDS
+from .config import BLACK, DIM_FG1, DIM_FG2
+
+
+# Per tile kind glyphs and colours for composing whole arrays at once
+KIND_CHAR = np.array([ord(k.char) for k in KINDS], dtype=np.intc)
+KIND_FG = np.array([k.fg for k in KINDS], dtype=np.uint8)
+KIND_BG = np.array([k.bg for k in KINDS], dtype=np.uint8)
+
+
+def console_arrays(con):
+    '''
+    Return (ch, fg, bg) numpy views of a console's buffers. tcod consoles
+    expose these directly, tdl consoles need wrapping first.
+    '''
+    if not hasattr(con, 'ch'):
+        con = tcod.console.Console._from_cdata(con.console_c)
+    return con.ch, con.fg, con.bg
+
+
+def as_mask(cells, shape, x=0, y=0):
+    '''
+    Convert a set of (x, y) into a boolean mask of the given shape with its
+    top left at (x, y). Arrays are sliced down to the same window.
+    '''
+    height, width = shape
+    if isinstance(cells, np.ndarray):
+        return cells[y:y+height, x:x+width]
+    mask = np.zeros(shape, dtype=np.bool_)
+    if cells:
+        xs, ys = (np.array(c) for c in zip(*cells))
+        xs, ys = xs - x, ys - y
+        inside = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+        mask[ys[inside], xs[inside]] = True
+    return mask
+
+
+class Camera:
+    '''
+    The width x height part of a map that is shown on the console: its top
+    left is at (x, y). follow keeps it centred on a point without going
+    past the edges of the map.
+    '''
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.x = 0
+        self.y = 0
+
+    def follow(self, x, y, map_width, map_height):
+        '''Centre the view on (x, y)'''
+        self.x = max(min(x - self.width // 2, map_width - self.width), 0)
+        self.y = max(min(y - self.height // 2, map_height - self.height), 0)
+
+    def view(self, grid, origin=(0, 0)):
+        '''
+        (x, y, width, height) of the part of grid in view, in the grid's
+        coordinates. origin is where grid's top left is on the map.
+        '''
+        x, y = self.x - origin[0], self.y - origin[1]
+        x1, y1 = max(x, 0), max(y, 0)
+        x2 = min(x + self.width, grid.width)
+        y2 = min(y + self.height, grid.height)
+        return x1, y1, max(x2 - x1, 0), max(y2 - y1, 0)
+
+
+def full_view(grid, camera=None, origin=(0, 0)):
+    '''camera.view, or the whole grid if there is no camera'''
+    if camera is None:
+        return 0, 0, grid.width, grid.height
+    return camera.view(grid, origin)
+
+
+class MapRenderer:
+    '''
+    Draws a TileGrid and the objects on it to a console, tracking which
+    cells are dirty between frames:
+      - cells entering or leaving any of the visibility sets
+      - tiles that have changed kind (doors opening / closing...)
+      - cells that an object has moved into / out of or where an object
+        has changed appearance (death, health colour...)
+    Anything else (a new map, resizing, menus drawn over the console) calls
+    invalidate() to force a full redraw on the next frame.
+    '''
+    def __init__(self, con):
+        self.con = con
+        self.grid = None
+        self.version = None
+        self.visible = frozenset()
+        self.visible2 = frozenset()
+        self.magic = frozenset()
+        self.drawn_objects = {}
+        self.view = None
+        self.full_redraw = True
+        self.cells_drawn = 0
+
+    def invalidate(self):
+        '''Redraw everything on the next frame'''
+        self.full_redraw = True
+
+    def render(self, grid, visible, visible2, magic, objects, camera=None):
+        '''
+        Bring the console up to date. visible, visible2 and magic are sets
+        of (x, y) and objects is drawn in order (later on top).
+        '''
+        objects = [o for o in objects if o is not None]
+        drawn_objects = {id(o): (o.x, o.y, o.char, o.colour, o.visible)
+                         for o in objects}
+
+        view = full_view(grid, camera)
+        vx, vy, width, height = view
+        if view != self.view:
+            # Everything on the console has moved
+            self.full_redraw = True
+        dirty = self._dirty_cells(grid, visible, visible2, magic,
+                                  drawn_objects)
+        if dirty is None:
+            dirty = [(x, y) for y in range(vy, vy + height)
+                     for x in range(vx, vx + width)]
+        else:
+            dirty = [(x, y) for x, y in dirty
+                     if vx <= x < vx + width and vy <= y < vy + height]
+
+        for x, y in dirty:
+            self._draw_tile(grid, x, y, visible, visible2, magic, vx, vy)
+
+        # Objects are only shown in the sets the player can see into
+        shown = visible | magic
+        dirty = set(dirty)
+        for obj in objects:
+            position = (obj.x, obj.y)
+            if obj.visible and position in dirty and position in shown:
+                self.con.draw_char(obj.x - vx, obj.y - vy, obj.char,
+                                   obj.colour, bg=None)
+
+        self.view = view
+        self.grid = grid
+        self.version = grid.version
+        self.visible = frozenset(visible)
+        self.visible2 = frozenset(visible2)
+        self.magic = frozenset(magic)
+        self.drawn_objects = drawn_objects
+        self.full_redraw = False
+        self.cells_drawn = len(dirty)
+
+    def _dirty_cells(self, grid, visible, visible2, magic, drawn_objects):
+        '''The cells to redraw this frame, None meaning all of them'''
+        if self.full_redraw or grid is not self.grid:
+            return None
+
+        changes = grid.changes_since(self.version)
+        if changes is None:
+            return None
+
+        dirty = set(changes)
+        dirty |= self.visible.symmetric_difference(visible)
+        dirty |= self.visible2.symmetric_difference(visible2)
+        dirty |= self.magic.symmetric_difference(magic)
+
+        previous = self.drawn_objects
+        for key, state in drawn_objects.items():
+            old = previous.get(key)
+            if old != state:
+                dirty.add(state[:2])
+                if old is not None:
+                    dirty.add(old[:2])
+        for key in previous.keys() - drawn_objects.keys():
+            dirty.add(previous[key][:2])
+
+        return dirty
+
+    def _draw_tile(self, grid, x, y, visible, visible2, magic, vx=0, vy=0):
+        '''
+        Draw a single map cell based on what the player can see, with the
+        top left of the console at (vx, vy) on the map
+        '''
+        kind = KINDS[grid.kind[y, x]]
+        position = (x, y)
+        draw = self.con.draw_char
+        if position in visible:
+            grid.explored[y, x] = True
+            draw(x - vx, y - vy, kind.char, fg=kind.fg, bg=kind.bg)
+        elif position in visible2:
+            draw(x - vx, y - vy, kind.char, fg=DIM_FG2, bg=BLACK)
+        elif position in magic:
+            draw(x - vx, y - vy, kind.char, fg=kind.fg, bg=BLACK)
+        elif grid.explored[y, x]:
+            draw(x - vx, y - vy, kind.char, fg=DIM_FG1, bg=BLACK)
+        else:
+            draw(x - vx, y - vy, ' ', fg=None, bg=BLACK)
+
+
+class ArrayRenderer:
+    '''
+    Draws a TileGrid and the objects on it by building the glyph and
+    colour arrays for the whole map and writing them to the console
+    buffers in a single bulk assignment per frame.
+    '''
+    def __init__(self, con):
+        self.con = con
+        self.ch, self.fg, self.bg = console_arrays(con)
+
+    def invalidate(self):
+        '''Every frame is a full redraw so there is nothing to do'''
+
+    def compose(self, grid, visible, visible2, magic, objects, camera=None,
+                origin=(0, 0)):
+        '''
+        Return (ch, fg, bg) arrays for the map and visible objects (under
+        the camera if given). origin is where the top left of grid is on
+        the map, for grids that only hold part of it (chunks.Area).
+        Visibility masks given as arrays are the shape of grid.
+        '''
+        x, y, width, height = full_view(grid, camera, origin)
+        shape = (height, width)
+        region = (slice(y, y + height), slice(x, x + width))
+        # Position of the region on the map
+        mx, my = x + origin[0], y + origin[1]
+
+        def mask(cells):
+            if isinstance(cells, np.ndarray):
+                return as_mask(cells, shape, x, y)
+            return as_mask(cells, shape, mx, my)
+
+        visible = mask(visible)
+        visible2 = mask(visible2) & ~visible
+        magic = mask(magic) & ~visible & ~visible2
+        explored = grid.explored[region]
+        explored |= visible
+        remembered = explored & ~(visible | visible2 | magic)
+
+        kind = grid.kind[region]
+        ch = KIND_CHAR[kind]
+        fg = KIND_FG[kind]
+        bg = KIND_BG[kind]
+
+        # Everything we aren't looking at directly is drawn on black
+        bg[~visible] = BLACK
+        fg[visible2] = DIM_FG2
+        fg[remembered] = DIM_FG1
+        unseen = ~(visible | visible2 | magic | remembered)
+        ch[unseen] = ord(' ')
+
+        # Last object in a cell is on top: resolve that before writing
+        shown = visible | magic
+        on_top = {}
+        for obj in objects:
+            if obj is None or not obj.visible:
+                continue
+            ox, oy = obj.x - mx, obj.y - my
+            if 0 <= ox < width and 0 <= oy < height and shown[oy, ox]:
+                on_top[(ox, oy)] = obj
+        if on_top:
+            xs, ys = (np.array(c) for c in zip(*on_top))
+            ch[ys, xs] = [ord(o.char) for o in on_top.values()]
+            fg[ys, xs] = [o.colour for o in on_top.values()]
+
+        return ch, fg, bg
+
+    def render(self, grid, visible, visible2, magic, objects, camera=None,
+               origin=(0, 0)):
+        '''Compose the frame and write it to the console'''
+        ch, fg, bg = self.compose(grid, visible, visible2, magic, objects,
+                                  camera, origin)
+        height, width = ch.shape
+        self.ch[:height, :width] = ch
+        self.fg[:height, :width] = fg
+        self.bg[:height, :width] = bg
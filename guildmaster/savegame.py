@@ -0,0 +1,275 @@
+'''
+Saving and loading runs.
+
+A save file is laid out as:
+
+    HEADER
+    INDEX_ENTRY for each floor: where its block is in the file
+    the player (pickled)
+    one block per floor
+
+Everything after the index is compressed with the codec named in the
+header. A floor block is a FLOOR record followed by the tile arrays as raw
+bytes (explored packed to bits), then ROOM, EDGE and CREATURE records,
+an EQUIPMENT record for each slot of each creature and the table of
+strings that the creature records refer to. Items have no fixed layout
+yet so any on the floor are pickled onto the end.
+
+Files are memory mapped on load and floors are only decoded the first time
+that they are used (through the Dungeon's FloorCache), so continuing a deep
+run only pays for the floor that the player is on.
+'''
+import lzma
+import mmap
+import os
+import pickle
+import random
+import struct
+import zlib
+
+import numpy as np
+
+from .creatures import enemy
+from .dungeon.floorcache import FloorCache
+from .dungeon.mapgen import Dungeon, Map, Room
+from .dungeon.prefetch import pack_floor, unpack_floor
+from .config import SAVE_COMPRESSION
+
+
+MAGIC = b'GMSV'
+VERSION = 2
+
+# magic, version, compression, flags, width, height, floor count,
+# current floor, seed, player offset, player length
+HEADER = struct.Struct('<4sHBBHHHHQQQ')
+# offset, length
+INDEX_ENTRY = struct.Struct('<QQ')
+# width, height, depth, starting x, starting y, rooms, edges, creatures
+FLOOR = struct.Struct('<HHHhhIII')
+# x1, y1, x2, y2, id
+ROOM = struct.Struct('<hhhhh')
+# room ids
+EDGE = struct.Struct('<HH')
+# race, name (string table indices), x, y, HP, MAX_HP, FOCUS, MAX_FOCUS,
+# STR, DEX, INT, VIT, alive, block_move, char, colour, equipment slots
+CREATURE = struct.Struct('<HHhh8iBBI3BH')
+# slot, item (string table indices, NO_STRING for an empty slot)
+EQUIPMENT = struct.Struct('<HH')
+NO_STRING = 0xffff
+COUNT = struct.Struct('<I')
+LENGTH = struct.Struct('<H')
+
+# Header flags: the low two bits are the floor algorithm's index here
+# NOTE: 'bsp' is 1 so saves from when the only flag was new_alg still load
+ALGORITHMS = ('rooms', 'bsp', 'maze')
+ALGORITHM_MASK = 0b11
+
+# name -> (header code, compress, decompress)
+CODECS = {
+    'none': (0, bytes, bytes),
+    'zlib': (1, zlib.compress, zlib.decompress),
+    'lzma': (2, lzma.compress, lzma.decompress),
+}
+DECOMPRESS = {code: decompress for code, _, decompress in CODECS.values()}
+
+
+def encode_floor(floor):
+    '''Serialise a Map to bytes (uncompressed)'''
+    grid = floor.lmap
+    strings = []
+    lookup = {}
+
+    def string(text):
+        if text not in lookup:
+            lookup[text] = len(strings)
+            strings.append(text)
+        return lookup[text]
+
+    edges = [(a.id, b.id) for a, b in floor.graph_edges]
+    parts = [
+        FLOOR.pack(floor.width, floor.height, floor.depth, floor.starting_x,
+                   floor.starting_y, len(floor.rooms), len(edges),
+                   len(floor.enemies)),
+        grid.kind.tobytes(),
+        grid.path_cost.tobytes(),
+        np.packbits(grid.explored).tobytes(),
+        grid.room_id.astype('<i2').tobytes(),
+    ]
+    parts.extend(ROOM.pack(r.x1, r.y1, r.x2, r.y2, r.id)
+                 for r in floor.rooms)
+    parts.extend(EDGE.pack(a, b) for a, b in edges)
+    parts.extend(
+        CREATURE.pack(string(e.race), string(e.name), e.x, e.y, e.HP,
+                      e.MAX_HP, e.FOCUS, e.MAX_FOCUS, e.STR, e.DEX, e.INT,
+                      e.VIT, e.alive, e.block_move, ord(e.char), *e.colour,
+                      len(e.equipment))
+        for e in floor.enemies)
+    # NOTE: enemy kit is still the names from enemies.yaml
+    parts.extend(
+        EQUIPMENT.pack(string(slot),
+                       NO_STRING if item is None else string(item))
+        for e in floor.enemies for slot, item in e.equipment.items())
+
+    parts.append(COUNT.pack(len(strings)))
+    for text in strings:
+        data = text.encode('utf-8')
+        parts.append(LENGTH.pack(len(data)) + data)
+
+    items = pickle.dumps(floor.items) if floor.items else b''
+    parts.append(COUNT.pack(len(items)) + items)
+    return b''.join(parts)
+
+
+def decode_floor(data):
+    '''Rebuild a Map from the output of encode_floor'''
+    offset = 0
+
+    def take(size):
+        nonlocal offset
+        chunk = data[offset:offset+size]
+        offset += size
+        return chunk
+
+    def records(record, count):
+        return list(record.iter_unpack(take(record.size * count)))
+
+    (width, height, depth, starting_x, starting_y, n_rooms, n_edges,
+     n_creatures) = FLOOR.unpack(take(FLOOR.size))
+    cells = width * height
+    shape = (height, width)
+    kind = np.frombuffer(take(cells), np.uint8).reshape(shape)
+    path_cost = np.frombuffer(take(cells), np.uint8).reshape(shape)
+    explored = np.unpackbits(np.frombuffer(take((cells + 7) // 8), np.uint8),
+                             count=cells).reshape(shape)
+    room_id = np.frombuffer(take(cells * 2), '<i2').reshape(shape)
+
+    # NOTE: nothing on a loaded floor is rolled again (the enemy kit that
+    #       enemy picks is replaced by the saved one) but a seeded rng keeps
+    #       loading from drawing on the random module
+    rng = random.Random(depth)
+    # NOTE: depth is stored as Map.depth which counts this floor
+    floor = Map(width, height, depth - 1, rng=rng, generate=False)
+    floor.lmap.restore(kind, path_cost, explored, room_id)
+    floor.starting_x, floor.starting_y = starting_x, starting_y
+
+    for x1, y1, x2, y2, ID in records(ROOM, n_rooms):
+        floor.rooms.append(Room(x1, y1, x2 - x1, y2 - y1, ID))
+    floor.graph = {r: set() for r in floor.rooms}
+    for a, b in records(EDGE, n_edges):
+        room_a, room_b = floor.rooms[a], floor.rooms[b]
+        floor.graph[room_a].add(room_b)
+        floor.graph[room_b].add(room_a)
+
+    creatures = records(CREATURE, n_creatures)
+    equipment = records(EQUIPMENT, sum(record[-1] for record in creatures))
+    strings = []
+    for _ in range(COUNT.unpack(take(COUNT.size))[0]):
+        size = LENGTH.unpack(take(LENGTH.size))[0]
+        strings.append(bytes(take(size)).decode('utf-8'))
+
+    slots = iter(equipment)
+    for record in creatures:
+        (race, name, x, y, HP, MAX_HP, FOCUS, MAX_FOCUS, STR, DEX, INT, VIT,
+         alive, block_move, char) = record[:15]
+        # NOTE: the fixed stats come from the enemy definition
+        creature = enemy(strings[race], x, y, rng)
+        creature.equipment = {
+            strings[slot]: None if item == NO_STRING else strings[item]
+            for slot, item in (next(slots) for _ in range(record[-1]))}
+        creature.name = strings[name]
+        creature.HP, creature.MAX_HP = HP, MAX_HP
+        creature.FOCUS, creature.MAX_FOCUS = FOCUS, MAX_FOCUS
+        creature.STR, creature.DEX = STR, DEX
+        creature.INT, creature.VIT = INT, VIT
+        creature.alive = bool(alive)
+        creature.block_move = bool(block_move)
+        creature.char = chr(char)
+        creature.colour = tuple(record[15:18])
+        floor.spawn(creature)
+
+    size = COUNT.unpack(take(COUNT.size))[0]
+    for item in pickle.loads(take(size)) if size else []:
+        floor.spawn(item, item=True)
+
+    return floor
+
+
+def _decoder(decompress):
+    def decode(data):
+        return decode_floor(decompress(data))
+    return decode
+
+
+# header code -> decode a stored floor block
+DECODE = {code: _decoder(decompress)
+          for code, _, decompress in CODECS.values()}
+
+
+def save(path, dungeon, player, compression=SAVE_COMPRESSION):
+    '''
+    Write a dungeon and the player to path. The file is written alongside
+    and then moved into place so a failed save never loses the old one.
+    '''
+    code, compress, _ = CODECS[compression]
+    floors = dungeon.maps
+    blocks = []
+    for ix in range(len(floors)):
+        # Floors that were never loaded can be copied over as they are
+        unpack, data = floors.packed.get(ix, (None, None))
+        if unpack is DECODE[code]:
+            blocks.append(data)
+        else:
+            blocks.append(compress(encode_floor(floors.peek(ix))))
+
+    player_block = compress(pickle.dumps(player, pickle.HIGHEST_PROTOCOL))
+    offset = HEADER.size + INDEX_ENTRY.size * len(blocks)
+    player_offset = offset
+    offset += len(player_block)
+    index = []
+    for block in blocks:
+        index.append(INDEX_ENTRY.pack(offset, len(block)))
+        offset += len(block)
+
+    flags = ALGORITHMS.index(dungeon.algorithm)
+    header = HEADER.pack(MAGIC, VERSION, code, flags, dungeon.width,
+                         dungeon.height, len(blocks), dungeon.current,
+                         dungeon.seed, player_offset, len(player_block))
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(header)
+        f.writelines(index)
+        f.write(player_block)
+        f.writelines(blocks)
+    os.replace(tmp_path, path)
+
+
+def load(path, prefetch=0):
+    '''
+    Load the dungeon and player saved at path. Only the floor the player
+    is on is decoded up front.
+    '''
+    with open(path, 'rb') as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    (magic, version, code, flags, width, height, count, current, seed,
+     player_offset, player_length) = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError('{} is not a save file'.format(path))
+    if version != VERSION:
+        raise ValueError('unsupported save version {}'.format(version))
+
+    floors = FloorCache(pack_floor, unpack_floor)
+    view = memoryview(data)
+    for ix in range(count):
+        offset, length = INDEX_ENTRY.unpack_from(
+            data, HEADER.size + INDEX_ENTRY.size * ix)
+        floors.add_packed(DECODE[code], view[offset:offset+length])
+    player = pickle.loads(DECOMPRESS[code](
+        data[player_offset:player_offset+player_length]))
+
+    dungeon = Dungeon(height, width, player,
+                      algorithm=ALGORITHMS[flags & ALGORITHM_MASK],
+                      seed=seed, prefetch=prefetch, floors=floors,
+                      current=current)
+    return dungeon, player
@@ -0,0 +1,94 @@
+'''
+Running the enemy turns for a floor.
+'''
+import numpy as np
+
+from .dungeon.distance import downhill_steps
+from .config import DORMANT_INTERVAL
+
+
+class TurnScheduler:
+    '''
+    Runs a tick for every enemy on the current floor.
+
+    Living enemies are split into two buckets using the agro field:
+      - awake enemies are within their agro range of the player and act
+        every tick. Their chase steps are all found in one go from the
+        agro field.
+      - dormant enemies are out of range and just wander about. Nothing
+        nearby can see them so they only get a turn every
+        DORMANT_INTERVAL ticks (staggered so they don't all move at once).
+    With a bounded agro field only the enemies standing inside it can be
+    awake so the rest of the floor is never looked at outside of those
+    dormant turns.
+
+    Steps are carried out in a single pass: awake enemies closest to the
+    player go first so that the ones behind them can follow into the cells
+    they leave rather than being blocked, then the dormant ones.
+    '''
+    def __init__(self, dormant_interval=DORMANT_INTERVAL):
+        self.dormant_interval = max(dormant_interval, 1)
+        self.ticks = 0
+        self.awake = 0
+        self.acted = 0
+
+    def run(self, screen):
+        '''Run one tick for the enemies on screen.current_map'''
+        self.ticks += 1
+        floor = screen.current_map
+        acting, steps = self._awake_steps(floor)
+        awake = set(acting)
+
+        # Staggered so that each enemy gets every interval'th tick
+        interval = self.dormant_interval
+        first = -self.ticks % interval
+        for enemy in floor.enemies[first::interval]:
+            if enemy.alive and enemy not in awake:
+                acting.append(enemy)
+                steps.append(enemy.wander_step())
+
+        messages = []
+        acted = 0
+        for enemy, (dx, dy) in zip(acting, steps):
+            # NOTE: standing still is always a no-op
+            if dx or dy:
+                messages.extend(enemy.move_or_melee(dx, dy, screen))
+                acted += 1
+
+        self.awake = len(awake)
+        self.acted = acted
+        return messages
+
+    def _awake_steps(self, floor):
+        '''The awake enemies, closest first, and the steps they take'''
+        lmap = floor.lmap
+        field = floor.agro_field
+        if field.sources is not None:
+            candidates = floor.occupancy.objects_in(set(field.touched))
+        else:
+            # NOTE: the agro field covers the whole map
+            candidates = floor.enemies
+        candidates = [o for o in candidates if getattr(o, 'alive', False)
+                      and not o.player_character]
+        if not candidates:
+            return [], []
+
+        count = len(candidates)
+        xs = np.fromiter((e.x for e in candidates), np.intp, count)
+        ys = np.fromiter((e.y for e in candidates), np.intp, count)
+        ranges = np.fromiter((e.agro_range for e in candidates),
+                             np.int64, count)
+        weights = lmap.agro_weight[ys, xs]
+        order = np.argsort(weights, kind='stable')
+        order = order[weights[order] <= ranges[order]]
+        awake = [candidates[ix] for ix in order.tolist()]
+        xs, ys = xs[order], ys[order]
+
+        # Only the awake enemies that pass their chase roll use the field
+        chasing = np.array([e.chase_roll() for e in awake], dtype=np.bool_)
+        dxs = np.zeros(len(awake), dtype=np.intp)
+        dys = np.zeros(len(awake), dtype=np.intp)
+        if chasing.any():
+            dxs[chasing], dys[chasing] = downhill_steps(
+                lmap.agro_weight, lmap.block_move, xs[chasing], ys[chasing])
+        return awake, list(zip(dxs.tolist(), dys.tolist()))
@@ -3,12 +3,13 @@ Main ui classes and interfaces
 '''
 import tdl
 import textwrap
-from .utils import Message
-from .dungeon.mapgen import Dungeon
+from .utils import Message, key_to_coords
+from .render import ArrayRenderer, Camera, MapRenderer
+from .engine import Engine
 from .player_character import new_PC
-from .config import FOV_ALG, LIGHT_WALLS
-from .config import BAR_WIDTH, PANEL_HEIGHT, VIM_BINDINGS
-from .config import BLACK, DIM_FG1, DIM_FG2, LIGHT0, LIGHT4, DARK0
+from .config import BAR_WIDTH, PANEL_HEIGHT, VIM_BINDINGS, BULK_RENDER
+from .config import PREFETCH_DEPTH, SAVE_FILE
+from .config import DIM_FG1, DIM_FG2, LIGHT0, LIGHT1, LIGHT4, DARK0
 from .config import BRIGHT_RED, FADED_RED, BRIGHT_AQUA, FADED_AQUA
 
 
@@ -42,10 +43,8 @@ class GameScreen:
         # Initialise the player
         # TODO : character creation screen
         self.player = new_PC('Player', 'Human')
-
-        self.visible_tiles = set()
-        self.visible_tiles2 = set()
-        self.magically_visible = set()
+        # The game itself: set up by run (or load_game)
+        self.engine = None
 
         # initialise message queue
         self.messages = []
@@ -56,6 +55,12 @@ class GameScreen:
         self.root = tdl.init(self.width, self.height,
                              title="Guild Master", fullscreen=False)
         self.con = tdl.Console(self.width, self.map_height)
+        if BULK_RENDER:
+            self.renderer = ArrayRenderer(self.con)
+        else:
+            self.renderer = MapRenderer(self.con)
+        # NOTE: maps bigger than the console scroll to follow the player
+        self.camera = Camera(self.width, self.map_height)
         self.panel = Panel(self.width, self.panel_height, self.hp_bar_width)
         tdl.set_fps(self.fps)
 
@@ -99,95 +104,63 @@ class GameScreen:
                 except:
                     self.msgbox('\n No saved game to load.\n', 24)
                     continue
-                self.run()
+                self.run(new_game=False)
             elif choice == 2:
                 break
 
+    @property
+    def dungeon(self):
+        return self.engine.dungeon
+
+    @property
+    def current_map(self):
+        return self.engine.current_map
+
+    def save_game(self):
+        '''Save the current run to SAVE_FILE'''
+        self.engine.save(SAVE_FILE)
+
+    def load_game(self):
+        '''Load the run saved in SAVE_FILE'''
+        self.engine = Engine.load(SAVE_FILE, prefetch=PREFETCH_DEPTH)
+        self.player = self.engine.player
+
     def render_object(self, obj):
         '''Render an object to the console'''
         if obj.visible:
-            self.con.draw_char(obj.x, obj.y, obj.char, obj.colour, bg=None)
-
-    def send_enemy_to_back(self, obj):
-        '''Cause an object to be rendered first, under everything else'''
-        self.current_map.enemies.remove(obj)
-        self.current_map.enemies.insert(0, obj)
-
-    def send_enemy_to_front(self, obj):
-        '''Cause an object to be rendered last, on top of everything else'''
-        self.current_map.enemies.remove(obj)
-        self.current_map.enemies.append(obj)
+            self.con.draw_char(obj.x - self.camera.x, obj.y - self.camera.y,
+                               obj.char, obj.colour, bg=None)
 
     def clear_object(self, obj):
         '''Remove an object from the console'''
-        self.con.draw_char(obj.x, obj.y, ' ', obj.colour, bg=None)
+        self.con.draw_char(obj.x - self.camera.x, obj.y - self.camera.y, ' ',
+                           obj.colour, bg=None)
 
     def render_map(self, lmap, compute_fov_agro):
-        '''Rended the nested list structure as the map'''
-        def visible_tile(x, y):
-            if x >= len(lmap[0]) or x < 0:
-                return False
-            elif y >= len(lmap) or y < 0:
-                return False
-            else:
-                return not lmap[y][x].block_sight
-
+        '''Render the tile grid as the map'''
+        engine = self.engine
         if compute_fov_agro:
-            self.dungeon.pathfinder.agro_heatmap(self.player)
-            visible_tiles = set()
-            visible_tiles2 = set()
-            if self.player.alive:
-                visible_tiles.update(tdl.map.quickFOV(
-                    self.player.x, self.player.y, visible_tile, fov=FOV_ALG,
-                    radius=self.player.vision[0], lightWalls=LIGHT_WALLS,
-                    sphere=True))
-                visible_tiles2.update(tdl.map.quickFOV(
-                    self.player.x, self.player.y, visible_tile, fov=FOV_ALG,
-                    radius=self.player.vision[1], lightWalls=LIGHT_WALLS,
-                    sphere=True))
-
-            self.visible_tiles = visible_tiles
-            self.visible_tiles2 = visible_tiles2 - visible_tiles
-
-        for y, row in enumerate(lmap):
-            for x, tile in enumerate(row):
-                # XXX: Uncomment to view the agro heatmap on floor tiles
-                # tile.explored = True
-                # if tile.name == 'floor':
-                #     tile.char = chr(96 + tile.agro_weight)
-
-                if (x, y) in self.visible_tiles:
-                    tile.explored = True
-                    self.con.draw_char(x, y, tile.char, fg=tile.fg, bg=tile.bg)
-                elif (x, y) in self.visible_tiles2:
-                    self.con.draw_char(x, y, tile.char, fg=DIM_FG2, bg=BLACK)
-                elif (x, y) in self.magically_visible:
-                    self.con.draw_char(x, y, tile.char, fg=tile.fg, bg=BLACK)
-                else:
-                    if tile.explored:
-                        self.con.draw_char(x, y, tile.char,
-                                           fg=DIM_FG1, bg=BLACK)
-                    else:
-                        self.con.draw_char(x, y, ' ', fg=None, bg=BLACK)
-
-            for obj in self.current_map.objects:
-                if ((obj.x, obj.y) in self.visible_tiles) or \
-                        ((obj.x, obj.y) in self.magically_visible):
-                    self.render_object(obj)
-
-    def run(self):
+            # NOTE: both of these are cached so are close to free when
+            #       neither the player nor the map has changed
+            engine.update_view()
+
+        self.camera.follow(self.player.x, self.player.y, lmap.width,
+                           lmap.height)
+        self.renderer.render(lmap, engine.visible_tiles,
+                             engine.visible_tiles2, engine.magically_visible,
+                             engine.shown_objects(), camera=self.camera)
+
+    def run(self, new_game=True):
         '''
         Main rendering loop: calls handle_keys
         '''
         # initialise message queue
         self.messages = []
 
-        self.dungeon = Dungeon(height=self.map_height, width=self.width,
-                               player=self.player)
-        self.dungeon.pathfinder.agro_heatmap(self.player)
-        self.current_map = self.dungeon[0]
-        x, y = self.current_map.rooms[0].center
-        self.player.x, self.player.y = x, y
+        if new_game:
+            self.engine = Engine(self.width, self.map_height, self.player,
+                                 prefetch=PREFETCH_DEPTH)
+        self.renderer.invalidate()
 
         compute_fov_agro = True
 
@@ -198,20 +171,18 @@ class GameScreen:
 
             # Display the main UI
             self.blit_ui()
-
-            # Clear the screen
-            for obj in self.current_map.objects:
-                self.clear_object(obj)
+            self.engine.idle()
 
             compute_fov_agro, should_exit, tick = self.handle_keys(self)
 
             if tick:
-                for enemy in self.current_map.enemies:
-                    enemy.act(self)
+                self.engine.end_turn()
 
             if should_exit:
                 break
 
+        self.engine.close()
+
     def blit_ui(self):
         '''Blit the main ui to the root console'''
         # Blit the hidden console to the screen
@@ -254,7 +225,7 @@ class GameScreen:
         if key in directions:
             compute_fov_agro = True
             x, y = directions[key]
-            messages = self.player.move_or_melee(x, y, lmap)
+            messages = self.engine.move(x, y)
 
         # Menus
         elif keypress.keychar == 'i':
@@ -268,8 +239,11 @@ class GameScreen:
             pass
         elif keypress.keychar == 'c':
             # c : close a door
-            choice = self.current_map.close_door(
-                self, self.player.x, self.player.y)
+            x, y = self.player.x, self.player.y
+            direction = None
+            if len(self.current_map.open_doors(x, y)) > 1:
+                direction = self.select_direction('Select a door...')
+            choice = self.current_map.close_door(x, y, direction)
             if choice is not None:
                 choice.closed_door()
                 self.render_map(self.current_map.lmap, compute_fov_agro=True)
@@ -279,21 +253,29 @@ class GameScreen:
                 messages = [Message("You don't see anything to close", LIGHT0)]
         elif keypress.keychar == 'r' and keypress.shift:
             # R : rest
-            messages = self.player.rest()
+            messages = self.engine.rest()
         elif keypress.keychar == 's':
             # s : search adjacent squares
-            messages = self.player.search(self.current_map)
+            messages = self.engine.search()
+        elif keypress.keychar == '>':
+            # > : take the stairs down
+            if self.engine.on_stairs():
+                self.renderer.invalidate()
+            else:
+                tick = False
+            messages = self.engine.descend()
 
         # Game control
         elif keypress.key == 'ENTER' and keypress.alt:
             tick = False
             tdl.set_fullscreen(True)
+            self.renderer.invalidate()
         elif keypress.keychar == 'q' and keypress.shift:
             tick = False
             should_exit = self.menu_selection(
                 'Really quit?', 20, 10, ['yes', 'no'], ['y', 'n'])
             if should_exit == 0:
-                # TODO: implement run saving
+                self.save_game()
                 self.root.clear()
                 tdl.flush()
                 return compute_fov_agro, True, tick
@@ -304,7 +286,10 @@ class GameScreen:
         for message in messages:
             self.add_message(message)
 
-        return compute_fov_agro, False, tick
+        # Anything that takes a turn can change what the player sees (a
+        # search finding a door...). Both FOV and agro are cached so this
+        # costs next to nothing if nothing has changed.
+        return compute_fov_agro or tick, False, tick
 
     def add_message(self, message):
         '''Add a new message to the message buffer'''
@@ -316,6 +301,24 @@ class GameScreen:
                 self.messages.pop(0)
             self.messages.append((line, message.colour))
 
+    def select_direction(self, prompt):
+        '''
+        Ask the player to pick a direction: returns (dx, dy), or None if
+        they press anything other than a direction key.
+        '''
+        self.add_message(Message(prompt, LIGHT1))
+        self.panel.render_messages(self.messages)
+        tdl.flush()
+        tdl.event.key_wait()
+        keypress = tdl.event.key_wait()
+        keys = ['UP', 'DOWN', 'LEFT', 'RIGHT']
+        keychars = ['h', 'j', 'k', 'l', 'y', 'u', 'b', 'n']
+        if keypress.key in keys:
+            return key_to_coords(keypress.key, 0, 0)
+        elif keypress.keychar in keychars:
+            return key_to_coords(keypress.keychar, 0, 0)
+        return None
+
     def msgbox(self, text, width=50, height=50):
         '''Display a message'''
         text = textwrap.wrap(text, width)
@@ -329,6 +332,7 @@ class GameScreen:
         self.root.blit(window, x, y, width, height, 0, 0, bg_alpha=0.75)
         tdl.flush()
         tdl.event.key_wait()
+        self.renderer.invalidate()
 
     def menu_selection(self, title, width, height, options, keys=None,
                        bg=DARK0, ascii_art=False, show_root=True):
@@ -353,6 +357,8 @@ class GameScreen:
             window.draw_str(0, 0+i, title[i], bg=None)
 
         block_index = 0
+        # Whatever we draw over will need repainting afterwards
+        self.renderer.invalidate()
 
         while True:
             y = len(title) + 1
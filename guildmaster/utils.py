@@ -1,7 +1,7 @@
 '''
 Basic mechanics for use in other modules
 '''
-from random import randint
+import random
 from collections import namedtuple
 
 
@@ -31,39 +31,42 @@ class GameObject:
         new_x = self.x + dx
         new_y = self.y + dy
 
-        destination = screen.current_map.lmap[new_y][new_x]
+        floor = screen.current_map
+        destination = floor.lmap[new_y][new_x]
         if destination.block_move:
             if destination.name == 'closed_door':
                 # open the door
                 destination.open_door()
             return []
 
-        for obj in screen.current_map.objects:
-            if obj.x == new_x and obj.y == new_y and obj.block_move:
-                return []
+        if floor.occupancy.blocker(new_x, new_y) is not None:
+            return []
 
-        self.x, self.y = new_x, new_y
+        floor.occupancy.move(self, new_x, new_y)
         return []
 
 
-def roll(dice=20, modifier=0):
+def roll(dice=20, modifier=0, rng=None):
     '''
-    Role a dice with a modifier
+    Role a dice with a modifier. rng is a random.Random to roll with,
+    defaulting to the global random module.
     '''
+    rng = random if rng is None else rng
     if isinstance(dice, int):
-        return randint(1, dice) + modifier
+        return rng.randint(1, dice) + modifier
     elif isinstance(dice, list):
         total = 0
         for die in dice:
-            total += randint(1, die)
+            total += rng.randint(1, die)
         return total + modifier
 
 
-def stat_roll():
+def stat_roll(rng=None):
     '''
     Make a randomised stat roll
     '''
-    rolls = [randint(1, 6) for _ in range(4)]
+    rng = random if rng is None else rng
+    rolls = [rng.randint(1, 6) for _ in range(4)]
     return sum(rolls) - min(rolls)
 
 
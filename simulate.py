@@ -0,0 +1,84 @@
+#! /usr/bin/python3.6
+'''
+Play the game without a display and report on how fast turns are run.
+
+The player is driven by a policy: wandering at random, heading for the
+stairs on every floor, or a script of keys (vim bindings plus '.', 's',
+'R' and '>') that is repeated until the turns run out:
+
+    python3 simulate.py --turns 5000 --seed 42
+    python3 simulate.py --policy stairs --turns 2000 --immortal
+    python3 simulate.py --script 'llllR>' --turns 500
+'''
+import argparse
+import random
+
+from guildmaster.engine import Engine
+from guildmaster.headless import (
+    SUBSYSTEMS, random_policy, script_policy, simulate, stairs_policy)
+
+
+POLICIES = {'random': random_policy, 'stairs': stairs_policy}
+
+
+def summarise(stats):
+    '''Print turns per second and where the time went'''
+    turns, seconds = stats['turns'], stats['seconds']
+    print('{} turns in {:.2f}s ({:.0f} turns/s), reached floor {}{}'.format(
+        turns, seconds, turns / seconds if seconds else 0, stats['depth'],
+        '' if stats['alive'] else ', player died'))
+    print('{:>8} {:>10} {:>10} {:>7}'.format('', 'total ms', 'ms/turn',
+                                             'share'))
+    for name in SUBSYSTEMS:
+        spent = stats['timings'][name]
+        print('{:>8} {:>10.1f} {:>10.3f} {:>6.1f}%'.format(
+            name, spent * 1000, spent * 1000 / max(turns, 1),
+            100 * spent / seconds if seconds else 0))
+    if stats['peak_rss'] is not None:
+        print('peak RSS {:.1f} MB'.format(stats['peak_rss'] / 2**20))
+    if stats['peak_traced'] is not None:
+        print('peak traced {:.1f} MB'.format(stats['peak_traced'] / 2**20))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('-n', '--turns', type=int, default=1000,
+                        help='number of turns to play')
+    parser.add_argument('--width', type=int, default=90)
+    parser.add_argument('--height', type=int, default=52)
+    parser.add_argument('--seed', type=int, default=None,
+                        help='dungeon and dice seed (random if not given)')
+    parser.add_argument('--policy', choices=sorted(POLICIES),
+                        default='random', help='how the player is played')
+    parser.add_argument('--script', default=None, metavar='KEYS',
+                        help='play these keys instead of a policy')
+    parser.add_argument('--immortal', action='store_true',
+                        help='keep the player alive for every turn')
+    parser.add_argument('--prefetch', type=int, default=0,
+                        help='floors to build ahead in worker processes')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='also report the peak traced by tracemalloc '
+                             '(much slower)')
+    args = parser.parse_args()
+
+    seed = random.getrandbits(32) if args.seed is None else args.seed
+    # NOTE: the dice for creatures come from the random module
+    random.seed(seed)
+    engine = Engine(args.width, args.height, seed=seed,
+                    prefetch=args.prefetch)
+    if args.script is not None:
+        policy = script_policy(args.script)
+    else:
+        policy = POLICIES[args.policy](random.Random(seed))
+
+    print('seed {}, {}x{}'.format(seed, args.width, args.height))
+    try:
+        stats = simulate(engine, args.turns, policy, immortal=args.immortal,
+                         trace_memory=args.trace_memory)
+    finally:
+        engine.close()
+    summarise(stats)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+'''
+The incremental agro field against a fresh bounded flood.
+'''
+import random
+
+import numpy as np
+
+from guildmaster.dungeon.agro import AgroField, flood
+from guildmaster.dungeon.grid import (
+    NO_AGRO, CLOSED_DOOR, OPEN_DOOR, FLOOR, WALL)
+from guildmaster.dungeon.mapgen import build_floor
+
+TOGGLE = {CLOSED_DOOR: OPEN_DOOR, OPEN_DOOR: CLOSED_DOOR, FLOOR: WALL,
+          WALL: FLOOR}
+
+
+def assert_matches_flood(field, sources, limit):
+    lmap = field.grid
+    expected = np.full((lmap.height, lmap.width), NO_AGRO, dtype=np.int32)
+    for (x, y), weight in flood(lmap, sources, limit).items():
+        expected[y, x] = weight
+    assert np.array_equal(lmap.agro_weight, expected)
+    assert sorted(field.touched) == sorted(map(tuple, np.argwhere(
+        expected != NO_AGRO)[:, ::-1].tolist()))
+
+
+def test_repair_after_kind_changes():
+    '''Doors and walls changing near the field are repaired in place'''
+    rng = random.Random(3)
+    floor = build_floor(60, 40, 0, 3)
+    lmap = floor.lmap
+    sources = [(floor.rooms[0].center, 0), (floor.rooms[1].center, 4)]
+    limit = 25
+    field = AgroField(lmap)
+    field.update(sources, limit)
+
+    doors = np.argwhere(np.isin(lmap.kind, (CLOSED_DOOR, OPEN_DOOR)))
+    for turn in range(200):
+        cells = doors if turn % 3 else np.argwhere(lmap.kind != 255)
+        y, x = cells[rng.randrange(len(cells))].tolist()
+        lmap.set_kind(x, y, TOGGLE.get(int(lmap.kind[y, x]), FLOOR))
+        field.update(sources, limit)
+        assert_matches_flood(field, sources, limit)
+    assert field.repairs and field.updates == 1
+
+
+def test_source_changes_reflood():
+    floor = build_floor(60, 40, 0, 5)
+    field = AgroField(floor.lmap)
+    (x, y), limit = floor.rooms[0].center, 12
+    for step in range(5):
+        sources = [((x + step, y), 0)]
+        field.update(sources, limit)
+        assert_matches_flood(field, sources, limit)
+    assert not field.update(sources, limit)
+    field.reset()
+    assert (floor.lmap.agro_weight == NO_AGRO).all()
@@ -0,0 +1,47 @@
+'''
+Paths across a chunked world cost the same as on one grid of the whole
+world, however narrow the Area the search starts on.
+'''
+import random
+
+import numpy as np
+import pytest
+
+from guildmaster.dungeon.chunks import ChunkedMap, path_cost
+from guildmaster.dungeon.grid import FLOOR, WALL
+from guildmaster.dungeon.pathfinding import PathFinder
+
+
+@pytest.fixture
+def world():
+    world = ChunkedMap(4, 3, seed=5, size=32)
+    yield world
+    world.close()
+
+
+def floor_pairs(grid, count, seed):
+    rng = random.Random(seed)
+    cells = [(x, y) for y, x in np.argwhere(grid.kind == FLOOR).tolist()]
+    return [tuple(rng.sample(cells, 2)) for _ in range(count)]
+
+
+@pytest.mark.parametrize('margin', [1, 4, None])
+def test_paths_are_shortest(world, margin):
+    whole = world.area(0, 0, world.width, world.height)
+    finder = PathFinder(whole)
+    for start, target in floor_pairs(whole.lmap, 30, 0):
+        expected = finder.search(start, target)
+        path = world.path(start, target, margin)
+        assert path[0] == start and path[-1] == target
+        assert path_cost(whole.lmap, path) == \
+            path_cost(whole.lmap, expected)
+
+
+def test_unreachable(world):
+    whole = world.area(0, 0, world.width, world.height)
+    start, target = floor_pairs(whole.lmap, 1, 1)[0]
+    x, y = target
+    cx, cy = world.chunk_of(x, y)
+    world.chunk(cx, cy).path_cost[y - cy * 32, x - cx * 32] = 0
+    world.set_kind(x, y, WALL)
+    assert world.path(start, target) is None
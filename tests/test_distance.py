@@ -0,0 +1,84 @@
+'''
+The numpy distance_field against the heap based agro flood.
+'''
+import random
+
+import numpy as np
+import pytest
+
+from guildmaster.dungeon.agro import flood
+from guildmaster.dungeon.distance import (
+    distance_field, downhill_step, downhill_steps)
+from guildmaster.dungeon.grid import (
+    TileGrid, NO_AGRO, KINDS, KIND_IDS, KIND_BLOCK_MOVE)
+from guildmaster.dungeon.mapgen import build_floor
+
+
+def synthetic_grid(width, height, seed):
+    '''A grid with a random scattering of every tile kind'''
+    rng = np.random.default_rng(seed)
+    weights = {'wall': 0.35, 'floor': 0.55, 'closed_door': 0.04,
+               'open_door': 0.03, 'secret_door': 0.03}
+    kinds = [KIND_IDS[k] for k in weights]
+    grid = TileGrid(width, height)
+    cells = rng.choice(kinds, size=(height, width), p=list(weights.values()))
+    for kind in kinds:
+        mask = cells == kind
+        grid.kind[mask] = kind
+        grid.agro_cost[mask] = KINDS[kind].agro_cost
+    return grid
+
+
+def random_sources(grid, count, rng):
+    '''The player (weight 0) plus louder / quieter extra points'''
+    sources = []
+    for i in range(count):
+        point = (rng.randrange(grid.width), rng.randrange(grid.height))
+        sources.append((point, 0 if i == 0 else rng.randint(-3, 3)))
+    return sources
+
+
+def heap_field(grid, sources, limit=NO_AGRO):
+    field = np.full((grid.height, grid.width), NO_AGRO, dtype=np.int32)
+    for (x, y), weight in flood(grid, sources, limit).items():
+        field[y, x] = weight
+    return field
+
+
+GRIDS = {
+    'synthetic': lambda seed: synthetic_grid(40, 30, seed),
+    'tall': lambda seed: synthetic_grid(12, 45, seed),
+    'floor': lambda seed: build_floor(60, 40, 0, seed).lmap,
+}
+
+
+@pytest.mark.parametrize('seed', range(3))
+@pytest.mark.parametrize('kind', sorted(GRIDS))
+def test_matches_heap_flood(kind, seed):
+    grid = GRIDS[kind](seed)
+    rng = random.Random(seed)
+    for _ in range(5):
+        sources = random_sources(grid, rng.randint(1, 4), rng)
+        expected = heap_field(grid, sources)
+        assert np.array_equal(distance_field(grid.agro_cost, sources),
+                              expected)
+
+        limit = rng.randint(0, 15)
+        assert np.array_equal(
+            distance_field(grid.agro_cost, sources, limit),
+            heap_field(grid, sources, limit))
+
+
+def test_no_sources():
+    grid = synthetic_grid(5, 4, 0)
+    assert (distance_field(grid.agro_cost, []) == NO_AGRO).all()
+
+
+def test_downhill_steps_match_single_steps():
+    grid = synthetic_grid(30, 20, 4)
+    field = distance_field(grid.agro_cost, [((3, 4), 0), ((25, 15), 2)])
+    blocked = KIND_BLOCK_MOVE[grid.kind]
+    ys, xs = np.indices(field.shape).reshape(2, -1)
+    dxs, dys = downhill_steps(field, blocked, xs, ys)
+    for x, y, dx, dy in zip(xs.tolist(), ys.tolist(), dxs, dys):
+        assert downhill_step(field, blocked, x, y) == (dx, dy)
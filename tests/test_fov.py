@@ -0,0 +1,82 @@
+'''
+The single cached cast of FieldOfView sees the same cells as the two
+quickFOV casts (one per vision radius) that it replaced.
+'''
+import math
+import random
+
+import pytest
+import tcod.map
+
+from guildmaster.config import FOV_ALG, LIGHT_WALLS
+from guildmaster.dungeon.fov import FOV_ALGORITHMS, FieldOfView
+from guildmaster.dungeon.grid import CLOSED_DOOR, OPEN_DOOR
+from guildmaster.dungeon.mapgen import build_floor
+
+VISION = (7, 10)
+
+
+def quick_fov(grid, x, y, radius):
+    '''tdl.map.quickFOV: cast on a window around (x, y), off map cells dark'''
+    size = radius * 2 + 1
+    fov_map = tcod.map.Map(size, size, order='C')
+    x0, y0 = x - radius, y - radius
+    for Y in range(size):
+        for X in range(size):
+            mx, my = x0 + X, y0 + Y
+            if 0 <= mx < grid.width and 0 <= my < grid.height:
+                fov_map.transparent[Y, X] = not grid.block_sight[my, mx]
+    fov_map.compute_fov(radius, radius, radius, LIGHT_WALLS,
+                        FOV_ALGORITHMS[FOV_ALG])
+    return {(x0 + X, y0 + Y)
+            for Y in range(size) for X in range(size)
+            if fov_map.fov[Y, X] and math.hypot(X - radius, Y - radius)
+            <= radius}
+
+
+def assert_same_view(fov, grid, x, y):
+    near = quick_fov(grid, x, y, VISION[0])
+    far = quick_fov(grid, x, y, VISION[1]) - near
+    # NOTE: quickFOV includes off map cells in its window, we don't
+    on_map = {(X, Y) for X, Y in near | far
+              if 0 <= X < grid.width and 0 <= Y < grid.height}
+    visible, visible2 = fov.compute(grid, x, y, VISION)
+    assert visible == near & on_map, (x, y)
+    assert visible2 == far & on_map, (x, y)
+
+
+def positions(floor, count, seed):
+    '''Cells around the floor plus some on and next to its edges'''
+    rng = random.Random(seed)
+    w, h = floor.width, floor.height
+    cells = [room.random_point(rng=rng)
+             for room in rng.choices(floor.rooms, k=count)]
+    return cells + [(0, 0), (1, 1), (w - 1, h - 1), (w - 2, h - 2),
+                    (0, h // 2), (w - 1, h // 2), (w // 2, 1),
+                    (w // 2, h - 2)]
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_matches_two_casts(seed):
+    floor = build_floor(90, 52, 1, seed)
+    fov = FieldOfView()
+    for x, y in positions(floor, 30, seed):
+        assert_same_view(fov, floor.lmap, x, y)
+
+
+def test_matches_after_doors_change():
+    '''The transparency map is patched rather than rebuilt'''
+    floor = build_floor(90, 52, 1, 7)
+    grid = floor.lmap
+    fov = FieldOfView()
+    x, y = floor.rooms[0].center
+    assert_same_view(fov, grid, x, y)
+
+    rng = random.Random(7)
+    for room in floor.rooms[:4]:
+        for dx, dy in ((1, 0), (0, 1), (-1, 0)):
+            kind = rng.choice([CLOSED_DOOR, OPEN_DOOR])
+            grid.set_kind(x + dx, y + dy, kind)
+            assert_same_view(fov, grid, x, y)
+        x, y = room.center
+        assert_same_view(fov, grid, x, y)
@@ -0,0 +1,25 @@
+'''
+Neighbour lookups and the change log of TileGrid.
+'''
+from guildmaster.dungeon.grid import TileGrid, OFFSETS, FLOOR, WALL
+
+
+def test_iter_neighbours_in_offsets_order():
+    grid = TileGrid(7, 5)
+    for y in range(grid.height):
+        for x in range(grid.width):
+            expected = [(dx, dy, x + dx, y + dy) for dx, dy in OFFSETS
+                        if 0 <= x + dx < 7 and 0 <= y + dy < 5]
+            assert list(grid.iter_neighbours(x, y)) == expected
+
+
+def test_changes_since():
+    grid = TileGrid(6, 6)
+    version = grid.version
+    grid.set_kind(1, 2, FLOOR)
+    grid.set_kind(3, 4, WALL)
+    assert grid.changes_since(version) == [(1, 2), (3, 4)]
+    assert grid.changes_since(grid.version) == []
+
+    grid.fill(0, 0, 2, 2, FLOOR)
+    assert grid.changes_since(version) is None
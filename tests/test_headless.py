@@ -0,0 +1,24 @@
+'''
+Headless play: the stairs policy keeps going down, secret doors included,
+so the turns it times are turns of actual play.
+'''
+import random
+
+import pytest
+
+from guildmaster.engine import Engine
+from guildmaster.headless import simulate, stairs_policy
+
+
+@pytest.mark.parametrize('seed', range(8))
+def test_stairs_policy_descends(seed):
+    random.seed(seed)
+    engine = Engine(80, 43, seed=seed)
+    try:
+        stats = simulate(engine, 200, stairs_policy(random.Random(seed)),
+                         immortal=True)
+    finally:
+        engine.close()
+    # NOTE: a floor takes the policy 40 turns or so at this size, one that
+    #       walks into a secret door and stands there gets no further
+    assert stats['depth'] >= 5
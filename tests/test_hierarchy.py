@@ -0,0 +1,57 @@
+'''
+Hierarchical routes: legal paths, and a planner patched after doors change
+plans the same routes as one built from scratch.
+'''
+import random
+
+import numpy as np
+
+from guildmaster.dungeon.grid import CLOSED_DOOR, OPEN_DOOR
+from guildmaster.dungeon.mapgen import build_floor
+from guildmaster.dungeon.pathfinding import PathFinder
+
+
+def room_pairs(floor, count, seed):
+    rng = random.Random(seed)
+    return [tuple(r.random_point(rng=rng)
+                  for r in rng.sample(floor.rooms, 2))
+            for _ in range(count)]
+
+
+def assert_legal(floor, path, start, target):
+    assert path[0] == start and path[-1] == target
+    for (x1, y1), (x2, y2) in zip(path, path[1:]):
+        assert max(abs(x1 - x2), abs(y1 - y2)) == 1
+        assert floor.lmap.path_cost[y2, x2] > 0
+
+
+def test_routes_are_legal():
+    floor = build_floor(120, 80, 1, 2)
+    finder = PathFinder(floor)
+    for start, target in room_pairs(floor, 20, 0):
+        assert_legal(floor, finder.route(start, target), start, target)
+
+
+def test_patched_planner_matches_rebuilt():
+    floor = build_floor(120, 80, 1, 3)
+    lmap = floor.lmap
+    finder, fresh = PathFinder(floor), PathFinder(floor)
+    pairs = room_pairs(floor, 15, 1)
+    for pair in pairs:
+        finder.route(*pair)
+    planner = finder.planner
+
+    rng = random.Random(4)
+    doors = np.argwhere(np.isin(lmap.kind, (CLOSED_DOOR, OPEN_DOOR)))
+    for _ in range(10):
+        for y, x in rng.sample(doors.tolist(), 3):
+            lmap.set_kind(x, y, OPEN_DOOR if lmap.kind[y, x] == CLOSED_DOOR
+                          else CLOSED_DOOR)
+        for start, target in pairs:
+            fresh.planner = None
+            expected = fresh.route(start, target)
+            path = finder.route(start, target)
+            assert path == expected
+            assert_legal(floor, path, start, target)
+    # Patched in place rather than rebuilt
+    assert finder.planner is planner
@@ -0,0 +1,68 @@
+'''
+Lines of sight: unbroken lines in every octant, the batched mask against
+has_los and points off the map.
+'''
+import random
+
+import pytest
+
+from guildmaster.dungeon.mapgen import build_floor
+from guildmaster.dungeon.pathfinding import PathFinder
+
+
+@pytest.fixture(scope='module')
+def floor():
+    return build_floor(90, 52, 1, 3)
+
+
+def test_lines_are_unbroken():
+    rng = random.Random(0)
+    for _ in range(2000):
+        start = rng.randrange(-40, 40), rng.randrange(-40, 40)
+        target = rng.randrange(-40, 40), rng.randrange(-40, 40)
+        if start == target:
+            continue
+        cells = [start] + PathFinder.line(start, target) + [target]
+        for (x1, y1), (x2, y2) in zip(cells, cells[1:]):
+            assert max(abs(x2 - x1), abs(y2 - y1)) == 1
+
+
+def test_mask_matches_has_los(floor):
+    rng = random.Random(1)
+    finder = PathFinder(floor)
+    xs, ys = (~floor.lmap.block_move).T.nonzero()
+    cells = list(zip(xs.tolist(), ys.tolist()))
+    seen = 0
+    for _ in range(10):
+        target = rng.choice(cells)
+        starts = rng.sample(cells, 200)
+        mask = finder.los_mask(starts, target)
+        assert mask.tolist() == [finder.has_los(s, target) for s in starts]
+        seen += int(mask.sum())
+
+        # Right next to the target there is nothing in between
+        near = [(target[0] + dx, target[1] + dy)
+                for dx in (-1, 0, 1) for dy in (-1, 0, 1)]
+        assert finder.los_mask(near, target).all()
+    assert 0 < seen < 2000
+
+
+def test_other_floor(floor):
+    finder = PathFinder(build_floor(90, 52, 1, 4))
+    on_floor = PathFinder(floor)
+    start, target = (1, 1), (floor.starting_x, floor.starting_y)
+    assert finder.has_los(start, target, floor) == \
+        on_floor.has_los(start, target)
+
+
+@pytest.mark.parametrize('point', [(-1, 5), (5, -1), (90, 5), (5, 52)])
+def test_off_the_map(floor, point):
+    finder = PathFinder(floor)
+    with pytest.raises(ValueError):
+        finder.has_los(point, (10, 10))
+    with pytest.raises(ValueError):
+        finder.has_los((10, 10), point)
+    with pytest.raises(ValueError):
+        finder.los_mask([(10, 10), point], (20, 20))
+    with pytest.raises(ValueError):
+        finder.los_mask([(10, 10)], point)
@@ -0,0 +1,148 @@
+'''
+Floor generation: bulk corridor carving and door placement lay out the
+same floors as the per-tile versions they replaced, mazes are perfect,
+and closing doors needs no input from the player.
+'''
+import copy
+import random
+
+import numpy as np
+import pytest
+
+from guildmaster.dungeon.grid import OPEN_DOOR
+from guildmaster.dungeon.mapgen import Map, build_floor
+from guildmaster.dungeon.mazemap import Maze
+
+
+def tile_corridor(floor, p1, p2, const, horizontal):
+    '''The per-tile Map.corridor'''
+    for v in range(min(p1, p2), max(p1, p2) + 1):
+        if horizontal:
+            floor.lmap[const][v].floor()
+        else:
+            floor.lmap[v][const].floor()
+
+
+def tile_connect(floor):
+    '''Map.connect as it was before bulk carving'''
+    rng = floor.rng
+    for room, neighbour in floor.graph_edges:
+        horizontal = room.horizontal_with(neighbour)
+        x1, y1 = room.random_point(offset=3, rng=rng)
+        x2, y2 = neighbour.random_point(offset=3, rng=rng)
+        if horizontal:
+            div = rng.randint(min(x1, x2), max(x1, x2))
+            p1, p2, const1, const2 = x1, x2, y1, y2
+        else:
+            div = rng.randint(min(y1, y2), max(y1, y2))
+            p1, p2, const1, const2 = y1, y2, x1, x2
+        tile_corridor(floor, p1, div, const1, horizontal)
+        tile_corridor(floor, p2, div, const2, horizontal)
+        tile_corridor(floor, const1, const2, div, not horizontal)
+
+
+def tile_add_doors(floor):
+    '''Map.add_doors as it was before the floor count arrays'''
+    lmap = floor.lmap
+
+    def valid_cell(x, y):
+        across = [lmap[y][x-1].name, lmap[y][x+1].name].count('floor')
+        down = [lmap[y-1][x].name, lmap[y+1][x].name].count('floor')
+        return (across, down) in ((2, 0), (0, 2))
+
+    for room in floor.rooms:
+        edges = ([(x, room.y1) for x in range(room.x1, room.x2)] +
+                 [(x, room.y2) for x in range(room.x1, room.x2)] +
+                 [(room.x1, y) for y in range(room.y1, room.y2)] +
+                 [(room.x2, y) for y in range(room.y1, room.y2)])
+        for x, y in edges:
+            cell = lmap[y][x]
+            if cell.name == 'floor' and valid_cell(x, y):
+                cell.closed_door(allow_secret_door=True, rng=floor.rng)
+
+
+def unconnected(width, height, seed, algorithm):
+    '''A floor as Map.generate leaves it just before connecting the rooms'''
+    floor = Map(width, height, 0, rng=random.Random(seed), generate=False,
+                algorithm=algorithm)
+    if algorithm == 'bsp':
+        floor.bsp()
+    else:
+        floor.place_rooms()
+        floor.generate_graph()
+    return floor
+
+
+@pytest.mark.parametrize('seed', range(4))
+@pytest.mark.parametrize('algorithm', ['rooms', 'bsp'])
+@pytest.mark.parametrize('size', [(80, 40), (200, 120)])
+def test_bulk_carving_matches_per_tile(size, algorithm, seed):
+    base = unconnected(*size, seed, algorithm)
+    old, new = copy.deepcopy(base), copy.deepcopy(base)
+    tile_connect(old)
+    tile_add_doors(old)
+    new.connect()
+    new.add_doors()
+    assert np.array_equal(old.lmap.kind, new.lmap.kind)
+    assert np.array_equal(old.lmap.path_cost, new.lmap.path_cost)
+    assert old.rng.getstate() == new.rng.getstate()
+
+
+def reachable(is_open, row, start):
+    '''Flat indices of the open cells reachable from start (4-connected)'''
+    seen = {start}
+    stack = [start]
+    while stack:
+        ix = stack.pop()
+        for n in (ix - 1, ix + 1, ix - row, ix + row):
+            if is_open[n] and n not in seen:
+                seen.add(n)
+                stack.append(n)
+    return seen
+
+
+@pytest.mark.parametrize('seed', range(3))
+@pytest.mark.parametrize('size', [(1, 1), (1, 12), (12, 1), (20, 20),
+                                  (45, 25), (150, 100)])
+def test_maze_is_perfect(size, seed):
+    '''width * height cells joined by width * height - 1 passages'''
+    width, height = size
+    cells = Maze(width, height, rng=random.Random(seed)).cells()
+    assert cells.shape == (2 * height + 1, 2 * width + 1)
+    assert cells[1::2, 1::2].all()
+    assert not cells[::2, ::2].any()
+    # NOTE: a tree with no cycles has exactly one route between two cells
+    assert cells.sum() == 2 * width * height - 1
+    row = cells.shape[1]
+    assert len(reachable(cells.ravel().tolist(), row, row + 1)) == \
+        cells.sum()
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_maze_floor_is_connected(seed):
+    floor = build_floor(90, 52, 1, seed, algorithm='maze')
+    is_open = (floor.lmap.path_cost > 0).ravel().tolist()
+    x, y = floor.rooms[0].center
+    assert len(reachable(is_open, floor.width, y * floor.width + x)) == \
+        sum(is_open)
+
+
+def cell(tile):
+    return tile._x, tile._y
+
+
+def test_close_door():
+    floor = build_floor(60, 40, 1, 3)
+    x, y = floor.rooms[0].center
+    assert floor.close_door(x, y) is None
+
+    floor.lmap.set_kind(x + 1, y, OPEN_DOOR)
+    assert cell(floor.close_door(x, y)) == (x + 1, y)
+
+    # With two doors there is nothing to close without a direction
+    floor.lmap.set_kind(x - 1, y - 1, OPEN_DOOR)
+    assert sorted(map(cell, floor.open_doors(x, y))) == \
+        [(x - 1, y - 1), (x + 1, y)]
+    assert floor.close_door(x, y) is None
+    assert cell(floor.close_door(x, y, (-1, -1))) == (x - 1, y - 1)
+    assert floor.close_door(x, y, (0, 1)) is None
@@ -0,0 +1,147 @@
+'''
+Jump point search finds paths that cost exactly as much as plain A*, and
+the path cache only ever answers with paths that a fresh search would.
+'''
+import random
+
+import pytest
+
+from guildmaster.dungeon.grid import CLOSED_DOOR, FLOOR, WALL
+from guildmaster.dungeon.mapgen import Map, build_floor
+from guildmaster.dungeon.pathfinding import PathFinder, DIAGONAL_PENALTY
+
+
+def cavern(width, height, seed):
+    '''One big room with pillars and some doors in the way'''
+    rng = random.Random(seed)
+    floor = Map(width, height, 0, generate=False)
+    grid = floor.lmap
+    grid.fill(1, 1, width - 1, height - 1, FLOOR)
+    for _ in range(width * height // 60):
+        x, y = rng.randrange(2, width - 3), rng.randrange(2, height - 3)
+        grid.path_cost[y:y+2, x:x+2] = 0
+        grid.fill(x, y, x + 2, y + 2, WALL)
+    for _ in range(width * height // 400):
+        x, y = rng.randrange(1, width - 1), rng.randrange(1, height - 1)
+        grid.set_kind(x, y, CLOSED_DOOR)
+    return floor
+
+
+def random_pairs(floor, count, seed):
+    rng = random.Random(seed)
+    xs, ys = (floor.lmap.path_cost.T > 0).nonzero()
+    cells = list(zip(xs.tolist(), ys.tolist()))
+    return [tuple(rng.sample(cells, 2)) for _ in range(count)]
+
+
+def path_cost(floor, path):
+    '''Cost of walking a path, checking that every step is legal'''
+    costs = floor.lmap.path_cost
+    total = 0
+    for (x1, y1), (x2, y2) in zip(path, path[1:]):
+        assert max(abs(x2 - x1), abs(y2 - y1)) == 1 and costs[y2, x2]
+        total += int(costs[y2, x2])
+        if x1 != x2 and y1 != y2:
+            total += DIAGONAL_PENALTY
+    return total
+
+
+FLOORS = {
+    'rooms': lambda seed: build_floor(90, 52, 1, seed),
+    'cavern': lambda seed: cavern(60, 40, seed),
+}
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('kind', sorted(FLOORS))
+def test_jump_search_costs_match_a_star(kind, seed):
+    floor = FLOORS[kind](seed)
+    finder = PathFinder(floor)
+    for start, target in random_pairs(floor, 20, seed):
+        expected = finder.search(start, target)
+        path = finder.jump_search(start, target)
+        assert (path is None) == (expected is None)
+        if path is not None:
+            assert path[0] == start and path[-1] == target
+            assert path_cost(floor, path) == path_cost(floor, expected)
+
+
+def test_unreachable():
+    floor = cavern(30, 20, 0)
+    grid = floor.lmap
+    # Wall off a corner cell
+    for x, y in ((1, 2), (2, 1), (2, 2)):
+        grid.set_kind(x, y, WALL)
+        grid.path_cost[y, x] = 0
+    grid.set_kind(5, 5, FLOOR)
+    grid.path_cost[5, 5] = 1
+    finder = PathFinder(floor)
+    assert finder.search((5, 5), (1, 1)) is None
+    assert finder.jump_search((5, 5), (1, 1)) is None
+
+
+def test_cache_forgets_paths_when_doors_change():
+    floor = cavern(60, 40, 1)
+    grid = floor.lmap
+    finder = PathFinder(floor)
+    start, target = (2, 2), (57, 37)
+    path = finder.a_star(start, target)
+    assert finder.a_star(start, target) == path
+    assert finder.paths.hits == 1
+
+    # A door across the path makes it dearer, opening it makes it cheap
+    x, y = path[len(path) // 2]
+    door = grid[y][x]
+    for change in (door.closed_door, door.open_door):
+        misses = finder.paths.misses
+        change()
+        path = finder.a_star(start, target)
+        assert finder.paths.misses == misses + 1
+        assert path_cost(floor, path) == \
+            path_cost(floor, finder.search(start, target))
+
+    # A cell dug out of the way is never stepped on again
+    x, y = path[len(path) // 2]
+    grid.set_kind(x, y, WALL)
+    grid.path_cost[y, x] = 0
+    path = finder.a_star(start, target)
+    assert (x, y) not in path
+    assert path_cost(floor, path) == \
+        path_cost(floor, finder.search(start, target))
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_cache_suffix_hits(seed):
+    floor = build_floor(90, 52, 1, seed)
+    finder = PathFinder(floor)
+    for start, target in random_pairs(floor, 5, seed):
+        path = finder.a_star(start, target)
+        for cell in path[1:-1]:
+            hits = finder.paths.suffix_hits
+            suffix = finder.a_star(cell, target)
+            assert finder.paths.suffix_hits == hits + 1
+            assert suffix[0] == cell and suffix[-1] == target
+            assert path_cost(floor, suffix) == \
+                path_cost(floor, finder.search(cell, target))
+
+
+def test_cache_counts_and_evicts():
+    floor = cavern(60, 40, 2)
+    finder = PathFinder(floor)
+    cache = finder.paths
+    cache.size = 3
+    # Different targets so that no query is a suffix of another
+    queries = [((2, 2), (57, y)) for y in (5, 15, 25, 35)]
+    for start, target in queries:
+        finder.a_star(start, target)
+    assert (cache.hits, cache.suffix_hits, cache.misses) == (0, 0, 4)
+    assert len(cache.paths) == 3
+
+    # The oldest query was dropped, the newest is remembered
+    finder.a_star(*queries[0])
+    assert (cache.hits, cache.misses) == (0, 5)
+    finder.a_star(*queries[-1])
+    assert (cache.hits, cache.misses) == (1, 5)
+    # ...and remembering queries[0] again pushed out queries[1]
+    assert (queries[1] not in cache.paths and
+            all(q in cache.paths for q in (queries[0], queries[3])))
@@ -0,0 +1,157 @@
+'''
+Save files round trip a run, for every codec, whether or not the floors in
+them have been decoded.
+'''
+import random
+
+import numpy as np
+import pytest
+
+from guildmaster import savegame
+from guildmaster.dungeon.mapgen import Dungeon
+from guildmaster.player_character import new_PC
+
+FLOORS = 4
+GRID_ARRAYS = ('kind', 'path_cost', 'explored', 'room_id', 'block_move',
+               'block_sight', 'agro_cost')
+CREATURE_FIELDS = ('race', 'name', 'x', 'y', 'HP', 'MAX_HP', 'FOCUS',
+                   'alive', 'block_move', 'char', 'colour', 'STR', 'VIT',
+                   'equipment')
+
+
+@pytest.fixture(scope='module')
+def run():
+    '''A dungeon the player has made their way down through'''
+    rng = random.Random(0)
+    dungeon = Dungeon(40, 60, new_PC('Player', 'Human'), seed=0)
+    dungeon.maps.size = FLOORS
+    for _ in range(FLOORS - 1):
+        floor = dungeon.maps[dungeon.current]
+        floor.lmap.explored[:] = np.random.default_rng(0).random(
+            floor.lmap.explored.shape) < 0.4
+        for enemy in rng.sample(floor.enemies, len(floor.enemies) // 2):
+            enemy.lose_hp(rng.randint(1, 20))
+        dungeon.descend()
+    return dungeon
+
+
+def assert_same_floor(a, b):
+    for name in GRID_ARRAYS:
+        assert np.array_equal(getattr(a.lmap, name),
+                              getattr(b.lmap, name)), name
+    assert (a.depth, a.starting_x, a.starting_y) == \
+        (b.depth, b.starting_x, b.starting_y)
+    assert [vars(r) for r in a.rooms] == [vars(r) for r in b.rooms]
+    assert [(x.id, y.id) for x, y in a.graph_edges] == \
+        [(x.id, y.id) for x, y in b.graph_edges]
+    assert [[getattr(e, f) for f in CREATURE_FIELDS] for e in a.enemies] == \
+        [[getattr(e, f) for f in CREATURE_FIELDS] for e in b.enemies]
+    for e in b.enemies:
+        assert b.occupancy.positions[e] == (e.x, e.y)
+
+
+def assert_same_run(original, loaded):
+    assert (loaded.current, loaded.seed, loaded.algorithm) == \
+        (original.current, original.seed, original.algorithm)
+    assert len(loaded.maps) == len(original.maps)
+    for ix in range(len(original.maps)):
+        assert_same_floor(original.maps.peek(ix), loaded.maps.peek(ix))
+
+
+def live_floors(dungeon):
+    return [ix for ix in range(len(dungeon.maps))
+            if dungeon.maps.is_live(ix)]
+
+
+@pytest.mark.parametrize('codec', sorted(savegame.CODECS))
+def test_round_trip(run, tmp_path, codec):
+    path = str(tmp_path / 'save')
+    savegame.save(path, run, run.player, codec)
+    loaded, player = savegame.load(path)
+
+    # Only the floor the player is on is decoded
+    assert live_floors(loaded) == [run.current]
+    assert (player.name, player.HP) == (run.player.name, run.player.HP)
+
+    loaded.maps.size = FLOORS
+    for ix in range(FLOORS):
+        assert_same_floor(run.maps.peek(ix), loaded.maps[ix])
+    assert_same_run(run, loaded)
+
+
+@pytest.mark.parametrize('codec', sorted(savegame.CODECS))
+def test_resave_lazy_floors(run, tmp_path, codec):
+    '''Floors that were never decoded are copied into the new save'''
+    first, second = str(tmp_path / 'first'), str(tmp_path / 'second')
+    savegame.save(first, run, run.player, codec)
+    loaded, player = savegame.load(first)
+    savegame.save(second, loaded, player, codec)
+    assert live_floors(loaded) == [run.current]
+
+    reloaded, _ = savegame.load(second)
+    assert_same_run(run, reloaded)
+
+
+@pytest.mark.parametrize('codec', sorted(savegame.CODECS))
+def test_resave_with_other_codec(run, tmp_path, codec):
+    '''Lazy floors in the old codec are re-encoded in the new one'''
+    path = str(tmp_path / 'save')
+    other = 'lzma' if codec != 'lzma' else 'none'
+    savegame.save(path, run, run.player, other)
+    loaded, player = savegame.load(path)
+    savegame.save(path, loaded, player, codec)
+
+    reloaded, _ = savegame.load(path)
+    assert_same_run(run, reloaded)
+
+
+def test_resave_over_mapped_file(run, tmp_path):
+    '''Saving over the file a run was loaded from (and is still mapped)'''
+    path = str(tmp_path / 'save')
+    savegame.save(path, run, run.player, 'zlib')
+    loaded, player = savegame.load(path)
+    savegame.save(path, loaded, player, 'zlib')
+    savegame.save(path, loaded, player, 'zlib')
+
+    # The old mapping still decodes, as does the new file
+    assert_same_run(run, loaded)
+    reloaded, _ = savegame.load(path)
+    assert_same_run(run, reloaded)
+
+
+@pytest.mark.parametrize('algorithm', savegame.ALGORITHMS)
+def test_algorithm(tmp_path, algorithm):
+    '''New floors below a loaded run are built the way the run's were'''
+    path = str(tmp_path / 'save')
+    dungeon = Dungeon(40, 60, new_PC('Player', 'Human'), seed=1,
+                      algorithm=algorithm)
+    savegame.save(path, dungeon, dungeon.player)
+    loaded, _ = savegame.load(path)
+    assert loaded.algorithm == algorithm
+
+    dungeon.descend()
+    loaded.descend()
+    assert_same_floor(dungeon.maps.peek(1), loaded.maps.peek(1))
+
+
+def test_load_is_deterministic(run, tmp_path):
+    '''Loading leaves the random module alone and gives the same run'''
+    path = str(tmp_path / 'save')
+    savegame.save(path, run, run.player)
+    loaded = []
+    for _ in range(2):
+        state = random.getstate()
+        dungeon, _ = savegame.load(path)
+        dungeon.maps.size = FLOORS
+        for ix in range(FLOORS):
+            dungeon.maps[ix]
+        assert random.getstate() == state
+        loaded.append(dungeon)
+    assert_same_run(*loaded)
+
+
+def test_not_a_save(tmp_path):
+    path = tmp_path / 'save'
+    path.write_bytes(b'not a save file at all, honestly' * 4)
+    with pytest.raises(ValueError):
+        savegame.load(str(path))